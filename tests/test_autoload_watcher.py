@@ -0,0 +1,155 @@
+import os
+import time
+import numpy as np
+from astropy.io import fits
+from ztv.autoload_watcher import FileMatchIndex, FileReadinessCheck
+
+
+def _write(path, data=b'x'):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _age_directory(directory, mtime):
+    # (the index always re-lists directories changed within the last couple of seconds)
+    os.utime(directory, (mtime, mtime))
+
+
+def test_index_finds_new_files(tmpdir):
+    directory = str(tmpdir)
+    _write(os.path.join(directory, 'a.fits'))
+    _write(os.path.join(directory, 'notes.txt'))
+    index = FileMatchIndex(os.path.join(directory, '*.fits'))
+    assert index.update() == [os.path.join(directory, 'a.fits')]
+    assert index.update() == []
+    _write(os.path.join(directory, 'b.fits'))
+    assert index.update() == [os.path.join(directory, 'b.fits')]
+    assert sorted(index.entries) == [os.path.join(directory, 'a.fits'), os.path.join(directory, 'b.fits')]
+
+
+def test_index_skips_unchanged_directories(tmpdir):
+    directory = str(tmpdir)
+    for name in ['a.fits', 'b.fits', 'c.fits']:
+        _write(os.path.join(directory, name))
+    mtime = time.time() - 100.
+    _age_directory(directory, mtime)
+    index = FileMatchIndex(os.path.join(directory, '*.fits'))
+    assert len(index.update()) == 3
+    assert index.update() == []
+    assert index.stats['n_dirs_skipped'] == 1
+    assert index.stats['n_dirs_listed'] == 0
+    assert index.stats['n_stats'] == 3  # (the files were just written, so are still within settle_sec)
+    assert index.stats['n_entries'] == 3
+
+
+def _aged_files(directory, n_files):
+    mtime = time.time() - 1000.
+    paths = [os.path.join(directory, 'image{:04d}.fits'.format(i)) for i in range(n_files)]
+    for i, path in enumerate(paths):
+        _write(path)
+        os.utime(path, (mtime + i, mtime + i))
+    _age_directory(directory, mtime)
+    return paths
+
+
+def test_index_steady_state_stats_only_the_newest_file(tmpdir):
+    directory = str(tmpdir)
+    paths = _aged_files(directory, 200)
+    index = FileMatchIndex(os.path.join(directory, '*.fits'))
+    assert len(index.update()) == 200
+    assert index.newest == paths[-1]
+    for i in range(3):
+        assert index.update() == []
+        assert index.stats['n_dirs_skipped'] == 1
+        assert index.stats['n_stats'] == 1
+    new_path = os.path.join(directory, 'image9999.fits')
+    _write(new_path)
+    assert index.update() == [new_path]
+    assert index.stats['n_dirs_listed'] == 1
+    assert index.stats['n_stats'] == 1  # (the new file, which is now the newest)
+    assert index.newest == new_path
+
+
+def test_index_notices_newest_file_rewritten_in_place(tmpdir):
+    directory = str(tmpdir)
+    paths = _aged_files(directory, 3)
+    index = FileMatchIndex(os.path.join(directory, '*.fits'))
+    assert len(index.update()) == 3
+    _write(paths[-1], b'second, longer')  # (truncated & rewritten:  the directory's mtime doesn't change)
+    assert index.update() == [paths[-1]]
+    assert index.stats['n_dirs_skipped'] == 1
+    assert index.update() == []
+    _write(paths[-1], b'third')
+    assert index.update() == [paths[-1]]
+    assert index.stats['n_stats'] == 1
+
+
+def test_index_forgets_removed_files_and_directories(tmpdir):
+    for name in ['night1', 'night2']:
+        tmpdir.mkdir(name)
+        _write(os.path.join(str(tmpdir), name, 'a.fits'))
+    index = FileMatchIndex(os.path.join(str(tmpdir), 'night*', '*.fits'))
+    assert len(index.update()) == 2
+    os.remove(os.path.join(str(tmpdir), 'night1', 'a.fits'))
+    assert index.update() == []
+    assert list(index.entries) == [os.path.join(str(tmpdir), 'night2', 'a.fits')]
+    tmpdir.join('night2').remove()
+    tmpdir.mkdir('night3')
+    _write(os.path.join(str(tmpdir), 'night3', 'b.fits'))
+    assert index.update() == [os.path.join(str(tmpdir), 'night3', 'b.fits')]
+    assert list(index.entries) == [os.path.join(str(tmpdir), 'night3', 'b.fits')]
+
+
+def test_index_of_missing_directory(tmpdir):
+    index = FileMatchIndex(os.path.join(str(tmpdir), 'not-yet', '*.fits'))
+    assert index.update() == []
+    tmpdir.mkdir('not-yet')
+    _write(os.path.join(str(tmpdir), 'not-yet', 'a.fits'))
+    assert index.update() == [os.path.join(str(tmpdir), 'not-yet', 'a.fits')]
+
+
+def test_readiness_check_fits_complete(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    fits.PrimaryHDU(np.zeros((10, 10))).writeto(path)
+    check = FileReadinessCheck('fits-complete')
+    assert check.is_ready(path)
+    with open(path, 'rb') as f:
+        contents = f.read()
+    with open(path, 'wb') as f:
+        f.write(contents[:3000])
+    assert not check.is_ready(path)
+
+
+def test_readiness_check_size_stable(tmpdir):
+    for method, name in [('size-stable', 'image.fits'), ('fits-complete', 'image.fits.gz')]:
+        path = str(tmpdir.join(name))
+        _write(path, b'12')
+        check = FileReadinessCheck(method)
+        assert not check.is_ready(path)  # (nothing to compare with yet)
+        assert check.is_ready(path)
+        _write(path, b'1234')
+        assert not check.is_ready(path)
+        assert check.is_ready(path)
+        check.forget(path)
+        assert not check.is_ready(path)
+        assert not check.is_ready(str(tmpdir.join('missing.fits')))
+
+
+def test_readiness_check_sidecar_and_none(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    _write(path)
+    assert FileReadinessCheck('none').is_ready(path)
+    check = FileReadinessCheck('sidecar')
+    assert not check.is_ready(path)
+    _write(path + '.done')
+    assert check.is_ready(path)
+    assert FileReadinessCheck('sidecar', sidecar_suffix='.ok').is_ready(path) is False
+
+
+def test_readiness_check_unknown_method():
+    try:
+        FileReadinessCheck('eventually')
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+from astropy.stats import sigma_clip
+from ztv.calibration_frames import combine_frames, CalibrationFrameCache
+
+
+def test_median_matches_numpy():
+    cube = np.random.RandomState(1).poisson(100., size=(7, 150, 33)).astype(np.uint16)
+    for n_threads in [1, 4]:
+        combined = combine_frames(cube, 'median', rows_per_chunk=16, n_threads=n_threads)
+        assert combined.dtype == np.float64
+        assert np.array_equal(combined, np.median(cube, axis=0))
+
+
+def test_sigma_clipped_mean_matches_astropy():
+    random_state = np.random.RandomState(2)
+    cube = random_state.normal(100., 3., size=(15, 40, 50))
+    cube[random_state.randint(0, 15, 300), random_state.randint(0, 40, 300), random_state.randint(0, 50, 300)] = 1e4
+    combined = combine_frames(cube, 'sigma-clipped-mean', sigma=3., iters=5, rows_per_chunk=8, n_threads=3)
+    expected = sigma_clip(cube, sigma=3., axis=0).mean(axis=0)
+    assert np.allclose(combined, expected, rtol=1e-12)
+
+
+def test_sigma_clipped_mean_of_all_nan_pixel():
+    cube = np.ones((5, 4, 4))
+    cube[:, 1, 2] = np.nan
+    combined = combine_frames(cube, 'sigma-clipped-mean')
+    assert np.isnan(combined[1, 2])
+    assert np.isfinite(combined).sum() == 15
+
+
+def test_unknown_method():
+    try:
+        combine_frames(np.ones((2, 2, 2)), 'mode')
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
+
+
+def test_cache_keeps_combined_frames(tmpdir):
+    filename = str(tmpdir.join('sky.fits'))
+    open(filename, 'w').close()
+    cube = np.random.RandomState(3).normal(size=(5, 10, 10))
+    cache = CalibrationFrameCache(max_entries=1)
+    first = cache.combined_frame(filename, cube, 'median')
+    assert cache.combined_frame(filename, cube, 'median') is first
+    assert np.array_equal(cache.combined_frame(filename, cube, 'sigma-clipped-mean'),
+                          combine_frames(cube, 'sigma-clipped-mean'))
+    assert len(cache.entries) == 1  # (the median was evicted)
+
+
+def test_cache_dir_is_found_again_by_a_new_cache(tmpdir):
+    filename = str(tmpdir.join('sky.fits'))
+    open(filename, 'w').close()
+    cache_dir = str(tmpdir.join('cache'))
+    cube = np.random.RandomState(4).normal(size=(5, 10, 10))
+    combined = CalibrationFrameCache(cache_dir=cache_dir).combined_frame(filename, cube, 'median')
+    assert len(os.listdir(cache_dir)) == 1
+    # a new cache (e.g. in a later session) finds it on disk, rather than combining the cube again
+    from_disk = CalibrationFrameCache(cache_dir=cache_dir).combined_frame(filename, np.zeros(cube.shape), 'median')
+    assert np.array_equal(from_disk, combined)
+
+
+def test_cache_dir_can_be_turned_off(tmpdir):
+    filename = str(tmpdir.join('sky.fits'))
+    open(filename, 'w').close()
+    cache_dir = str(tmpdir.join('cache'))
+    cube = np.random.RandomState(5).normal(size=(5, 10, 10))
+    cache = CalibrationFrameCache(cache_dir=cache_dir)
+    cache.combined_frame(filename, cube, 'median')
+    cache.cache_dir = None  # (as ZTV.sky_combine_method(cache_dir=None) does)
+    cache.combined_frame(filename, cube, 'sigma-clipped-mean')
+    assert len(os.listdir(cache_dir)) == 1
+    assert len(cache.entries) == 2
@@ -0,0 +1,81 @@
+import ztv.command_dispatch
+from ztv.command_dispatch import CommandDispatcher
+
+
+class _Frame():
+    """
+    the parts of ZTVFrame that CommandDispatcher uses
+    """
+    def __init__(self):
+        self.command_handlers = {}
+        self.current_request_id = None
+        self.cmap = 'gray'
+        self.batch_calls = []
+
+    def tag_reply(self, msg):  # (as ZTVFrame.tag_reply)
+        if self.current_request_id is None:
+            return msg
+        return tuple(msg) + (self.current_request_id,)
+
+    def begin_batch(self, msg=None):
+        self.batch_calls.append('begin')
+
+    def end_batch(self, msg=None):
+        self.batch_calls.append('end')
+
+
+def _dispatcher(monkeypatch):
+    frame = _Frame()
+    published = []
+    replies = []
+    monkeypatch.setattr(ztv.command_dispatch, 'send_to_stream', lambda stream, msg: replies.append(msg))
+    dispatcher = CommandDispatcher(frame, lambda name, msg: published.append((name, msg)))
+    return dispatcher, frame, published, replies
+
+
+def test_dispatch_to_handler_attribute_and_pubsub(monkeypatch):
+    dispatcher, frame, published, replies = _dispatcher(monkeypatch)
+    handled = []
+    frame.command_handlers['set-thing'] = lambda msg: handled.append(msg)
+    dispatcher.dispatch(('set-thing', 5), 0.)
+    dispatcher.dispatch(('set-thing',), 0.)
+    dispatcher.dispatch(('get-cmap', None), 0.)
+    dispatcher.dispatch(('redraw', True), 0.)
+    assert handled == [5, None]
+    assert replies == [('cmap', 'gray')]
+    assert published == [('redraw', True)]
+    assert dispatcher.command_stats['set-thing']['count'] == 2
+    assert sorted(dispatcher.command_stats) == ['get-cmap', 'redraw', 'set-thing']
+
+
+def test_dispatch_tags_replies_with_request_id(monkeypatch):
+    dispatcher, frame, published, replies = _dispatcher(monkeypatch)
+    request_ids_seen = []
+    frame.command_handlers['get-thing'] = lambda msg: request_ids_seen.append(frame.current_request_id)
+    dispatcher.dispatch(('get-thing', None, 7), 0.)
+    dispatcher.dispatch(('get-cmap', None, 8), 0.)
+    dispatcher.dispatch(('get-cmap', None), 0.)
+    assert request_ids_seen == [7]
+    assert replies == [('cmap', 'gray', 8), ('cmap', 'gray')]
+    assert frame.current_request_id is None
+    # (and the request id is put back even when the handler fails)
+    frame.command_handlers['fail'] = lambda msg: 1 / 0
+    try:
+        dispatcher.dispatch(('fail', None, 9), 0.)
+    except ZeroDivisionError:
+        pass
+    assert frame.current_request_id is None
+
+
+def test_dispatch_batch_goes_on_past_failing_commands(monkeypatch):
+    dispatcher, frame, published, replies = _dispatcher(monkeypatch)
+    handled = []
+    frame.command_handlers['set-thing'] = lambda msg: handled.append(msg)
+    frame.command_handlers['fail'] = lambda msg: 1 / 0
+    frame.command_handlers['batch'] = dispatcher.dispatch_batch
+    dispatcher.dispatch(('batch', [('set-thing', 1), ('fail', None), ('get-cmap', None, 3), ('set-thing', 2)]), 0.)
+    assert handled == [1, 2]
+    assert replies == [('cmap', 'gray', 3)]
+    assert frame.batch_calls == ['begin', 'end']
+    assert dispatcher.command_stats['batch']['count'] == 1
+    assert 'fail' not in dispatcher.command_stats
@@ -0,0 +1,48 @@
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap
+from astropy.visualization import LinearStretch, SqrtStretch
+from ztv.display_lut import quantize, display_lut, colorize, bad_pixel_index
+
+
+def _cmap():
+    cmap = LinearSegmentedColormap.from_list('test', ['black', 'red', 'yellow', 'white'])
+    cmap.set_bad('blue')
+    return cmap
+
+
+def test_quantize_spans_clim():
+    im = np.array([[-10., 0., 50., 100., 110.]])
+    index = quantize(im, (0., 100.))
+    assert index.dtype == np.uint16
+    assert index.tolist() == [[0, 0, (bad_pixel_index - 1) // 2, bad_pixel_index - 1, bad_pixel_index - 1]]
+    assert quantize(im, (5., 5.)).tolist() == [[0] * 5]  # (an empty clim shows everything at its low end)
+
+
+def test_quantize_of_unsigned_integers_below_clim():
+    im = np.array([0, 99, 100, 150, 200, 60000], dtype=np.uint16)
+    for clim in [(100, 200), (np.uint16(100), np.uint16(200)), (100., 200.)]:
+        assert quantize(im, clim).tolist() == [0, 0, 0, (bad_pixel_index - 1) // 2,
+                                               bad_pixel_index - 1, bad_pixel_index - 1]
+
+
+def test_quantize_sends_non_finite_pixels_to_the_bad_index():
+    im = np.array([np.nan, np.inf, -np.inf, 1., 1e39], dtype=np.float64)
+    assert quantize(im, (0., 2.)).tolist() == [bad_pixel_index] * 3 + [(bad_pixel_index - 1) // 2,
+                                                                    bad_pixel_index - 1]
+
+
+def test_colorize_matches_matplotlib():
+    im = np.random.RandomState(1).uniform(-20., 120., size=(30, 40))
+    im[3, 4] = np.nan
+    cmap = _cmap()
+    for stretch in [LinearStretch(), SqrtStretch()]:
+        index = quantize(im, (0., 100.))
+        rgba = colorize(index, display_lut(stretch, cmap))
+        assert rgba.shape == (30, 40, 4)
+        assert rgba.dtype == np.uint8
+        good = index != bad_pixel_index
+        assert np.array_equal(rgba[good], cmap(stretch(index[good] / float(bad_pixel_index - 1)), bytes=True))
+        # (which is matplotlib's own rendering, up to the quantization of im to index)
+        expected = cmap(np.ma.masked_invalid(stretch(np.clip(im / 100., 0., 1.))), bytes=True)
+        assert (rgba != expected).any(axis=-1).mean() < 0.01
+        assert rgba[3, 4].tolist() == [0, 0, 255, 255]
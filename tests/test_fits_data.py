@@ -0,0 +1,116 @@
+import gzip
+import numpy as np
+from astropy.io import fits
+from ztv.fits_data import fits_file_is_complete, lazy_image_data, check_fits_file_complete, ScaledImageData
+from ztv.fits_data import FITSFileNotReady
+
+
+def _write_fits(path, data, n_header_cards=0):
+    hdu = fits.PrimaryHDU(data)
+    for i in range(n_header_cards):  # (enough cards push the header past its first 2880 byte block)
+        hdu.header['KEY{}'.format(i)] = i
+    hdu.writeto(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_complete_file(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    _write_fits(path, np.zeros((30, 40), dtype=np.int16), n_header_cards=50)
+    assert fits_file_is_complete(path)
+
+
+def test_truncated_files(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    contents = _write_fits(path, np.zeros((3, 30, 40), dtype=np.float32), n_header_cards=50)
+    n_header_bytes = 2 * 2880
+    n_data_bytes = 3 * 30 * 40 * 4
+    assert len(contents) >= n_header_bytes + n_data_bytes
+    for n_bytes in [0, 100, 2880, n_header_bytes - 1, n_header_bytes, n_header_bytes + n_data_bytes - 1]:
+        with open(path, 'wb') as f:
+            f.write(contents[:n_bytes])
+        assert not fits_file_is_complete(path), n_bytes
+    with open(path, 'wb') as f:
+        f.write(contents[:n_header_bytes + n_data_bytes])  # (the padding at the end of the data isn't needed)
+    assert fits_file_is_complete(path)
+
+
+def test_header_only_file(tmpdir):
+    path = str(tmpdir.join('header.fits'))
+    _write_fits(path, None)
+    assert fits_file_is_complete(path)
+
+
+def test_missing_and_gzipped_files(tmpdir):
+    assert not fits_file_is_complete(str(tmpdir.join('missing.fits')))
+    path = str(tmpdir.join('image.fits.gz'))
+    with gzip.open(path, 'wb') as f:
+        f.write(b'not checked')
+    assert fits_file_is_complete(path)
+
+
+def _open_lazily(path):  # (as ZTVFrame.load_hdulist_from_fitsfile(path, lazy=True))
+    return fits.open(path, ignore_missing_end=True, memmap=True, do_not_scale_image_data=True)
+
+
+def _write_scaled_fits(path, raw, bscale, bzero, blank=None):
+    hdu = fits.PrimaryHDU(raw, do_not_scale_image_data=True)
+    hdu.header['BSCALE'] = bscale
+    hdu.header['BZERO'] = bzero
+    if blank is not None:
+        hdu.header['BLANK'] = blank
+    hdu.writeto(path)
+
+
+def _same_values(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return np.array_equal(np.isnan(a), np.isnan(b)) and np.array_equal(a[~np.isnan(a)], b[~np.isnan(b)])
+
+
+def test_lazy_image_data_matches_astropy_scaling(tmpdir):
+    random_state = np.random.RandomState(1)
+    raw = random_state.randint(-32768, 32767, size=(4, 20, 30)).astype(np.int16)
+    raw[1, 2, 3] = -32768
+    for name, bscale, bzero, blank in [('unsigned', 1, 32768, None), ('scaled', 2.5, 10., -32768),
+                                       ('unscaled', 1, 0, None)]:
+        path = str(tmpdir.join(name + '.fits'))
+        _write_scaled_fits(path, raw, bscale, bzero, blank)
+        expected = fits.getdata(path)
+        with _open_lazily(path) as hdulist:
+            image = lazy_image_data(hdulist[0])
+            assert image.shape == expected.shape
+            assert image.dtype == expected.dtype, name
+            if name == 'unscaled':
+                assert image is hdulist[0].data  # (left memory-mapped)
+            else:
+                assert isinstance(image, ScaledImageData)
+            for n in [0, 1, -1]:  # (one frame at a time)
+                assert _same_values(image[n], expected[n])
+            assert _same_values(np.asarray(image), expected)
+            if blank is not None:
+                assert np.isnan(image[1][2, 3])
+
+
+def test_lazy_image_data_of_2d_scaled_image_is_an_array(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    _write_scaled_fits(path, np.arange(12, dtype=np.int16).reshape(3, 4), 0.5, 100.)
+    with _open_lazily(path) as hdulist:
+        image = lazy_image_data(hdulist[0])
+        assert isinstance(image, np.ndarray)
+        assert np.array_equal(image, fits.getdata(path))
+
+
+def test_check_fits_file_complete(tmpdir):
+    path = str(tmpdir.join('image.fits'))
+    contents = _write_fits(path, np.zeros((3, 30, 40), dtype=np.float32))
+    with _open_lazily(path) as hdulist:
+        check_fits_file_complete(path, hdulist)
+    with open(path, 'wb') as f:
+        f.write(contents[:2880 + 1000])
+    with _open_lazily(path) as hdulist:
+        try:
+            check_fits_file_complete(path, hdulist)
+        except FITSFileNotReady:
+            pass
+        else:
+            assert False, "expected FITSFileNotReady"
@@ -0,0 +1,89 @@
+import threading
+from ztv.fits_loader import FITSLoader
+
+
+class _Reader():
+    """
+    stands in for ZTVFrame.read_fits_file, failing the first n_failures reads of each file (as if still being written)
+    """
+    def __init__(self, n_failures=0):
+        self.n_failures = n_failures
+        self.reads = []
+
+    def __call__(self, filename, memmap=True):
+        self.reads.append((filename, memmap))
+        if len([f for f, m in self.reads if f == filename]) <= self.n_failures:
+            raise IOError("{} is not ready".format(filename))
+        return 'contents of ' + filename
+
+
+class _Results():
+    def __init__(self):
+        self.done = []
+        self.failed = []
+        self._event = threading.Event()
+
+    def on_done(self, serial, filename, result, submit_time, read_sec):
+        self.done.append(result)
+        self._event.set()
+
+    def on_failed(self, filename, error):
+        self.failed.append(filename)
+        self._event.set()
+
+    def wait(self):
+        assert self._event.wait(5.)
+        self._event.clear()
+
+
+def _loader(reader, **kwargs):
+    results = _Results()
+    # (call_after calls straight away, on the loader's thread, instead of on a gui thread)
+    loader = FITSLoader(reader, results.on_done, results.on_failed, lambda fxn, *args: fxn(*args), **kwargs)
+    return loader, results
+
+
+def test_loader_reads_and_retries_until_ready():
+    reader = _Reader(n_failures=2)
+    loader, results = _loader(reader, retry_interval_sec=0.01)
+    loader.submit('a.fits', memmap=False)
+    results.wait()
+    assert results.done == ['contents of a.fits']
+    assert reader.reads == [('a.fits', False)] * 3
+    assert loader.stats['n_failed'] == 0
+
+
+def test_loader_gives_up_on_files_never_ready():
+    loader, results = _loader(_Reader(n_failures=1000), retry_interval_sec=0.01, max_wait_sec=0.1)
+    loader.submit('a.fits')
+    results.wait()
+    assert results.failed == ['a.fits']
+    assert loader.stats['n_failed'] == 1
+
+
+def test_loader_drops_superseded_files_while_waiting_for_display():
+    loader, results = _loader(_Reader())
+    loader.submit('a.fits')
+    results.wait()
+    # the next file isn't read until a.fits has been displayed, and only the latest of these is wanted by then
+    for name in ['b.fits', 'c.fits', 'd.fits']:
+        serial = loader.submit(name)
+    assert loader.is_current(serial)
+    loader.displayed()
+    results.wait()
+    assert results.done == ['contents of a.fits', 'contents of d.fits']
+    assert loader.stats['n_superseded'] == 2
+
+
+def test_loader_queues_files_not_superseding():
+    loader, results = _loader(_Reader())
+    loader.submit('a.fits', supersede=False)
+    results.wait()
+    for name in ['b.fits', 'c.fits']:
+        loader.submit(name, supersede=False)
+    assert loader.stats['n_queued'] == 2
+    for i in range(2):
+        loader.displayed()
+        results.wait()
+    assert results.done == ['contents of a.fits', 'contents of b.fits', 'contents of c.fits']
+    assert loader.stats['n_superseded'] == 0
@@ -0,0 +1,123 @@
+import numpy as np
+from ztv.image_process_action import ImageProcessAction, ProcessedImageStack, FusedImageProcess
+from ztv.image_process_action import fuse_process_functions, apply_process_functions
+
+
+def _process_functions(shape, seed=0):
+    random_state = np.random.RandomState(seed)
+    sky = random_state.normal(100., 5., size=shape[-2:])
+    flat = random_state.uniform(0.8, 1.2, size=shape[-2:])
+    return [('sky-subtraction', ImageProcessAction(np.subtract, sky)),
+            ('flat-division', ImageProcessAction(np.divide, flat))]
+
+
+def _step_by_step(image, process_functions):
+    image = np.array(image)
+    for label, fxn in process_functions:
+        image = fxn(image)
+    return image
+
+
+def test_processed_stack_frames_match_step_by_step():
+    raw_image = np.random.RandomState(1).poisson(1000., size=(20, 30, 40)).astype(np.uint16)
+    process_functions = _process_functions(raw_image.shape)
+    expected = _step_by_step(raw_image, process_functions)
+    stack = ProcessedImageStack(raw_image, process_functions, max_cached_frames=3)
+    assert stack.shape == raw_image.shape
+    assert len(stack) == 20
+    for n in [0, 5, 19, 5, 7, 8, 9, 0, -1]:  # (re-visits frames after they have been evicted from the cache)
+        assert np.array_equal(stack[n], expected[n])
+    assert stack[4, 10, 20] == expected[4, 10, 20]
+    assert np.array_equal(stack[3, 2:5, :], expected[3, 2:5, :])
+    assert stack.dtype == expected.dtype
+
+
+def test_processed_stack_does_not_reuse_frames_still_in_use():
+    raw_image = np.random.RandomState(2).normal(size=(10, 8, 8))
+    process_functions = _process_functions(raw_image.shape)
+    expected = _step_by_step(raw_image, process_functions)
+    stack = ProcessedImageStack(raw_image, process_functions, max_cached_frames=1)
+    held = [stack[n] for n in range(10)]  # (e.g. display_image holding on to each frame in turn)
+    for n in range(10):
+        assert np.array_equal(held[n], expected[n])
+
+
+def test_processed_stack_full_and_cuts_across_frames():
+    raw_image = np.random.RandomState(3).normal(size=(6, 7, 9))
+    process_functions = _process_functions(raw_image.shape)
+    expected = _step_by_step(raw_image, process_functions)
+    stack = ProcessedImageStack(raw_image, process_functions)
+    assert np.array_equal(stack[:, 3, 4], expected[:, 3, 4])
+    assert np.array_equal(np.asarray(stack), expected)
+    assert np.array_equal(stack[2], expected[2])
+
+
+def test_processed_stack_without_process_functions_leaves_raw_image_alone():
+    raw_image = np.arange(60.).reshape(3, 4, 5)
+    stack = ProcessedImageStack(raw_image, [], max_cached_frames=1)
+    for n in [0, 1, 2, 0]:
+        assert np.array_equal(stack[n], raw_image[n])
+    assert np.array_equal(raw_image, np.arange(60.).reshape(3, 4, 5))
+
+
+def test_fused_process_matches_step_by_step():
+    for dtype in [np.uint16, np.int32, np.float32, np.float64]:
+        image = (np.random.RandomState(4).rand(2, 100, 37) * 1000).astype(dtype)
+        process_functions = _process_functions(image.shape)
+        expected = _step_by_step(image, process_functions)
+        for n_threads in [1, 3]:
+            fused_process = fuse_process_functions(process_functions, rows_per_chunk=16, n_threads=n_threads)
+            assert isinstance(fused_process, FusedImageProcess)
+            result = fused_process(image)
+            assert result.dtype == expected.dtype
+            assert np.array_equal(result, expected)
+            assert np.array_equal(fused_process(image[1]), expected[1])
+
+
+def test_fused_process_of_integer_frames():
+    random_state = np.random.RandomState(6)
+    image = random_state.poisson(1000., size=(3, 40, 30)).astype(np.uint16)
+    sky = random_state.poisson(1010., size=(40, 30)).astype(np.uint16)  # (uint16 - uint16 wraps around, as numpy does)
+    flat = random_state.randint(1, 5, size=(40, 30)).astype(np.uint16)
+    for process_functions in [[('flat-division', ImageProcessAction(np.divide, flat))],
+                              [('sky-subtraction', ImageProcessAction(np.subtract, sky))],
+                              [('sky-subtraction', ImageProcessAction(np.subtract, sky)),
+                               ('flat-division', ImageProcessAction(np.divide, flat))],
+                              [('flat-division', ImageProcessAction(np.divide, flat)),
+                               ('sky-subtraction', ImageProcessAction(np.subtract, sky))]]:
+        expected = _step_by_step(image, process_functions)
+        for n_threads in [1, 2]:
+            result = fuse_process_functions(process_functions, rows_per_chunk=16, n_threads=n_threads)(image)
+            assert result.dtype == expected.dtype
+            assert np.array_equal(result, expected)
+
+
+def test_fused_process_reuses_out():
+    image = np.random.RandomState(5).normal(size=(50, 60))
+    process_functions = _process_functions(image.shape)
+    original_image = image.copy()
+    out = np.empty(image.shape)
+    result = apply_process_functions(image, process_functions, out=out)
+    assert result is out
+    assert np.array_equal(result, _step_by_step(image, process_functions))
+    assert np.array_equal(image, original_image)
+    # an out of the wrong dtype can't be used, and is replaced rather than written into at lower precision
+    result = apply_process_functions(image, process_functions, out=np.empty(image.shape, np.float32))
+    assert result.dtype == np.float64
+    assert np.array_equal(result, _step_by_step(image, process_functions))
+
+
+def test_fused_process_skips_actions_of_the_wrong_shape():
+    image = np.ones((10, 10))
+    process_functions = [('sky-subtraction', ImageProcessAction(np.subtract, np.ones((5, 5)))),
+                         ('flat-division', ImageProcessAction(np.divide, np.zeros((10, 10)) + 2.))]
+    assert np.array_equal(apply_process_functions(image, process_functions), image / 2.)
+
+
+def test_unfusable_process_functions_are_applied_in_turn():
+    image = np.arange(20.).reshape(4, 5)
+    process_functions = [('sky-subtraction', ImageProcessAction(np.subtract, np.ones((4, 5)))),
+                         ('square', lambda x: x ** 2)]
+    assert fuse_process_functions(process_functions) is None
+    assert np.array_equal(apply_process_functions(image, process_functions), (image - 1.) ** 2)
+    assert np.array_equal(image, np.arange(20.).reshape(4, 5))
@@ -0,0 +1,145 @@
+import numpy as np
+from astropy.stats import sigma_clipped_stats
+from ztv.image_stats import ImageHistogram, ImageStatistics
+
+
+def test_histogram_min_max_and_count_are_exact():
+    image = np.random.RandomState(1).normal(100., 10., size=(300, 200))
+    image[5, 7] = np.nan
+    image[9, 3] = np.inf
+    histogram = ImageHistogram(image, rows_per_strip=32)
+    finite = image[np.isfinite(image)]
+    assert histogram.n_finite == finite.size
+    assert histogram.counts.sum() == finite.size
+    assert histogram.min == finite.min()
+    assert histogram.max == finite.max()
+
+
+def test_histogram_widens_bins_as_the_range_grows():
+    # each strip reaches further than the last, in both directions, so the bins have to keep doubling
+    image = np.vstack([np.linspace(-10. ** i, 10. ** i, 100) for i in range(6)])
+    histogram = ImageHistogram(image, n_bins=1024, rows_per_strip=1)
+    assert histogram.counts.sum() == image.size
+    assert histogram.lo <= image.min()
+    assert histogram.lo + histogram.n_bins * histogram.bin_width > image.max()
+    assert histogram.min == image.min()
+    assert histogram.max == image.max()
+
+
+def test_histogram_percentiles_match_numpy_to_a_bin_width():
+    image = np.random.RandomState(2).gamma(2., 50., size=(400, 300))
+    histogram = ImageHistogram(image, rows_per_strip=64)
+    for q in [0., 0.5, 1., 10., 50., 90., 99., 99.5, 100.]:
+        assert abs(histogram.percentile(q) - np.percentile(image, q)) <= histogram.bin_width
+
+
+def test_histogram_sigma_clipped_stats_match_astropy():
+    random_state = np.random.RandomState(3)
+    image = random_state.normal(1000., 20., size=(500, 400))
+    image[random_state.randint(0, 500, 2000), random_state.randint(0, 400, 2000)] = 60000.  # e.g. stars
+    histogram = ImageHistogram(image)
+    mean, median, std = histogram.sigma_clipped_stats()
+    expected_mean, expected_median, expected_std = sigma_clipped_stats(image)
+    assert abs(mean - expected_mean) < 0.01 * expected_std
+    assert abs(median - expected_median) < 0.01 * expected_std
+    assert abs(std - expected_std) < 0.01 * expected_std
+
+
+def test_histogram_percentiles_of_one_wild_pixel_are_not_resolved():
+    image = np.random.RandomState(7).normal(1000., 10., size=(1000, 1000))
+    histogram = ImageHistogram(image)
+    assert histogram.percentile_is_resolved(0.5) and histogram.percentile_is_resolved(99.5)
+    image[0, 0] = 1e9  # (stretches the bins to ~15000 wide, so everything else falls in one bin)
+    histogram = ImageHistogram(image)
+    assert not histogram.percentile_is_resolved(0.5)
+    assert not histogram.percentile_is_resolved(99.5)
+    assert histogram.percentile_is_resolved(100.)
+
+
+def test_empty_histogram():
+    histogram = ImageHistogram(np.zeros((4, 4)) + np.nan)
+    assert histogram.n_finite == 0
+    assert np.isnan(histogram.percentile(50.))
+    assert all(np.isnan(histogram.sigma_clipped_stats()))
+
+
+def _image_with_bad_pixels(shape, seed):
+    random_state = np.random.RandomState(seed)
+    image = random_state.normal(500., 30., size=shape)
+    image[random_state.rand(*shape) < 0.01] = np.nan
+    image[3, 4] = np.inf
+    image[5, 6] = -np.inf
+    image[7, 8] = np.inf
+    return image
+
+
+def test_statistics_match_numpy():
+    image = _image_with_bad_pixels((600, 500), seed=4)
+    statistics = ImageStatistics(image, rows_per_strip=64)
+    finite = image[np.isfinite(image)]
+    assert statistics.size == image.size
+    assert statistics.n_finite == finite.size
+    assert statistics.n_nan == np.isnan(image).sum()
+    assert statistics.n_posinf == 2
+    assert statistics.n_neginf == 1
+    assert statistics.min == finite.min()
+    assert statistics.max == finite.max()
+    masked_image = np.where(np.isfinite(image), image, np.nan)
+    assert statistics.argmin == np.unravel_index(np.nanargmin(masked_image), image.shape)
+    assert statistics.argmax == np.unravel_index(np.nanargmax(masked_image), image.shape)
+    assert np.allclose(statistics.mean, finite.mean(), rtol=1e-12)
+    assert np.allclose(statistics.std, finite.std(), rtol=1e-9)
+    assert not statistics.sample_is_complete
+    assert abs(statistics.median() - np.median(finite)) <= statistics.histogram.bin_width
+    assert abs(statistics.percentile(99.5) - np.percentile(finite, 99.5)) <= statistics.histogram.bin_width
+
+
+def test_statistics_of_small_image_are_exact():
+    image = _image_with_bad_pixels((50, 40), seed=5)
+    statistics = ImageStatistics(image)
+    finite = image[np.isfinite(image)]
+    assert statistics.sample_is_complete
+    assert statistics.histogram is None  # (not needed, so not built)
+    assert np.sort(statistics.sample).tolist() == np.sort(finite).tolist()
+    assert statistics.median() == np.median(finite)
+    assert statistics.percentile(10.) == np.percentile(finite, 10.)
+    assert np.allclose(statistics.sigma_clipped_stats(), sigma_clipped_stats(finite))
+
+
+def test_statistics_of_narrow_distribution_fall_back_to_sample():
+    # one wild pixel stretches the histogram's bins far wider than the spread of everything else
+    image = np.random.RandomState(6).normal(100., 0.01, size=(300, 300))
+    image[0, 0] = 1e9
+    statistics = ImageStatistics(image)
+    mean, median, std = statistics.sigma_clipped_stats()
+    assert abs(mean - 100.) < 0.001
+    assert abs(std - 0.01) < 0.001
+
+
+def test_statistics_percentiles_of_one_wild_pixel_fall_back_to_sample():
+    # e.g. the auto-percentile clim, which would otherwise come out at about (1104, 31317)
+    image = np.random.RandomState(7).normal(1000., 10., size=(1000, 1000))
+    image[0, 0] = 1e9
+    statistics = ImageStatistics(image)
+    assert not statistics.sample_is_complete
+    for q in [0.5, 99.5]:
+        assert abs(statistics.percentile(q) - np.percentile(image, q)) < 2.
+    assert statistics.percentile(100.) == 1e9
+    assert abs(statistics.median() - 1000.) < 1.  # (rather than about 16210, from the histogram)
+
+
+def test_statistics_of_empty_image():
+    statistics = ImageStatistics(np.zeros((3, 4)) + np.nan)
+    assert statistics.n_nan == 12
+    assert np.isnan(statistics.median())
+    assert np.isnan(statistics.percentile(10.))
+    assert all(np.isnan(statistics.sigma_clipped_stats()))
+
+
+def test_statistics_of_integer_image():
+    image = np.arange(120, dtype=np.uint16).reshape(10, 12)
+    statistics = ImageStatistics(image, sample_size=10)
+    assert (statistics.min, statistics.max) == (0, 119)
+    assert statistics.argmax == (9, 11)
+    assert statistics.n_nan == 0
+    assert statistics.mean == image.mean()
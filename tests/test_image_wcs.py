@@ -0,0 +1,108 @@
+import numpy as np
+from astropy import wcs
+from astropy.io import fits
+from astropy.coordinates import Angle
+from astropy import units
+from ztv.image_wcs import format_sexagesimal, format_radec, TANSIPTransform, ImageRADec
+
+
+def test_format_sexagesimal():
+    assert format_sexagesimal(12.5) == '12:30:00.00'
+    assert format_sexagesimal(-0.5) == '-00:30:00.00'
+    assert format_sexagesimal(0.5, alwayssign=True) == '+00:30:00.00'
+    assert format_sexagesimal(1. / 3600 * 59.999) == '00:01:00.00'  # (rounding carries into the minutes)
+    assert format_sexagesimal(359.99999999) == '360:00:00.00'
+    assert format_sexagesimal(1.25, precision=0) == '01:15:00'
+    assert format_sexagesimal([1., -2.]) == ['01:00:00.00', '-02:00:00.00']
+
+
+def test_format_sexagesimal_matches_astropy():
+    # (values a third of the way between hundredths of an arcsec, clear of any rounding ambiguity)
+    n_hundredths = np.random.RandomState(1).randint(-90 * 360000, 90 * 360000, 1000)
+    values = (n_hundredths + np.sign(n_hundredths) / 3.) / 360000.
+    expected = Angle(values, units.degree).to_string(sep=':', precision=2, pad=True, alwayssign=True)
+    assert format_sexagesimal(values, alwayssign=True) == list(expected)
+
+
+def test_format_radec():
+    assert format_radec(187.5, -12.25) == '12:30:00.00 -12:15:00.00'
+    assert format_radec([15., 30.], [1., 2.]) == ['01:00:00.00 +01:00:00.00', '02:00:00.00 +02:00:00.00']
+
+
+def _tan_sip_header():
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'] = 2048
+    header['NAXIS2'] = 2048
+    header['CTYPE1'] = 'RA---TAN-SIP'
+    header['CTYPE2'] = 'DEC--TAN-SIP'
+    header['CRVAL1'] = 150.1
+    header['CRVAL2'] = 2.2
+    header['CRPIX1'] = 1024.5
+    header['CRPIX2'] = 1000.
+    header['CD1_1'] = -1.1e-4
+    header['CD1_2'] = 1.5e-6
+    header['CD2_1'] = 2.0e-6
+    header['CD2_2'] = 1.05e-4
+    header['A_ORDER'] = 2
+    header['B_ORDER'] = 2
+    header['A_2_0'] = 2e-6
+    header['A_1_1'] = -1e-6
+    header['A_0_2'] = 3e-7
+    header['B_2_0'] = -4e-7
+    header['B_1_1'] = 1.5e-6
+    header['B_0_2'] = 2e-6
+    return header
+
+
+def _check_matches_wcslib(image_wcs):
+    assert TANSIPTransform.supports(image_wcs)
+    transform = TANSIPTransform(image_wcs)
+    x, y = np.meshgrid(np.linspace(-100., 2100., 23), np.linspace(-100., 2100., 19))
+    ra, dec = transform.radec(x, y)
+    expected_ra, expected_dec = image_wcs.all_pix2world(x, y, 0)
+    d_ra = ((ra - expected_ra + 180.) % 360. - 180.) * np.cos(np.radians(expected_dec))
+    assert np.abs(d_ra).max() * 3600 < 1e-6  # (arcsec)
+    assert np.abs(dec - expected_dec).max() * 3600 < 1e-6
+
+
+def test_tan_sip_transform_matches_wcslib():
+    image_wcs = wcs.WCS(_tan_sip_header())
+    assert image_wcs.sip is not None
+    _check_matches_wcslib(image_wcs)
+
+
+def test_tan_transform_matches_wcslib():
+    header = _tan_sip_header()
+    header['CTYPE1'] = 'RA---TAN'
+    header['CTYPE2'] = 'DEC--TAN'
+    for keyword in list(header.keys()):
+        if keyword[:2] in ('A_', 'B_'):
+            del header[keyword]
+    del header['CD1_1'], header['CD1_2'], header['CD2_1'], header['CD2_2']
+    header['CDELT1'] = -2e-4
+    header['CDELT2'] = 2e-4
+    header['PC1_1'] = 0.9
+    header['PC1_2'] = 0.1
+    header['PC2_1'] = -0.1
+    header['PC2_2'] = 0.9
+    header['CRVAL1'] = 359.99
+    header['CRVAL2'] = 89.
+    _check_matches_wcslib(wcs.WCS(header))
+
+
+def test_other_projections_go_to_wcslib():
+    header = _tan_sip_header()
+    header['CTYPE1'] = 'RA---SIN'
+    header['CTYPE2'] = 'DEC--SIN'
+    for keyword in list(header.keys()):
+        if keyword[:2] in ('A_', 'B_'):
+            del header[keyword]
+    image_wcs = wcs.WCS(header)
+    assert not TANSIPTransform.supports(image_wcs)
+    image_radec = ImageRADec(image_wcs, (2048, 2048))
+    assert image_radec.fast_transform is None
+    ra, dec = image_radec.radec(10., 20.)
+    expected_ra, expected_dec = image_wcs.all_pix2world(10., 20., 0)
+    assert (ra, dec) == (expected_ra, expected_dec)
+    assert image_radec.radec_string(10., 20.) == format_radec(expected_ra, expected_dec)
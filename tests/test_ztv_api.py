@@ -0,0 +1,97 @@
+import itertools
+import threading
+from ztv.ztv_api import ZTV
+from ztv.ztv_lib import StreamListenerTimeOut
+
+
+class _ZTVWithoutGui(ZTV):
+    """
+    ZTV that records the messages it would send, instead of starting a ztv gui to send them to
+    """
+    def __init__(self):
+        self.sent = []
+
+    def _send_to_ztv(self, msg):
+        self.sent.append(msg)
+
+    def _request_return_value_from_ztv(self, request_message, *args, **kwargs):
+        self.sent.append(request_message)
+
+
+class _Replies():
+    """
+    stands in for the StreamListener on ztv's stdout, with the return values given
+    """
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.thread = self
+
+    def read_pickled_message(self, timeout=None):
+        if len(self.replies) == 0:
+            raise StreamListenerTimeOut
+        return self.replies.pop(0)
+
+    def is_alive(self):  # (of the listener's thread:  done once all the replies have been read)
+        return False
+
+
+class _ZTVWithReplies(ZTV):
+    def __init__(self):
+        self.sent = []
+        self._request_ids = itertools.count()
+        self._pending_requests = {}
+        self._pending_requests_lock = threading.Lock()
+        self._batch = None
+
+    def _send_to_ztv(self, msg):
+        self.sent.append(msg)
+
+    def receive(self, replies):
+        self.stream_listener = _Replies(replies)
+        self._dispatch_return_values()
+
+
+def test_return_values_are_matched_by_request_id():
+    z = _ZTVWithReplies()
+    first = z._request_return_value_from_ztv('get-xy-center', block=False)
+    second = z._request_return_value_from_ztv('get-xy-center', block=False)
+    assert z.sent == [('get-xy-center', None, first.request_id), ('get-xy-center', None, second.request_id)]
+    z.receive([('xy-center', (3, 4), second.request_id)])  # (replies can arrive in any order)
+    assert second.done() and not first.done()
+    assert second.result() == (3, 4)
+    z.receive([('xy-center', (1, 2), first.request_id)])
+    assert first.result() == (1, 2)
+    assert z._pending_requests == {}
+
+
+def test_untagged_return_values_go_to_oldest_request():
+    z = _ZTVWithReplies()
+    first = z._request_return_value_from_ztv('get-cmap', block=False)
+    second = z._request_return_value_from_ztv('get-cmap', block=False)
+    z.receive([('cmap', 'gray'), ('cmap', 'jet')])
+    assert (first.result(), second.result()) == ('gray', 'jet')
+
+
+def test_request_after_waits_for_the_earlier_return_value():
+    z = _ZTVWithReplies()
+    first = z._request_return_value_from_ztv(('set-stats-box-parameters', {}), 'set-stats-box-parameters-done',
+                                             block=False)
+    second = z._request_return_value_from_ztv('get-stats-box-info', block=False, after=first)
+    assert len(z.sent) == 1
+    z.receive([('set-stats-box-parameters-done', None, first.request_id)])
+    assert z.sent[1] == ('get-stats-box-info', None, second.request_id)
+    z.receive([('stats-box-info', {'mean': 1.}, second.request_id)])
+    assert second.result() == {'mean': 1.}
+
+
+def test_sky_combine_method_cache_dir(tmpdir):
+    z = _ZTVWithoutGui()
+    z.sky_combine_method('median')
+    assert z.sent == [('set-sky-combine-method', 'median'), 'get-sky-combine-method-and-cache-dir']
+    z.sent = []
+    z.sky_combine_method(cache_dir=str(tmpdir))
+    assert z.sent[0] == ('set-calibration-frame-cache-dir', str(tmpdir))
+    for cache_dir in [None, False]:
+        z.sent = []
+        z.sky_combine_method(cache_dir=cache_dir)
+        assert z.sent == [('set-calibration-frame-cache-dir', None), 'get-sky-combine-method-and-cache-dir']
@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import glob
+import fnmatch
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from .fits_data import fits_file_is_complete
+
+# inotify (linux only) is used through libc with ctypes, so that it needs no extra packages
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000  # the watch is gone, e.g. because the directory was deleted or unmounted
+IN_CLOEXEC = 0o2000000
+inotify_event_struct = struct.Struct('iIII')  # wd, mask, cookie, len (followed by len bytes of name)
+
+# statfs f_type's of network (and fuse, e.g. sshfs) filesystems, on which inotify_add_watch works but changes
+# made from other hosts never produce events
+network_filesystem_types = {0x6969: 'nfs', 0x517B: 'smb', 0xFF534D42: 'cifs', 0xFE534D42: 'smb2',
+                            0x5346414F: 'afs', 0x6B414653: 'afs', 0x73757245: 'coda', 0x564C: 'ncp',
+                            0x00C36400: 'ceph', 0x01021997: '9p', 0x0BD00BD0: 'lustre', 0x47504653: 'gpfs',
+                            0x01161970: 'gfs2', 0x7461636F: 'ocfs2', 0x65735546: 'fuse'}
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # backport of os.scandir for python 2
+    except ImportError:
+        scandir = None
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    _libc.inotify_init1
+    _libc.inotify_add_watch
+    _libc.statfs
+    inotify_available = sys.platform.startswith('linux')
+except (OSError, AttributeError):
+    inotify_available = False
+
+
+def network_filesystem_type(directory):
+    """
+    name (e.g. 'nfs') of the network filesystem directory is on, or None if it is on a local one (or if that
+    can't be told)
+    """
+    buf = ctypes.create_string_buffer(256)  # (struct statfs is 120 bytes on 64-bit linux; f_type comes first)
+    if _libc.statfs(directory.encode(sys.getfilesystemencoding()), buf) != 0:
+        return None
+    f_type = ctypes.c_long.from_buffer(buf).value & 0xFFFFFFFF
+    return network_filesystem_types.get(f_type)
+
+
+def newest_file(paths):
+    """
+    the most recently modified of paths, skipping any that have gone away since they were listed (None if all have)
+    """
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    if len(mtimes) == 0:
+        return None
+    return max(mtimes)[1]
+
+
+class InotifyWatcher():
+    def __init__(self, directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+        """
+        Watches directory (not its sub-directories) for files that are closed after writing (IN_CLOSE_WRITE) or
+        moved into it (IN_MOVED_TO, e.g. a file written elsewhere and then renamed into place).
+        Raises OSError if inotify isn't available, the directory can't be watched (e.g. doesn't exist), or it is
+        on a network filesystem (see network_filesystem_type), in which case fall back to polling.
+        """
+        if not inotify_available:
+            raise OSError(errno.ENOSYS, "inotify not available")
+        filesystem_type = network_filesystem_type(directory)
+        if filesystem_type is not None:
+            raise OSError(errno.EREMOTE, "inotify misses changes made from other hosts to {} ({})".format(
+                          directory, filesystem_type))
+        self.directory = directory
+        self.fd = _libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if _libc.inotify_add_watch(self.fd, directory.encode(sys.getfilesystemencoding()), mask) < 0:
+            cur_errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(cur_errno, "inotify_add_watch failed on {}".format(directory))
+
+    def read(self, timeout=None):
+        """
+        Waits up to timeout seconds (None for forever) for events, and returns them as a list of (mask, name),
+        with name the basename of the file.  A mask with IN_Q_OVERFLOW set means events were lost, and the
+        directory needs to be looked at afresh;  one with IN_IGNORED set means the directory is no longer being
+        watched (e.g. it was deleted), and no more events will come.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return []
+        buf = os.read(self.fd, 65536)
+        events = []
+        i = 0
+        while i + inotify_event_struct.size <= len(buf):
+            wd, mask, cookie, name_length = inotify_event_struct.unpack_from(buf, i)
+            i += inotify_event_struct.size
+            name = buf[i:i + name_length].rstrip(b'\0').decode(sys.getfilesystemencoding())
+            i += name_length
+            events.append((mask, name))
+        return events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FileMatchIndex():
+    def __init__(self, match_string, settle_sec=2.):
+        """
+        Index of (mtime, size) of the files matching match_string (a glob pattern), for polling for new files
+        without re-stat'ing everything every time:  update() lists a directory again only if its own mtime has
+        changed (i.e. files were added, removed or renamed), and stats only files that are new (or, with
+        scandir, have been replaced by a new file of the same name), files that changed in the last settle_sec
+        (i.e. might still be being written), and the newest file.  So a steady-state update costs one stat per
+        directory plus one for the newest file, however many files there are.  The newest file is always
+        re-stat'ed as it may be re-written in place (e.g. a camera overwriting current.fits), which doesn't
+        change its directory's mtime; an older file re-written in place after settle_sec goes unnoticed.
+
+        stats has the duration & counts of the last scan (and totals), e.g. for choosing autoload_pausetime.
+        """
+        self.match_string = match_string
+        self.directory_pattern = os.path.dirname(match_string) or '.'
+        self.name_pattern = os.path.basename(match_string)
+        self.settle_sec = settle_sec
+        self.entries = {}       # path -> (mtime, size, inode)
+        self.directories = {}   # directory -> (its mtime when last listed, names in it matching name_pattern)
+        self.active = set()     # paths that changed within settle_sec, so are re-stat'ed every update
+        self.newest = None      # path of the entry with the latest mtime, also re-stat'ed every update
+        self.stats = {'n_scans':0, 'last_scan_sec':None, 'total_scan_sec':0., 'max_scan_sec':0., 'n_entries':0,
+                      'n_dirs_listed':0, 'n_dirs_skipped':0, 'n_stats':0}
+
+    def _list_directory(self, directory):
+        """
+        returns dict of name -> inode (None if not known without a stat) of the files in directory matching
+        name_pattern
+        """
+        names = {}
+        if scandir is not None:
+            for entry in scandir(directory):
+                if fnmatch.fnmatch(entry.name, self.name_pattern) and entry.is_file():
+                    names[entry.name] = entry.inode()
+        else:
+            for name in os.listdir(directory):
+                if fnmatch.fnmatch(name, self.name_pattern):
+                    names[name] = None
+        return names
+
+    def _forget(self, path):
+        self.entries.pop(path, None)
+        self.active.discard(path)
+        if path == self.newest:
+            self.newest = None
+
+    def _stat(self, path, scan_start_time):
+        """
+        re-stat path, returning True if it is new or has changed
+        """
+        self.stats['n_stats'] += 1
+        try:
+            st = os.stat(path)
+        except OSError:  # gone already
+            self._forget(path)
+            return False
+        new_entry = (st.st_mtime, st.st_size, st.st_ino)
+        changed = self.entries.get(path) != new_entry
+        self.entries[path] = new_entry
+        if st.st_mtime > scan_start_time - self.settle_sec:
+            self.active.add(path)
+        else:
+            self.active.discard(path)
+        if self.newest is None or st.st_mtime >= self.entries[self.newest][0]:
+            self.newest = path
+        return changed
+
+    def update(self):
+        """
+        brings the index up to date, returning list of paths that are new or have changed since the last update
+        """
+        scan_start_time = time.time()
+        self.stats['n_dirs_listed'] = 0
+        self.stats['n_dirs_skipped'] = 0
+        self.stats['n_stats'] = 0
+        changed_paths = []
+        stat_done = set()
+        if glob.has_magic(self.directory_pattern):
+            directories = [d for d in glob.glob(self.directory_pattern) if os.path.isdir(d)]
+        else:
+            directories = [self.directory_pattern]
+        for directory in set(self.directories) - set(directories):  # directories that have gone away
+            for name in self.directories.pop(directory)[1]:
+                self._forget(os.path.join(directory, name))
+        for directory in directories:
+            try:
+                directory_mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            old_mtime, old_names = self.directories.get(directory, (None, {}))
+            # (a directory changed within the last couple of seconds may change again without its mtime changing,
+            #  on filesystems with coarse timestamps, so is always listed)
+            if directory_mtime == old_mtime and directory_mtime < scan_start_time - 2.:
+                self.stats['n_dirs_skipped'] += 1
+                continue
+            self.stats['n_dirs_listed'] += 1
+            try:
+                names = self._list_directory(directory)
+            except OSError:
+                continue
+            for name in set(old_names) - set(names):
+                self._forget(os.path.join(directory, name))
+            for name, inode in names.items():
+                path = os.path.join(directory, name)
+                if path not in self.entries or (inode is not None and inode != self.entries[path][2]):
+                    stat_done.add(path)
+                    if self._stat(path, scan_start_time):
+                        changed_paths.append(path)
+            self.directories[directory] = (directory_mtime, names)
+        if self.newest is None and len(self.entries) > 0:  # (the newest file went away)
+            self.newest = max(self.entries, key=lambda path: self.entries[path][0])
+        for path in list((self.active | set([self.newest])) - stat_done):
+            if path is not None and self._stat(path, scan_start_time):
+                changed_paths.append(path)
+        scan_sec = time.time() - scan_start_time
+        self.stats['n_scans'] += 1
+        self.stats['last_scan_sec'] = scan_sec
+        self.stats['total_scan_sec'] += scan_sec
+        self.stats['max_scan_sec'] = max(self.stats['max_scan_sec'], scan_sec)
+        self.stats['n_entries'] = len(self.entries)
+        return changed_paths
+
+
+readiness_checks = ['fits-complete', 'size-stable', 'sidecar', 'none']
+
+
+class FileReadinessCheck():
+    def __init__(self, method='fits-complete', sidecar_suffix='.done'):
+        """
+        Decides whether a file autoload has spotted is finished being written, by method:
+            'fits-complete' - its primary header's END card and all of the data that header describes are there
+                              (see fits_data.fits_file_is_complete;  .gz files fall back to 'size-stable')
+            'size-stable' - its size hasn't changed since the last time it was checked
+            'sidecar' - a marker file of the same name plus sidecar_suffix (e.g. image.fits.done) exists
+            'none' - always ready
+        """
+        if method not in readiness_checks:
+            raise ValueError("unrecognized readiness check '{}', should be one of: {}".format(method, readiness_checks))
+        self.method = method
+        self.sidecar_suffix = sidecar_suffix
+        self.last_sizes = {}  # path -> size when last checked, for 'size-stable'
+
+    def _size_is_stable(self, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        last_size = self.last_sizes.get(path)
+        self.last_sizes[path] = size
+        return size == last_size
+
+    def is_ready(self, path):
+        if self.method == 'none':
+            return True
+        if self.method == 'sidecar':
+            return os.path.exists(path + self.sidecar_suffix)
+        if self.method == 'size-stable' or path.lower().endswith('.gz'):
+            return self._size_is_stable(path)
+        return fits_file_is_complete(path)
+
+    def forget(self, path):
+        self.last_sizes.pop(path, None)
@@ -0,0 +1,130 @@
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+import warnings
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+
+
+combine_methods = ['median', 'sigma-clipped-mean']
+
+
+def _combine_rows(cube, out, method, sigma, iters, rows_per_chunk, row_starts):
+    for y0 in row_starts:
+        rows = slice(y0, y0 + rows_per_chunk)
+        if method == 'median':
+            out[rows, :] = np.median(cube[:, rows, :], axis=0)
+        else:
+            chunk = cube[:, rows, :].astype(np.float64)
+            for i in range(iters):
+                center = np.nanmedian(chunk, axis=0)
+                std = np.nanstd(chunk, axis=0)
+                clip = np.abs(chunk - center) > sigma * std
+                if not clip.any():
+                    break
+                chunk[clip] = np.nan
+            out[rows, :] = np.nanmean(chunk, axis=0)
+
+
+def combine_frames(cube, method='median', sigma=3., iters=5, rows_per_chunk=64, n_threads=None):
+    """
+    Collapse a 3-d [n,y,x] cube of calibration frames (e.g. skies) to a 2-d [y,x] frame, by either:
+        'median' - median of each pixel through the stack (same as np.median(cube, axis=0))
+        'sigma-clipped-mean' - mean of each pixel through the stack after iteratively (up to iters times)
+                               rejecting values more than sigma std's from that pixel's median
+    The cube is worked through in chunks of rows_per_chunk rows, shared out among n_threads threads
+    (default: one per cpu).
+    """
+    if method not in combine_methods:
+        raise ValueError("unrecognized combine method '{}', should be one of: {}".format(method, combine_methods))
+    if n_threads is None:
+        n_threads = multiprocessing.cpu_count()
+    if method == 'median':
+        out_dtype = np.result_type(cube.dtype, np.float64) if cube.dtype.kind in 'iub' else cube.dtype
+    else:
+        out_dtype = np.float64
+    out = np.empty(cube.shape[1:], dtype=out_dtype)
+    row_starts = range(0, cube.shape[1], rows_per_chunk)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # e.g. from a pixel that is NaN all through the stack
+        threads = [threading.Thread(target=_combine_rows,
+                                    args=(cube, out, method, sigma, iters, rows_per_chunk, row_starts[i::n_threads]))
+                   for i in range(max(1, n_threads))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return out
+
+
+class CalibrationFrameCache():
+    def __init__(self, max_entries=8, cache_dir=None):
+        """
+        Combined (see combine_frames) calibration frames, keyed by the file they came from, its modification time
+        and the combine method, so that re-loading or toggling the same sky cube does not mean combining it again.
+        The most recent max_entries are kept in memory; if cache_dir is set, they are also saved there as .npy
+        files and found again in later sessions.
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()  # key -> combined frame, least recently used first
+
+    def _key(self, filename, method):
+        try:
+            return (os.path.abspath(filename), os.path.getmtime(filename), method)
+        except OSError:  # e.g. file has gone away, in which case there is nothing to key on
+            return None
+
+    def _cache_filename(self, key):
+        key_hash = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'ztv-calibration-' + key_hash + '.npy')
+
+    def _load_from_disk(self, key):
+        if self.cache_dir is None:
+            return None
+        cache_filename = self._cache_filename(key)
+        if not os.path.isfile(cache_filename):
+            return None
+        try:
+            return np.load(cache_filename)
+        except (IOError, ValueError):
+            return None
+
+    def _save_to_disk(self, key, combined):
+        if self.cache_dir is None:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmp_filename = tempfile.mkstemp(suffix='.npy-tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, combined)
+            os.rename(tmp_filename, self._cache_filename(key))  # (so another ztv never sees a half-written file)
+        except (IOError, OSError) as e:
+            sys.stderr.write("ztv warning: could not save combined calibration frame to {}: {}\n".format(
+                             self.cache_dir, e))
+
+    def combined_frame(self, filename, cube, method='median'):
+        """
+        cube (the data of filename) combined with method, from the cache if possible
+        """
+        key = self._key(filename, method)
+        if key is None:
+            return combine_frames(cube, method=method)
+        if key in self.entries:
+            combined = self.entries.pop(key)
+        else:
+            combined = self._load_from_disk(key)
+            if combined is None or combined.shape != cube.shape[1:]:
+                combined = combine_frames(cube, method=method)
+                self._save_to_disk(key, combined)
+        self.entries[key] = combined  # (re-)insert as most recently used
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return combined
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,77 @@
+import sys
+import time
+from .ztv_lib import send_to_stream
+
+
+class CommandDispatcher():
+    def __init__(self, ztv_frame, publish):
+        """
+        Dispatches commands from a ZTV client, (name,) or (name, msg) or (name, msg, request_id), to (in order of
+        preference):
+            - the handler registered for it with ztv_frame.register_command_handler
+            - for 'get-some-thing', the value of a (non-callable) ztv_frame.some_thing
+            - publish(name, msg=msg), e.g. publish=pub.sendMessage for a pubsub message of the same name
+        While a command is handled, ztv_frame.current_request_id is its request_id (or None), so that replies
+        made with ztv_frame.tag_reply can be matched to the request by the client.
+
+        The time each command waited in the queue and took to execute is accumulated in command_stats
+        and returned by the 'get-command-stats' request.  Must only be used from the main (gui) thread.
+        """
+        self.ztv_frame = ztv_frame
+        self.publish = publish
+        self.command_stats = {}  # command name -> dict of count and wait/exec timings, see record_command_timing
+        self._fallback_handlers = {}  # cache of handlers for commands without a registered handler
+
+    def _get_fallback_handler(self, command_name):
+        if command_name not in self._fallback_handlers:
+            attribute_name = command_name[4:].replace('-', '_')
+            if (command_name.startswith('get-') and hasattr(self.ztv_frame, attribute_name) and
+                not callable(getattr(self.ztv_frame, attribute_name))):
+                # catch the easiest cases where we just want some parameter out of ztv_frame, e.g.:
+                # ztv.frame_cmap is returned by the request message 'get-cmap'
+                handler = lambda msg: send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+                                                         (command_name[4:], getattr(self.ztv_frame, attribute_name))))
+            else:
+                handler = lambda msg: self.publish(command_name, msg=msg)
+            self._fallback_handlers[command_name] = handler
+        return self._fallback_handlers[command_name]
+
+    def dispatch(self, x, time_received):
+        start_time = time.time()
+        handler = self.ztv_frame.command_handlers.get(x[0])
+        if handler is None:
+            handler = self._get_fallback_handler(x[0])
+        previous_request_id = self.ztv_frame.current_request_id
+        self.ztv_frame.current_request_id = x[2] if len(x) > 2 else None  # (replies are tagged with it)
+        try:
+            handler(None if len(x) == 1 else x[1])
+        finally:
+            self.ztv_frame.current_request_id = previous_request_id
+        self.record_command_timing(x[0], start_time - time_received, time.time() - start_time)
+
+    def dispatch_batch(self, msg):
+        """
+        msg is a list of messages, applied with redraws held off until all are done (see ZTV.batch).
+        A message that fails is reported on stderr and skipped, and the rest of the batch still goes ahead.
+        """
+        self.ztv_frame.begin_batch()
+        try:
+            for cur_x in msg:
+                try:
+                    self.dispatch(cur_x, time.time())
+                except Exception as e:
+                    sys.stderr.write("ztv warning: batched command {} failed: {!r}\n".format(cur_x[0], e))
+        finally:
+            self.ztv_frame.end_batch()
+
+    def record_command_timing(self, command_name, wait_sec, exec_sec):
+        stats = self.command_stats.setdefault(command_name, {'count':0, 'total_wait_sec':0., 'max_wait_sec':0.,
+                                                             'total_exec_sec':0., 'max_exec_sec':0.})
+        stats['count'] += 1
+        stats['total_wait_sec'] += wait_sec
+        stats['max_wait_sec'] = max(stats['max_wait_sec'], wait_sec)
+        stats['total_exec_sec'] += exec_sec
+        stats['max_exec_sec'] = max(stats['max_exec_sec'], exec_sec)
+
+    def publish_command_stats_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('command-stats', self.command_stats)))
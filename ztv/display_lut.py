@@ -0,0 +1,47 @@
+import numpy as np
+
+
+display_lut_size = 65536  # number of entries in the scaling+cmap lookup table; indices fit in uint16
+bad_pixel_index = display_lut_size - 1  # the table's last entry is the cmap's "bad" color, for non-finite pixels
+
+
+def quantize(im, clim):
+    """
+    im mapped linearly from clim onto the indices 0..(bad_pixel_index - 1) of a display lut, as uint16.
+    Values outside clim are clipped to the ends; non-finite pixels (NaN and +/-inf) go to bad_pixel_index,
+    which the lut shows in the cmap's "bad" color, as matplotlib itself would.
+    """
+    if clim[1] > clim[0]:
+        scale = (bad_pixel_index - 1) / float(clim[1] - clim[0])
+    else:
+        scale = 0.
+    index = np.empty(im.shape, dtype=np.float32)
+    with np.errstate(over='ignore', invalid='ignore'):
+        # (in float, so that e.g. uint16 pixels below clim[0] don't wrap around)
+        np.subtract(im, clim[0], out=index, dtype=np.result_type(im.dtype, np.float32))
+        index *= scale
+    index += 0.5
+    np.clip(index, 0, bad_pixel_index - 1, out=index)
+    index[np.isnan(index)] = 0  # (only finite values overflowing float32 with scale 0 get here)
+    if im.dtype.kind == 'f':
+        index[~np.isfinite(im)] = bad_pixel_index
+    return index.astype(np.uint16)
+
+
+def display_lut(stretch, cmap):
+    """
+    (display_lut_size x 4) uint8 RGBA table of stretch (e.g. an astropy.visualization Stretch, taking 0..1 to
+    0..1) followed by cmap (a matplotlib Colormap), for the indices quantize() produces.  Its last entry,
+    bad_pixel_index, is the cmap's "bad" color.
+    """
+    lut = np.empty((display_lut_size, 4), dtype=np.uint8)
+    lut[:bad_pixel_index] = cmap(stretch(np.linspace(0., 1., bad_pixel_index)), bytes=True)
+    lut[bad_pixel_index] = cmap(np.ma.masked_invalid([np.nan]), bytes=True)[0]
+    return lut
+
+
+def colorize(index, lut):
+    """
+    RGBA (uint8) image of index, the output of quantize(), through lut
+    """
+    return lut.take(index, axis=0)
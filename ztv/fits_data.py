@@ -0,0 +1,129 @@
+import os
+import numpy as np
+
+
+class FITSFileNotReady(Exception): pass
+
+
+class ScaledImageData():
+    def __init__(self, data, bscale=1., bzero=0., blank=None):
+        """
+        Stands in for the BSCALE/BZERO scaled data of a FITS image hdu that was opened with
+        do_not_scale_image_data=True, so that data can stay memory-mapped:  indexing scales only the part
+        of data that is asked for, e.g. ScaledImageData(...)[n] reads & scales just frame n of a cube.
+
+        Values match astropy's own scaling:  BITPIX=16/32/64 with BSCALE=1, BZERO=2**(BITPIX-1) come out as
+        unsigned integers, otherwise as float32 (BITPIX 8/16) or float64, with BLANK pixels set to NaN.
+        """
+        self.data = data
+        self.bscale = bscale
+        self.bzero = bzero
+        self.blank = blank
+        self.shape = data.shape
+        self.ndim = data.ndim
+        self.is_unsigned = (data.dtype.kind == 'i' and bscale == 1 and
+                            bzero == 2 ** (8 * data.dtype.itemsize - 1))
+        if self.is_unsigned:
+            self.dtype = np.dtype('u{}'.format(data.dtype.itemsize))
+        elif data.dtype.kind in 'iub' and data.dtype.itemsize <= 2:
+            self.dtype = np.dtype(np.float32)
+        else:
+            self.dtype = np.dtype(np.float64)
+
+    def _scale(self, raw):
+        if self.is_unsigned:
+            # adding 2**(n-1) to an n-bit signed integer is the same as flipping its sign bit
+            raw = raw.astype(raw.dtype.newbyteorder('='))
+            return raw.view(self.dtype) ^ self.dtype.type(self.bzero)
+        scaled = raw.astype(self.dtype)
+        if self.bscale != 1:
+            scaled *= self.bscale
+        if self.bzero != 0:
+            scaled += self.bzero
+        if self.blank is not None and raw.dtype.kind in 'iub':
+            scaled[raw == self.blank] = np.nan
+        return scaled
+
+    def __getitem__(self, index):
+        return self._scale(np.asarray(self.data[index]))
+
+    def __array__(self, dtype=None):
+        scaled = self._scale(np.asarray(self.data))
+        if dtype is not None:
+            scaled = scaled.astype(dtype)
+        return scaled
+
+    def __len__(self):
+        return self.shape[0]
+
+
+def lazy_image_data(hdu):
+    """
+    data of hdu (opened with memmap=True, do_not_scale_image_data=True, see ZTVFrame.load_hdulist_from_fitsfile)
+    without reading it all in:  unscaled data is returned as is (a memmap), and scaled 3-d data as a
+    ScaledImageData.  (2-d scaled data is scaled all at once, as all of a 2-d image is displayed anyway.)
+    """
+    data = hdu.data
+    if data is None:
+        return data
+    bscale = hdu.header.get('BSCALE', 1)
+    bzero = hdu.header.get('BZERO', 0)
+    if bscale == 1 and bzero == 0:
+        return data
+    image = ScaledImageData(data, bscale=bscale, bzero=bzero, blank=hdu.header.get('BLANK', None))
+    if image.ndim != 3:
+        return np.asarray(image)
+    return image
+
+
+def check_fits_file_complete(filename, hdulist):
+    """
+    Cheap check (no data read) that filename, opened as hdulist, is not still being written:  raises
+    FITSFileNotReady if the file is shorter than its primary header says its data should be.
+    (.gz files can't be checked this way; a truncated one fails when its data are read instead.)
+    """
+    if filename.lower().endswith('.gz'):
+        return
+    header = hdulist[0].header
+    n_data_bytes = 0
+    if header.get('NAXIS', 0) > 0:
+        n_data_bytes = abs(header['BITPIX']) // 8
+        for i in range(1, header['NAXIS'] + 1):
+            n_data_bytes *= header['NAXIS{}'.format(i)]
+    expected_size = hdulist.fileinfo(0)['datLoc'] + n_data_bytes
+    if os.path.getsize(filename) < expected_size:
+        raise FITSFileNotReady("{} is {} bytes long, expected at least {}".format(
+                               filename, os.path.getsize(filename), expected_size))
+
+
+def fits_file_is_complete(filename):
+    """
+    Checks, by reading just its primary header (no astropy needed), whether filename has got as far as the
+    END card of its primary header and the full length of the data the header describes, i.e. isn't obviously
+    still being written.  (.gz files can't be checked this way, and are always taken as complete.)
+    """
+    if filename.lower().endswith('.gz'):
+        return True
+    values = {}
+    n_header_bytes = 0
+    try:
+        with open(filename, 'rb') as f:
+            while True:
+                block = f.read(2880)
+                if len(block) < 2880:
+                    return False
+                n_header_bytes += 2880
+                for i in range(0, 2880, 80):
+                    card = block[i:i + 80].decode('ascii', 'replace')
+                    keyword = card[:8].strip()
+                    if keyword == 'END':
+                        n_data_bytes = 0
+                        if values.get('NAXIS', 0) > 0:
+                            n_data_bytes = abs(values['BITPIX']) // 8
+                            for n in range(1, values['NAXIS'] + 1):
+                                n_data_bytes *= values['NAXIS{}'.format(n)]
+                        return os.path.getsize(filename) >= n_header_bytes + n_data_bytes
+                    if (keyword == 'BITPIX' or keyword.startswith('NAXIS')) and card[8:10] == '= ':
+                        values[keyword] = int(card[10:].split('/')[0])
+    except (IOError, OSError, ValueError, KeyError):
+        return False
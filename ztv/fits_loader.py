@@ -0,0 +1,103 @@
+import time
+import threading
+from collections import deque
+
+
+class FITSLoader(threading.Thread):
+    """
+    Reads fits files (see ZTVFrame.read_fits_file) in the background, so that a slow disk, a big .fits.gz or a
+    file that is still being written never holds up the gui.  submit(filename) replaces anything queued (only the
+    most recent request matters), while submit(filename, supersede=False) queues filename behind the requests
+    already waiting, so that every one is shown.  submit(filename, memmap=False) reads the file's data into
+    memory rather than memory-mapping it (see ZTVFrame.read_fits_file).  A file that is not readable yet (e.g.
+    autoload saw it before it was fully written) is tried again every retry_interval_sec, for up to max_wait_sec,
+    but only until a superseding request comes in.  Results are handed back on the gui thread with call_after (i.e. wx.CallAfter):
+        call_after(on_done, serial, filename, result, submit_time, read_sec)
+    and files that never became readable with call_after(on_failed, filename, error).  on_done must call
+    displayed() when it is finished with a result:  the next file isn't read until then (for up to
+    max_display_wait_sec), so that if files come in faster than the gui can show them they wait (and, for
+    superseding requests, get dropped) here instead of piling up, already read, in the gui's event queue.
+    stats keeps count of loads, of requests dropped because a newer one came in, and of failures, along with
+    read times (and, filled in by on_done, latency from request to display).
+    """
+    def __init__(self, read_fits_file, on_done, on_failed, call_after, retry_interval_sec=0.1, max_wait_sec=5.,
+                 max_display_wait_sec=10.):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.read_fits_file = read_fits_file
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.call_after = call_after
+        self.retry_interval_sec = retry_interval_sec
+        self.max_wait_sec = max_wait_sec
+        self.max_display_wait_sec = max_display_wait_sec
+        self.stats = {'n_loaded':0, 'n_superseded':0, 'n_failed':0, 'n_queued':0,
+                      'last_read_sec':None, 'total_read_sec':0., 'max_read_sec':0.,
+                      'last_latency_sec':None, 'total_latency_sec':0., 'max_latency_sec':0.}
+        self._condition = threading.Condition()
+        self._jobs = deque()  # (serial, filename, submit_time, memmap)'s waiting to be started
+        self._serial = 0    # bumped by every superseding submit and cancel, so that older jobs can tell they are stale
+        self._displayed = threading.Event()  # set by displayed(), when the gui is done with the last result
+        self._displayed.set()
+        self.start()
+
+    def submit(self, filename, supersede=True, memmap=True):
+        with self._condition:
+            if supersede:
+                self.stats['n_superseded'] += len(self._jobs)
+                self._jobs.clear()
+                self._serial += 1
+            self._jobs.append((self._serial, filename, time.time(), memmap))
+            self.stats['n_queued'] = len(self._jobs)
+            self._condition.notify()
+        return self._serial
+
+    def cancel(self):
+        with self._condition:
+            self._serial += 1
+            self._jobs.clear()
+            self.stats['n_queued'] = 0
+
+    def is_current(self, serial):
+        return serial == self._serial
+
+    def displayed(self):
+        self._displayed.set()
+
+    def record_latency(self, latency_sec):
+        self.stats['n_loaded'] += 1
+        self.stats['last_latency_sec'] = latency_sec
+        self.stats['total_latency_sec'] += latency_sec
+        self.stats['max_latency_sec'] = max(self.stats['max_latency_sec'], latency_sec)
+
+    def run(self):
+        while True:
+            self._displayed.wait(self.max_display_wait_sec)
+            with self._condition:
+                while len(self._jobs) == 0:
+                    self._condition.wait()
+                serial, filename, submit_time, memmap = self._jobs.popleft()
+                self.stats['n_queued'] = len(self._jobs)
+            while True:
+                start_time = time.time()
+                try:
+                    result = self.read_fits_file(filename, memmap=memmap)
+                except Exception as e:  # most likely the file is still being written
+                    with self._condition:
+                        if serial == self._serial and time.time() - submit_time < self.max_wait_sec:
+                            self._condition.wait(self.retry_interval_sec)  # (submit() wakes this up early)
+                    if serial != self._serial:
+                        self.stats['n_superseded'] += 1
+                        break
+                    if time.time() - submit_time >= self.max_wait_sec:
+                        self.stats['n_failed'] += 1
+                        self.call_after(self.on_failed, filename, e)
+                        break
+                else:
+                    read_sec = time.time() - start_time
+                    self.stats['last_read_sec'] = read_sec
+                    self.stats['total_read_sec'] += read_sec
+                    self.stats['max_read_sec'] = max(self.stats['max_read_sec'], read_sec)
+                    self._displayed.clear()
+                    self.call_after(self.on_done, serial, filename, result, submit_time, read_sec)
+                    break
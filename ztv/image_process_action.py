@@ -1,4 +1,7 @@
 import sys
+import threading
+from collections import OrderedDict
+import numpy as np
 
 class ImageProcessAction():
     def __init__(self, math_function, x2):
@@ -33,3 +36,173 @@ class ImageProcessAction():
             return x1
         return self.math_function(x1, self.x2)
 
+
+
+class FusedImageProcess():
+    def __init__(self, actions, rows_per_chunk=64, n_threads=1):
+        """
+        A chain of ImageProcessAction's whose math_functions are all elementwise numpy ufuncs (np.subtract,
+        np.divide, ...), done as one kernel:  the dtype of each step is worked out once up front, the result is written
+        into a single output array (which can be handed in to be re-used), and the chain is run over chunks
+        of rows_per_chunk rows at a time, so each chunk is worked on while it is still in cache.  With
+        n_threads > 1 the chunks are split among that many threads (numpy releases the GIL in ufuncs).
+
+        Use fuse_process_functions() to build one from a list of process functions.
+        """
+        self.actions = actions
+        self.rows_per_chunk = rows_per_chunk
+        self.n_threads = n_threads
+
+    def _run_rows(self, image, actions, dtypes, out, row_starts):
+        for y0 in row_starts:
+            rows = slice(y0, y0 + self.rows_per_chunk)
+            source = image[..., rows, :]
+            for action, dtype in zip(actions, dtypes):
+                if dtype == out.dtype:
+                    result = out[..., rows, :]
+                else:  # (an intermediate step of another dtype, e.g. uint16 - uint16 before a division)
+                    result = np.empty(out[..., rows, :].shape, dtype=dtype)
+                action.math_function(source, action.x2[rows, :], out=result)
+                source = result
+            if len(actions) == 0:
+                out[..., rows, :] = source
+
+    @staticmethod
+    def output_dtypes(image_dtype, actions):
+        """
+        the dtype each of actions in turn produces, starting from image_dtype, as found by running each ufunc
+        on one-element samples (e.g. uint16 - uint16 is uint16, but uint16 / uint16 is float64)
+        """
+        dtypes = []
+        dtype = image_dtype
+        for action in actions:
+            dtype = action.math_function(np.ones(1, dtype=dtype), np.ones(1, dtype=action.x2.dtype)).dtype
+            dtypes.append(dtype)
+        return dtypes
+
+    def __call__(self, image, out=None):
+        actions = []
+        for action in self.actions:
+            if (image.shape[-1] != action.x2.shape[-1]) or (image.shape[-2] != action.x2.shape[-2]):
+                sys.stderr.write("Warning: image process action not performed because x/y shapes of arrays do not match\n")
+            else:
+                actions.append(action)
+        dtypes = self.output_dtypes(image.dtype, actions)  # (image may be a ScaledImageData)
+        dtype = dtypes[-1] if len(dtypes) > 0 else image.dtype
+        if out is None or out.shape != image.shape or out.dtype != dtype:
+            out = np.empty(image.shape, dtype=dtype)
+        row_starts = range(0, image.shape[-2], self.rows_per_chunk)
+        if self.n_threads <= 1:
+            self._run_rows(image, actions, dtypes, out, row_starts)
+        else:
+            threads = [threading.Thread(target=self._run_rows, args=(image, actions, dtypes, out, row_starts[i::self.n_threads]))
+                       for i in range(self.n_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return out
+
+
+def fuse_process_functions(process_functions, **kwargs):
+    """
+    process_functions is a list of (label, fxn) as in ZTVFrame.image_process_functions_to_apply.
+    Returns a FusedImageProcess doing all of them at once, or None if any fxn is something other than an
+    ImageProcessAction of a 2-in/1-out numpy ufunc with a 2-d x2 (in which case they have to be applied
+    one after another).
+    """
+    actions = [fxn for label, fxn in process_functions]
+    for action in actions:
+        if not (isinstance(action, ImageProcessAction) and isinstance(action.math_function, np.ufunc) and
+                action.math_function.nin == 2 and action.math_function.nout == 1 and
+                np.ndim(action.x2) == 2):
+            return None
+    return FusedImageProcess(actions, **kwargs)
+
+
+def apply_process_functions(image, process_functions, out=None):
+    """
+    image run through process_functions (list of (label, fxn)), fused into one pass when possible
+    (see fuse_process_functions), in which case out may be given as an array to re-use for the result.
+    image itself is never modified.
+    """
+    if len(process_functions) == 0:
+        return image
+    fused_process = fuse_process_functions(process_functions)
+    if fused_process is not None:
+        return fused_process(image, out=out)
+    image = np.array(image)
+    for cur_imageproc_label, cur_imageproc_fxn in process_functions:
+        image = cur_imageproc_fxn(image)
+    return image
+
+
+class ProcessedImageStack():
+    def __init__(self, raw_image, process_functions, max_cached_frames=16):
+        """
+        Stands in for the processed 3-d proc_image [z,y,x] of a 3-d raw_image, without processing the whole cube
+        up front:  each frame is run through process_functions (list of (label, fxn) as in
+        ZTVFrame.image_process_functions_to_apply) only when it is asked for, and the most recently used
+        max_cached_frames processed frames are kept.
+
+        Indexing with a frame number first, e.g. stack[n] or stack[n, :, :] or stack[n, y, x], only processes
+        frame n.  Anything that cuts across frames, e.g. stack[:, y, x] for a plot through the stack, or
+        np.asarray(stack), processes the full cube (once; it is then kept).
+        """
+        self.raw_image = raw_image
+        self.process_functions = list(process_functions)
+        self.max_cached_frames = max_cached_frames
+        self.frames = OrderedDict()   # frame number -> processed frame, least recently used first
+        self.spare_frame = None       # array of the last frame evicted from frames, re-used for the next one
+        self.full_stack = None
+        self.shape = raw_image.shape
+        self.ndim = raw_image.ndim
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def dtype(self):
+        return self.frame(0).dtype
+
+    def frame(self, n):
+        if n < 0:
+            n += self.shape[0]
+        if n < 0 or n >= self.shape[0]:
+            raise IndexError("frame {} out of range for {} frames".format(n, self.shape[0]))
+        if self.full_stack is not None:
+            return self.full_stack[n]
+        if n in self.frames:
+            processed_frame = self.frames.pop(n)
+        else:
+            processed_frame = apply_process_functions(self.raw_image[n], self.process_functions, out=self.spare_frame)
+            if processed_frame is self.spare_frame:
+                self.spare_frame = None
+        self.frames[n] = processed_frame  # (re-)insert as most recently used
+        while len(self.frames) > self.max_cached_frames:
+            evicted_n, evicted_frame = self.frames.popitem(last=False)
+            # re-use the evicted array only if nothing else (e.g. display_image, or a view of it) still holds it
+            # (and it isn't a view of raw_image, as it is when there are no process_functions)
+            if len(self.process_functions) > 0 and sys.getrefcount(evicted_frame) <= 2:
+                self.spare_frame = evicted_frame
+        return processed_frame
+
+    def full(self):
+        """
+        the whole processed cube, as an array
+        """
+        if self.full_stack is None:
+            self.full_stack = apply_process_functions(self.raw_image, self.process_functions)
+            self.frames.clear()
+            self.spare_frame = None
+        return self.full_stack
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.full(), dtype=dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.frame(key)
+        if isinstance(key, tuple) and len(key) > 0 and isinstance(key[0], (int, np.integer)):
+            return self.frame(key[0])[key[1:]]
+        return self.full()[key]
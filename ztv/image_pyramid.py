@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+
+
+def block_average(im, factor=2, rows_per_strip=512, is_cancelled=None):
+    """
+    Average a 2-d image over factor x factor blocks, ignoring non-finite pixels.  Blocks at the right/bottom
+    edges that are only partially covered by the image are averaged over the pixels they do have, and blocks
+    with no finite pixels at all come out as NaN.
+
+    Works through the image in strips of rows_per_strip output rows, so that the temporary arrays stay small
+    even for very large images.  If is_cancelled is given, it is called before each strip, and once it
+    returns True block_average stops there and returns None.
+    """
+    ny, nx = im.shape
+    out_ny, out_nx = -(-ny // factor), -(-nx // factor)
+    out = np.empty((out_ny, out_nx), dtype=np.result_type(im.dtype, np.float32))
+    for out_y0 in range(0, out_ny, rows_per_strip):
+        if is_cancelled is not None and is_cancelled():
+            return None
+        out_y1 = min(out_y0 + rows_per_strip, out_ny)
+        strip = im[out_y0 * factor:out_y1 * factor, :]
+        padded = np.empty(((out_y1 - out_y0) * factor, out_nx * factor), dtype=out.dtype)
+        padded.fill(np.nan)
+        padded[:strip.shape[0], :nx] = strip
+        finite_mask = np.isfinite(padded)
+        padded[~finite_mask] = 0.
+        blocks_shape = (out_y1 - out_y0, factor, out_nx, factor)
+        sums = padded.reshape(blocks_shape).sum(axis=3).sum(axis=1)
+        counts = finite_mask.reshape(blocks_shape).sum(axis=3).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[out_y0:out_y1, :] = sums / counts
+    return out
+
+
+class ImagePyramid():
+    def __init__(self, image, min_size=64, on_level_ready=None):
+        """
+        Multi-resolution copies of a 2-d image, for displaying it at less than full resolution.
+        levels[0] is image itself and levels[n] is image block-averaged over 2**n x 2**n pixels, down to
+        the first level whose larger dimension is <= min_size.
+
+        Levels are built (each from the one before) in a background thread, started here.  Until a level is
+        ready, get_level() stands in a subsample of the finest level that is ready, so there is always
+        something to show.  on_level_ready(pyramid, n) is called from the background thread as each
+        level n is finished.
+        """
+        self.image = image
+        self.n_levels = 1
+        while max(image.shape) > min_size * (2 ** (self.n_levels - 1)):
+            self.n_levels += 1
+        self.levels = [image] + [None] * (self.n_levels - 1)
+        self.on_level_ready = on_level_ready
+        self.cancelled = False
+        self.thread = None
+        if self.n_levels > 1:
+            self.thread = threading.Thread(target=self._build_levels)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def cancel(self):
+        """
+        stop building levels, e.g. because the image is no longer being displayed
+        """
+        self.cancelled = True
+
+    def _build_levels(self):
+        for n in range(1, self.n_levels):
+            if self.cancelled:
+                return
+            # (checked strip by strip, so that e.g. blinking through a cube, which replaces the pyramid for every
+            #  frame, doesn't leave full-frame passes for frames long gone running alongside each other)
+            level = block_average(self.levels[n - 1], is_cancelled=lambda: self.cancelled)
+            if level is None:
+                return
+            self.levels[n] = level
+            if self.on_level_ready is not None and not self.cancelled:
+                self.on_level_ready(self, n)
+
+    def level_for_zoom(self, zoom_factor):
+        """
+        coarsest level that still has at least one level pixel per screen pixel at zoom_factor (screen pixels
+        per image pixel)
+        """
+        if zoom_factor >= 1.:
+            return 0
+        return int(min(self.n_levels - 1, np.floor(np.log2(1. / zoom_factor))))
+
+    def is_ready(self, n):
+        return self.levels[min(n, self.n_levels - 1)] is not None
+
+    def get_level(self, n):
+        """
+        returns level n (downsampled by 2**n), or if it is not built yet, a subsample of the finest level
+        that is (which has the same shape)
+        """
+        n = min(n, self.n_levels - 1)
+        finest_ready = n
+        while self.levels[finest_ready] is None:
+            finest_ready -= 1
+        if finest_ready == n:
+            return self.levels[n]
+        step = 2 ** (n - finest_ready)
+        return self.levels[finest_ready][::step, ::step]
@@ -0,0 +1,251 @@
+import numpy as np
+from astropy.stats import sigma_clipped_stats
+
+
+class ImageHistogram():
+    def __init__(self, image=None, n_bins=65536, rows_per_strip=256):
+        """
+        Fixed-size histogram of the finite pixels of image, built in a single pass over image (in strips of
+        rows_per_strip rows, so temporaries stay small) without knowing the data range ahead of time:  the bins
+        start out as narrow as the first strip's range allows, and whenever later data fall outside the current
+        range the bin width is doubled (merging neighboring pairs of bins) until they fit.
+
+        min/max and the number of finite pixels are exact; mean/std/percentiles are good to about a bin width.
+
+        With image=None the histogram starts out empty, to be filled with add()  (see ImageStatistics)
+        """
+        self.n_bins = n_bins
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.lo = None         # lower edge of bin 0
+        self.bin_width = None
+        self.n_finite = 0
+        self.min = None
+        self.max = None
+        if image is not None:
+            image = np.asarray(image)
+            if image.ndim < 2:
+                image = image.reshape(1, -1)
+            for y0 in range(0, image.shape[0], rows_per_strip):
+                strip = image[y0:y0 + rows_per_strip]
+                self.add(strip[np.isfinite(strip)])
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    def _double_bin_width(self, extend_down):
+        half = self.n_bins // 2
+        merged = self.counts.reshape(half, 2).sum(axis=1)
+        self.counts[:] = 0
+        if extend_down:
+            self.counts[half:] = merged
+            self.lo -= self.n_bins * self.bin_width
+        else:
+            self.counts[:half] = merged
+        self.bin_width *= 2.
+
+    def add(self, values):
+        """
+        add the (finite) values to the histogram
+        """
+        if values.size == 0:
+            return
+        values_min, values_max = values.min(), values.max()
+        if self.lo is None:
+            self.lo = float(values_min)
+            if values_max > values_min:
+                self.bin_width = (float(values_max) - self.lo) / (self.n_bins - 1)
+            else:
+                self.bin_width = max(abs(self.lo), 1.) * 1e-6
+            self.min, self.max = values_min, values_max
+        else:
+            self.min, self.max = min(self.min, values_min), max(self.max, values_max)
+        while values_min < self.lo or values_max >= self.lo + self.n_bins * self.bin_width:
+            self._double_bin_width(extend_down=(values_min < self.lo))
+        index = ((values - self.lo) / self.bin_width).astype(np.intp)
+        np.clip(index, 0, self.n_bins - 1, out=index)
+        self.counts += np.bincount(index.ravel(), minlength=self.n_bins)
+        self.n_finite += values.size
+
+    def bin_centers(self):
+        return self.lo + (np.arange(self.n_bins) + 0.5) * self.bin_width
+
+    def percentile(self, q):
+        """
+        q-th percentile (0-100) of the finite pixels, interpolated linearly within its bin
+        """
+        if self.n_finite == 0:
+            return np.nan
+        return self._percentile(self.counts, q)
+
+    def _percentile_bin(self, cumulative, q):
+        target = (q / 100.) * cumulative[-1]
+        return target, min(np.searchsorted(cumulative, target), self.n_bins - 1)
+
+    def _percentile(self, counts, q):
+        cumulative = np.cumsum(counts)
+        target, i = self._percentile_bin(cumulative, q)
+        below = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - below) / float(counts[i]) if counts[i] > 0 else 0.
+        value = self.lo + (i + fraction) * self.bin_width
+        return min(max(value, self.min), self.max)
+
+    def sigma_clipped_stats(self, sigma=3., iters=5):
+        """
+        histogram version of astropy.stats.sigma_clipped_stats:  returns (mean, median, std) of the finite
+        pixels after iteratively clipping those more than sigma std's from the median
+        """
+        if self.n_finite == 0:
+            return np.nan, np.nan, np.nan
+        centers = self.bin_centers()
+        counts = self.counts
+        clip_lo, clip_hi = -np.inf, np.inf
+        for i in range(iters + 1):
+            clipped_counts = np.where((centers >= clip_lo) & (centers <= clip_hi), counts, 0)
+            n = clipped_counts.sum()
+            if n == 0:
+                break
+            mean = (clipped_counts * centers).sum() / float(n)
+            std = np.sqrt((clipped_counts * (centers - mean) ** 2).sum() / float(n))
+            median = self._percentile(clipped_counts, 50.)
+            new_clip_lo, new_clip_hi = median - sigma * std, median + sigma * std
+            if (new_clip_lo, new_clip_hi) == (clip_lo, clip_hi):
+                break
+            clip_lo, clip_hi = new_clip_lo, new_clip_hi
+        return mean, median, std
+
+    def is_resolved(self, std, min_bins=4.):
+        """
+        whether a distribution of width std is spread over enough bins for histogram stats to be trusted
+        """
+        return std >= min_bins * self.bin_width
+
+    def percentile_is_resolved(self, q, max_bin_fraction=0.01):
+        """
+        whether the bin the q-th percentile falls in holds few enough (max_bin_fraction) of the finite pixels
+        for interpolating within that bin to be trusted.  (Not so when e.g. one wild pixel has stretched the
+        bins far wider than the spread of everything else.)
+        """
+        if self.n_finite == 0:
+            return True
+        target, i = self._percentile_bin(np.cumsum(self.counts), q)
+        return self.counts[i] <= max_bin_fraction * self.n_finite
+
+
+class ImageStatistics():
+    def __init__(self, image, sample_size=10000, n_bins=65536, rows_per_strip=256, seed=0):
+        """
+        Everything ztv wants to know about the values of a 2-d image, gathered in one pass over it (in strips of
+        rows_per_strip rows, so temporaries stay small):
+            size, n_finite, n_nan, n_posinf, n_neginf
+            min, max (of the finite pixels) and argmin, argmax as (y, x) of their first occurrence
+            mean, std (exact, of the finite pixels)
+            histogram:  an ImageHistogram of the finite pixels, for percentiles & sigma-clipped stats
+                        (None when sample_is_complete, as everything is then taken from the sample)
+            sample:  a random sample of about sample_size of the finite pixels (all of them, and
+                     sample_is_complete=True, if the image has no more than sample_size pixels)
+        """
+        image = np.asarray(image)
+        if image.ndim < 2:
+            image = image.reshape(1, -1)
+        self.size = image.size
+        self.n_finite = 0
+        self.n_nan = 0
+        self.n_posinf = 0
+        self.n_neginf = 0
+        self.min, self.max = None, None
+        self.argmin, self.argmax = None, None
+        self.sample_is_complete = self.size <= sample_size
+        # (small images, e.g. a stats box being dragged around, skip building the histogram they wouldn't use)
+        self.histogram = None if self.sample_is_complete else ImageHistogram(n_bins=n_bins)
+        sample_fraction = min(1., sample_size / float(max(1, self.size)))
+        random_state = np.random.RandomState(seed)
+        sample = []
+        shift = None   # sums are accumulated relative to a typical value, to keep the variance precise
+        sum_shifted, sum_shifted_squares = 0., 0.
+        ny, nx = image.shape
+        for y0 in range(0, ny, rows_per_strip):
+            strip = image[y0:y0 + rows_per_strip]
+            finite_mask = np.isfinite(strip)
+            values = strip[finite_mask]
+            if values.size < strip.size:
+                nonfinite_values = strip[~finite_mask]
+                n_nan = np.isnan(nonfinite_values).sum()
+                n_posinf = (nonfinite_values > 0).sum()  # (nan > 0 is False)
+                self.n_nan += n_nan
+                self.n_posinf += n_posinf
+                self.n_neginf += nonfinite_values.size - n_nan - n_posinf
+            if values.size == 0:
+                continue
+            i_min, i_max = values.argmin(), values.argmax()
+            if self.min is None or values[i_min] < self.min:
+                self.min = values[i_min]
+                self.argmin = self._strip_position(finite_mask, i_min, y0, nx)
+            if self.max is None or values[i_max] > self.max:
+                self.max = values[i_max]
+                self.argmax = self._strip_position(finite_mask, i_max, y0, nx)
+            if shift is None:
+                shift = float(values.mean())
+            shifted = values - shift
+            sum_shifted += shifted.sum(dtype=np.float64)
+            sum_shifted_squares += np.dot(shifted.astype(np.float64), shifted.astype(np.float64))
+            self.n_finite += values.size
+            if self.sample_is_complete:
+                sample.append(values.copy())
+            else:
+                self.histogram.add(values)
+                n_take = random_state.binomial(values.size, sample_fraction)
+                if n_take > 0:
+                    sample.append(values[random_state.randint(0, values.size, n_take)])
+        if len(sample) > 0:
+            self.sample = np.concatenate(sample)
+        else:
+            self.sample = np.array([], dtype=image.dtype)
+        if self.n_finite > 0:
+            self.mean = shift + sum_shifted / self.n_finite
+            self.std = np.sqrt(max(0., sum_shifted_squares / self.n_finite - (sum_shifted / self.n_finite) ** 2))
+        else:
+            self.mean, self.std = np.nan, np.nan
+
+    @staticmethod
+    def _strip_position(finite_mask, i, y0, nx):
+        flat_index = np.flatnonzero(finite_mask)[i]
+        return (y0 + flat_index // nx, flat_index % nx)
+
+    @property
+    def nbytes(self):
+        return (0 if self.histogram is None else self.histogram.nbytes) + self.sample.nbytes
+
+    def median(self):
+        """
+        median of the finite pixels, found as percentile() is
+        """
+        if self.n_finite == 0:
+            return np.nan
+        if self.sample_is_complete or not self.histogram.percentile_is_resolved(50.):
+            return np.median(self.sample)
+        return self.histogram.percentile(50.)
+
+    def percentile(self, q):
+        """
+        q-th percentile (0-100) of the finite pixels, from all the pixels for small images and from the
+        histogram otherwise (or from the sample, when the histogram's bins are too coarse around it)
+        """
+        if self.n_finite == 0:
+            return np.nan
+        if self.sample_is_complete or not self.histogram.percentile_is_resolved(q):
+            return np.percentile(self.sample, q)
+        return self.histogram.percentile(q)
+
+    def sigma_clipped_stats(self):
+        """
+        (mean, median, std) after sigma clipping, from all the pixels for small images and from the histogram
+        otherwise (or from the sample, when the clipped distribution is too narrow for the histogram's bins)
+        """
+        if self.n_finite == 0:
+            return np.nan, np.nan, np.nan
+        if not self.sample_is_complete:
+            robust_mean, robust_median, robust_std = self.histogram.sigma_clipped_stats()
+            if self.histogram.is_resolved(robust_std):
+                return robust_mean, robust_median, robust_std
+        return sigma_clipped_stats(self.sample)
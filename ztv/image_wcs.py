@@ -0,0 +1,153 @@
+import warnings
+from collections import OrderedDict
+import numpy as np
+from astropy import wcs
+from astropy.coordinates import ICRS
+from astropy import units
+
+
+def format_sexagesimal(values, precision=2, alwayssign=False):
+    """
+    values (e.g. degrees, or hours) as 'dd:mm:ss.ss' strings, padded like astropy's
+    Angle.to_string(sep=':', precision=precision, pad=True), but with plain integer arithmetic, which is much
+    faster.  Returns a string for a scalar and a list of strings for an array.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10 ** precision
+    n_fractions = np.round(np.abs(values.ravel()) * 3600 * scale).astype(np.int64)
+    n_seconds, fractions = np.divmod(n_fractions, scale)
+    n_minutes, seconds = np.divmod(n_seconds, 60)
+    degrees, minutes = np.divmod(n_minutes, 60)
+    if precision > 0:
+        fmt = '{}{:02d}:{:02d}:{:02d}.{:0' + str(precision) + 'd}'
+    else:
+        fmt = '{}{:02d}:{:02d}:{:02d}{}'
+        fractions = [''] * len(fractions)
+    positive_sign = '+' if alwayssign else ''
+    strings = [fmt.format('-' if value < 0 else positive_sign, d, m, sec, f)
+               for value, d, m, sec, f in zip(values.ravel(), degrees, minutes, seconds, fractions)]
+    if values.ndim == 0:
+        return strings[0]
+    return strings
+
+
+def format_radec(ra, dec):
+    """
+    ra, dec (degrees) as e.g. '12:34:56.78 +12:34:56.78' string(s), as shown in the status bar
+    """
+    ra_strings = format_sexagesimal(np.asarray(ra) / 15., precision=2)
+    dec_strings = format_sexagesimal(dec, precision=2, alwayssign=True)
+    if np.ndim(ra) == 0:
+        return ra_strings + ' ' + dec_strings
+    return [r + ' ' + d for r, d in zip(ra_strings, dec_strings)]
+
+
+class TANSIPTransform():
+    def __init__(self, image_wcs):
+        """
+        pixel -> RA/Dec of an RA---TAN/DEC--TAN (optionally -SIP) astropy.wcs.WCS, boiled down to its linear
+        transform, SIP polynomials and the gnomonic deprojection, in plain numpy:  same results as
+        image_wcs.all_pix2world(x, y, 0), without wcslib's per-call overhead.  Raises ValueError for any
+        other kind of WCS (use TANSIPTransform.supports() to check first).
+        """
+        if not self.supports(image_wcs):
+            raise ValueError("TANSIPTransform only handles RA---TAN/DEC--TAN with (optional) SIP distortion")
+        image_wcs.wcs.set()
+        self.crpix = image_wcs.wcs.crpix - 1.  # (0-based pixels)
+        if image_wcs.wcs.has_cd():
+            self.cd = np.radians(image_wcs.wcs.cd)
+        else:
+            self.cd = np.radians(np.dot(np.diag(image_wcs.wcs.cdelt), image_wcs.wcs.get_pc()))
+        self.ra0, self.dec0 = np.radians(image_wcs.wcs.crval)
+        self.sip_a, self.sip_b = None, None
+        if image_wcs.sip is not None:
+            self.sip_a, self.sip_b = image_wcs.sip.a, image_wcs.sip.b
+
+    @staticmethod
+    def supports(image_wcs):
+        ctype = [c.upper() for c in image_wcs.wcs.ctype]
+        if (image_wcs.naxis != 2 or not ctype[0].startswith('RA---TAN') or not ctype[1].startswith('DEC--TAN') or
+            image_wcs.cpdis1 is not None or image_wcs.cpdis2 is not None or
+            image_wcs.det2im1 is not None or image_wcs.det2im2 is not None):
+            return False
+        image_wcs.wcs.set()
+        return image_wcs.wcs.lonpole == 180.
+
+    def radec(self, x, y):
+        u = np.asarray(x, dtype=np.float64) - self.crpix[0]
+        v = np.asarray(y, dtype=np.float64) - self.crpix[1]
+        if self.sip_a is not None:
+            u, v = (u + np.polynomial.polynomial.polyval2d(u, v, self.sip_a),
+                    v + np.polynomial.polynomial.polyval2d(u, v, self.sip_b))
+        xi = self.cd[0, 0] * u + self.cd[0, 1] * v
+        eta = self.cd[1, 0] * u + self.cd[1, 1] * v
+        denominator = np.cos(self.dec0) - eta * np.sin(self.dec0)
+        ra = np.degrees(self.ra0 + np.arctan2(xi, denominator)) % 360.
+        dec = np.degrees(np.arctan2(eta * np.cos(self.dec0) + np.sin(self.dec0), np.hypot(xi, denominator)))
+        return ra, dec
+
+
+class ImageRADec():
+    def __init__(self, image_wcs, shape, cache_size=4096):
+        """
+        RA/Dec of the pixels of an image of shape [y,x] (or [z,y,x]), worked out from image_wcs (an astropy.wcs.WCS)
+        only for the pixels actually asked about, rather than for every pixel up front.
+
+        Indexing as [y, x] (0-based pixel coordinates, as for the image itself) returns an ICRS coordinate, and the
+        most recent cache_size lookups are remembered, as e.g. the status bar keeps asking about the same pixels as
+        the mouse moves around.  radec(x, y) works out any number of pixels at once, as arrays of ra & dec in degrees,
+        and radec_string(x, y) gives (and remembers) the status bar's string for a pixel.
+
+        Plain TAN (& TAN-SIP) WCS's, i.e. most images, are evaluated with a TANSIPTransform rather than wcslib.
+        """
+        self.wcs = image_wcs
+        self.shape = shape
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (y, x) -> ICRS, least recently used first
+        self.string_cache = OrderedDict()  # (y, x) -> string, least recently used first
+        self.fast_transform = None
+        if TANSIPTransform.supports(image_wcs):
+            self.fast_transform = TANSIPTransform(image_wcs)
+
+    def radec(self, x, y):
+        if self.fast_transform is not None:
+            return self.fast_transform.radec(x, y)
+        ra, dec = self.wcs.all_pix2world(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), 0)
+        return ra, dec
+
+    def _cached(self, cache, key, compute):
+        if key in cache:
+            value = cache.pop(key)
+        else:
+            value = compute()
+        cache[key] = value  # (re-)insert as most recently used
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def _icrs(self, x, y):
+        ra, dec = self.radec(x, y)
+        return ICRS(float(ra) * units.degree, float(dec) * units.degree)
+
+    def __getitem__(self, key):
+        y, x = key
+        return self._cached(self.cache, key, lambda: self._icrs(x, y))
+
+    def radec_string(self, x, y):
+        return self._cached(self.string_cache, (y, x), lambda: format_radec(*self.radec(x, y)))
+
+
+def image_radec_from_header(header, shape):
+    """
+    ImageRADec for an image of shape with FITS header, or None if header doesn't have a usable WCS
+    """
+    # TODO: better error handling for if WCS not available or partially available
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            image_wcs = wcs.WCS(header)
+        image_radec = ImageRADec(image_wcs, shape)
+        image_radec[shape[-2] // 2, shape[-1] // 2]  # check that it works at all
+    except:  # just ignore radec if anything at all goes wrong.
+        return None
+    return image_radec
@@ -19,7 +19,6 @@ except ImportError, e:
 from .quick_phot import centroid, aperture_phot
 from .ztv_wx_lib import validate_textctrl_str, textctrl_output_only_background_color, set_textctrl_background_color
 from .ztv_lib import send_to_stream
-from astropy import units
 import numpy as np
 import sys
 
@@ -311,7 +310,7 @@ class PhotPanel(wx.Panel):
     def publish_aperture_phot_info_to_stream(self, msg=None):
         phot_info = self.phot_info.copy()
         phot_info.pop('distances', None)
-        wx.CallAfter(send_to_stream, sys.stdout, ('aperture-phot-info', phot_info))
+        wx.CallAfter(send_to_stream, sys.stdout, self.ztv_frame.tag_reply(('aperture-phot-info', phot_info)))
         
     def on_button_press(self, event):
         self.select_panel()
@@ -370,7 +369,7 @@ class PhotPanel(wx.Panel):
                 self.redraw_overplot_on_image()
             else:
                 self.remove_overplot_on_image()
-        send_to_stream(sys.stdout, ('set-aperture-phot-parameters-done', True))
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('set-aperture-phot-parameters-done', True)))
 
     def update_phot_xy(self, msg):
         self.xclick, self.yclick = msg
@@ -406,10 +405,7 @@ class PhotPanel(wx.Panel):
         self.skyerr_textctrl.SetValue("{:0.6g}".format(self.phot_info['sky_per_pixel_err']))
         if (self.ztv_frame.image_radec is not None and
             np.isfinite(self.xcentroid) and np.isfinite(self.ycentroid)):
-            c = self.ztv_frame.image_radec[self.ycentroid, self.xcentroid]
-            radec_string = "{0} {1}".format(c.ra.to_string(units.hour, sep=':', precision=2, pad=True),
-                                            c.dec.to_string(sep=':', precision=2, alwayssign=True, pad=True))
-            self.radec_textctrl.SetValue(radec_string)
+            self.radec_textctrl.SetValue(self.ztv_frame.image_radec.radec_string(self.xcentroid, self.ycentroid))
         else:
             self.radec_textctrl.SetValue(' ')
         self.plot_panel.axes.cla()
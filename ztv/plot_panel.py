@@ -101,8 +101,8 @@ class PlotPanel(wx.Panel):
         self.cursor_drag_active = False
         
     def publish_xy0xy1_to_stream(self, msg=None):
-        wx.CallAfter(send_to_stream, sys.stdout, 
-                     ('slice-plot-coords', [[self.start_pt.x, self.start_pt.y], [self.end_pt.x, self.end_pt.y]]))
+        wx.CallAfter(send_to_stream, sys.stdout, self.ztv_frame.tag_reply(
+                     ('slice-plot-coords', [[self.start_pt.x, self.start_pt.y], [self.end_pt.x, self.end_pt.y]])))
 
     def on_button_press(self, event):
         self.select_panel()
@@ -4,13 +4,18 @@ from wx.lib.pubsub import pub
 from .file_picker import FilePicker
 from .fits_header_dialog import FITSHeaderDialog
 from .image_process_action import ImageProcessAction
+from .calibration_frames import CalibrationFrameCache, combine_methods
+from .autoload_watcher import InotifyWatcher, FileMatchIndex, FileReadinessCheck, readiness_checks, newest_file
+from .autoload_watcher import IN_Q_OVERFLOW, IN_IGNORED
 import numpy as np
 import os
 import glob
+import fnmatch
 import sys
 import time
 import threading
 from .ztv_wx_lib import set_textctrl_background_color
+from .ztv_lib import send_to_stream
 try:
     import stomp
     stomp_install_is_ok = True
@@ -64,26 +69,135 @@ class ActiveMQListenerThread(threading.Thread):
 
 class AutoloadFileMatchWatcherThread(threading.Thread):
     def __init__(self, source_panel):
+        """
+        Loads new files matching source_panel.autoload_match_string.  Where it can (linux, no wildcards
+        in the directory part of the pattern, and not a network filesystem) it waits on inotify events for files
+        being finished in that directory, so a new file is loaded as soon as it is written;  otherwise (or once
+        the directory stops being watched, e.g. because it was deleted) it polls every autoload_pausetime,
+        keeping a FileMatchIndex so that each poll looks only at what has changed.
+        backend is 'inotify' or 'polling', whichever is in use.
+
+        A new file is handed on to be loaded only once it passes source_panel.autoload_readiness_check (see
+        FileReadinessCheck), so that ztv doesn't try to read it while it's still being written.  Which files are
+        shown depends on source_panel.autoload_frame_policy:
+            'latest' - only the newest file:  files that are overtaken by a newer one before they are ready (or,
+                       in FITSLoader, before they are read) are dropped, so that ztv never falls behind
+            'all' - every new file, in the order they turn up
+        counts keeps track of files sent to be loaded, found not to be ready yet (n_waited), dropped in favor of
+        a newer one, and given up on after waiting max_ready_wait_sec for them to be ready.
+        """
         threading.Thread.__init__(self)
         self.source_panel = source_panel
         self.keep_running = True
         self.daemon = True
+        self.backend = None
+        self.file_match_index = None  # FileMatchIndex, when polling
+        self.readiness_check = FileReadinessCheck(source_panel.autoload_readiness_check)
+        self.max_ready_wait_sec = 60.
+        self.ready_recheck_sec = 0.05  # how often files that aren't ready yet are checked again
+        self.pending = []  # [path, time first seen, has been found not ready] of files waiting to be ready, oldest first
+        self.counts = {'n_sent':0, 'n_waited':0, 'n_dropped':0, 'n_gave_up':0}
         self.start()
 
     def run(self):
-        latest_mtime = 0.0
+        match_string = self.source_panel.autoload_match_string
+        watcher = None
+        if not glob.has_magic(os.path.dirname(match_string)):
+            try:
+                watcher = InotifyWatcher(os.path.dirname(match_string) or '.')
+            except OSError:
+                pass
+        if watcher is not None:
+            self.backend = 'inotify'
+            try:
+                watch_lost = self.run_inotify(watcher, match_string)
+            finally:
+                watcher.close()
+            if not watch_lost:
+                return
+        self.backend = 'polling'
+        self.file_match_index = FileMatchIndex(match_string)
+        self.run_polling()
+
+    def add_new_files(self, paths):
+        """
+        paths (oldest first) have turned up or changed
+        """
+        for path in paths:
+            for cur_pending in self.pending:
+                if cur_pending[0] == path:  # (e.g. a file being written that changed again)
+                    self.pending.remove(cur_pending)
+                    break
+            if self.source_panel.autoload_frame_policy == 'latest':
+                self.counts['n_dropped'] += len(self.pending)
+                for cur_pending in self.pending:
+                    self.readiness_check.forget(cur_pending[0])
+                self.pending = []
+            self.pending.append([path, time.time(), False])
+
+    def send_ready_files(self):
+        while len(self.pending) > 0:
+            path, first_seen_time, has_waited = self.pending[0]
+            if not self.readiness_check.is_ready(path):
+                if not has_waited:
+                    self.pending[0][2] = True
+                    self.counts['n_waited'] += 1
+                if time.time() - first_seen_time < self.max_ready_wait_sec:
+                    return  # (later files wait their turn behind this one)
+                self.counts['n_gave_up'] += 1
+                sys.stderr.write("ztv warning: autoload gave up waiting for {} to be finished\n".format(path))
+            elif self.source_panel.autoload_frame_policy == 'all':
+                wx.CallAfter(pub.sendMessage, 'queue-fits-file', msg=path)
+                self.counts['n_sent'] += 1
+            else:
+                wx.CallAfter(pub.sendMessage, 'autoload-fits-file', msg=path)
+                self.counts['n_sent'] += 1
+            self.readiness_check.forget(path)
+            self.pending.pop(0)
+
+    def run_inotify(self, watcher, match_string):
+        """
+        returns True if the directory stopped being watched (so polling has to take over)
+        """
+        match_pattern = os.path.basename(match_string)
+        need_rescan = True  # start from the newest file already there (like polling does), and after lost events
         while self.keep_running:
-            filename_to_open = None
-            possible_matches = glob.glob(self.source_panel.autoload_match_string)
-            if len(possible_matches) > 0:
-                for cur_match in possible_matches:
-                    cur_match_mtime = os.path.getmtime(cur_match)
-                    if cur_match_mtime > latest_mtime:
-                        filename_to_open = cur_match
-                        latest_mtime = cur_match_mtime
-                if filename_to_open is not None:
-                    wx.CallAfter(pub.sendMessage, 'load-fits-file', msg=filename_to_open)
-            time.sleep(self.source_panel.autoload_pausetime)
+            if need_rescan:
+                need_rescan = False
+                newest_match = newest_file(glob.glob(match_string))
+                if newest_match is not None:
+                    self.add_new_files([newest_match])
+            else:
+                # (timeout is only so that keep_running/autoload_mode are noticed, and files not ready are rechecked)
+                timeout = self.ready_recheck_sec if len(self.pending) > 0 else self.source_panel.autoload_pausetime
+                new_files = []
+                for mask, name in watcher.read(timeout=timeout):
+                    if mask & IN_IGNORED:
+                        return True
+                    if mask & IN_Q_OVERFLOW:
+                        need_rescan = True
+                    elif fnmatch.fnmatch(name, match_pattern):
+                        new_files.append(os.path.join(os.path.dirname(match_string), name))
+                self.add_new_files(new_files)
+            self.send_ready_files()
+            if self.source_panel.autoload_mode != 'file-match':
+                self.keep_running = False
+
+    def run_polling(self):
+        is_first_scan = True  # when only the newest of the files already there is loaded
+        while self.keep_running:
+            new_files = [(self.file_match_index.entries[cur_match][0], cur_match)
+                         for cur_match in self.file_match_index.update()]  # (only files that are new or changed)
+            new_files.sort()
+            if is_first_scan:
+                new_files = new_files[-1:]
+                is_first_scan = False
+            self.add_new_files([path for mtime, path in new_files])
+            self.send_ready_files()
+            if len(self.pending) > 0:
+                time.sleep(min(self.ready_recheck_sec, self.source_panel.autoload_pausetime))
+            else:
+                time.sleep(self.source_panel.autoload_pausetime)
             if self.source_panel.autoload_mode != 'file-match':
                 self.keep_running = False
 
@@ -101,6 +215,8 @@ class SourcePanel(wx.Panel):
         self.autoload_pausetime = self.autoload_pausetime_choices[0]
         self.autoload_match_string = ''
         self.autoload_filematch_thread = None
+        self.autoload_readiness_check = 'fits-complete'  # see autoload_watcher.FileReadinessCheck
+        self.autoload_frame_policy = 'latest'  # 'latest' or 'all', see AutoloadFileMatchWatcherThread
         pub.subscribe(self._add_activemq_instance, 'add-activemq-instance')
         self.stomp_install_is_ok = stomp_install_is_ok
         self.activemq_instances_info = {}  # will be dict of dicts of, e.g.:
@@ -113,6 +229,8 @@ class SourcePanel(wx.Panel):
         self.sky_hdulist = None
         self.flat_hdulist = None
         self.sky_file_fullname = ''
+        self.sky_combine_method = 'median'  # how a 3-d sky is collapsed to 2-d, one of calibration_frames.combine_methods
+        self.calibration_frame_cache = CalibrationFrameCache()
         self.flat_file_fullname = ''
         wx.Panel.__init__(self, parent, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize)
         self.ztv_frame = self.GetTopLevelParent()
@@ -232,6 +350,31 @@ class SourcePanel(wx.Panel):
         #  publish a different signal from load_numpy_array, but tradeoff between extra complexity and
         #  extra calls of update_cur_header_button_status (which is VERY simple)
         pub.subscribe(self.update_cur_header_button_status, 'redraw-image')
+        self.ztv_frame.register_command_handler('set-sky-subtraction-status', self._set_sky_subtraction_status)
+        self.ztv_frame.register_command_handler('set-sky-subtraction-filename', self.load_sky_frame)
+        self.ztv_frame.register_command_handler('get-sky-subtraction-status-and-filename',
+                                                self.publish_sky_subtraction_status_and_filename_to_stream)
+        self.ztv_frame.register_command_handler('set-sky-combine-method', self.set_sky_combine_method)
+        self.ztv_frame.register_command_handler('set-calibration-frame-cache-dir', self.set_calibration_frame_cache_dir)
+        self.ztv_frame.register_command_handler('get-sky-combine-method-and-cache-dir',
+                                                self.publish_sky_combine_method_and_cache_dir_to_stream)
+        self.ztv_frame.register_command_handler('set-flat-division-status', self._set_flat_division_status)
+        self.ztv_frame.register_command_handler('set-flat-division-filename', self.load_flat_frame)
+        self.ztv_frame.register_command_handler('get-flat-division-status-and-filename',
+                                                self.publish_flat_division_status_and_filename_to_stream)
+        self.ztv_frame.register_command_handler('set-autoload-filename-pattern-status',
+                                                self._set_autoload_filename_pattern_status)
+        self.ztv_frame.register_command_handler('set-autoload-filename-pattern',
+                                                self.autoload_curfile_file_picker_on_load)
+        self.ztv_frame.register_command_handler('get-autoload-status-and-filename-pattern',
+                                                self.publish_autoload_status_and_filename_pattern_to_stream)
+        self.ztv_frame.register_command_handler('set-autoload-pausetime', self._set_autoload_pausetime)
+        self.ztv_frame.register_command_handler('get-autoload-pausetime', self.publish_autoload_pausetime_to_stream)
+        self.ztv_frame.register_command_handler('get-autoload-stats', self.publish_autoload_stats_to_stream)
+        self.ztv_frame.register_command_handler('set-autoload-readiness-check', self.set_autoload_readiness_check)
+        self.ztv_frame.register_command_handler('set-autoload-frame-policy', self.set_autoload_frame_policy)
+        self.ztv_frame.register_command_handler('get-autoload-readiness-check-and-frame-policy',
+                                                self.publish_autoload_readiness_check_and_frame_policy_to_stream)
         if not self.stomp_install_is_ok: # deactivate activeMQ option if stomp not installed OK
             try:  # wrap in a try, just in case source_panel wasn't loaded.
                 wx.CallAfter(self.settings_menu_activemq_item.Check, False)
@@ -245,6 +388,107 @@ class SourcePanel(wx.Panel):
 #         wx.CallAfter(self.settings_menu_activemq_item.Check, False)
 #         wx.CallAfter(self.activemq_sizer.ShowItems, False)
   
+    def _set_sky_subtraction_status(self, msg):
+        if msg:
+            self.load_sky_subtraction_to_process_stack()
+        else:
+            self.unload_sky_subtraction_from_process_stack()
+
+    def publish_sky_subtraction_status_and_filename_to_stream(self, msg=None):
+        sky_subtraction_loaded = 'sky-subtraction' in [a[0] for a in self.ztv_frame.image_process_functions_to_apply]
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+            ('sky-subtraction-status-and-filename', (sky_subtraction_loaded, self.sky_file_fullname))))
+
+    def set_sky_combine_method(self, msg):
+        if msg not in combine_methods:
+            sys.stderr.write("ztv warning: unrecognized sky combine method '{}', should be one of: {}\n".format(
+                             msg, combine_methods))
+            return
+        self.sky_combine_method = msg
+        sky_subtraction_loaded = 'sky-subtraction' in [a[0] for a in self.ztv_frame.image_process_functions_to_apply]
+        if sky_subtraction_loaded and self.sky_hdulist is not None and self.sky_hdulist[0].data.ndim == 3:
+            self.load_sky_subtraction_to_process_stack()
+
+    def set_calibration_frame_cache_dir(self, msg):
+        """
+        msg is a directory in which to also keep combined sky frames between sessions, or None for memory only
+        """
+        self.calibration_frame_cache.cache_dir = msg
+
+    def publish_sky_combine_method_and_cache_dir_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+            ('sky-combine-method-and-cache-dir', (self.sky_combine_method, self.calibration_frame_cache.cache_dir))))
+
+    def _set_flat_division_status(self, msg):
+        if msg:
+            self.load_flat_division_to_process_stack()
+        else:
+            self.unload_flat_division_from_process_stack()
+
+    def publish_flat_division_status_and_filename_to_stream(self, msg=None):
+        flat_division_loaded = 'flat-division' in [a[0] for a in self.ztv_frame.image_process_functions_to_apply]
+        flat_filename = self.flatfile_file_picker.current_textctrl_GetValue()
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+            ('flat-division-status-and-filename', (flat_division_loaded, flat_filename))))
+
+    def _set_autoload_filename_pattern_status(self, msg):
+        if msg:
+            self.launch_autoload_filematch_thread()
+            self.autoload_mode = 'file-match'
+        else:
+            self.kill_autoload_filematch_thread()
+            self.autoload_mode = None
+
+    def publish_autoload_status_and_filename_pattern_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+            ('autoload-status-and-filename-pattern', (self.autoload_mode == 'file-match', self.autoload_match_string))))
+
+    def _set_autoload_pausetime(self, msg):
+        i = np.abs(np.array(self.autoload_pausetime_choices) - float(msg)).argmin()
+        self.autoload_pausetime = self.autoload_pausetime_choices[i]
+        self.autoload_pausetime_choice.SetSelection(i)
+
+    def publish_autoload_pausetime_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('autoload-pausetime', self.autoload_pausetime)))
+
+    @property
+    def autoload_stats(self):
+        """
+        backend ('inotify'/'polling', None if autoload is off) of the autoload watcher, its counts of files
+        sent/waited on/dropped/given up on and, when polling, the stats of its FileMatchIndex (scan times,
+        numbers of entries/directories listed/stat calls)
+        """
+        stats = {'backend':None}
+        if self.autoload_filematch_thread is not None and self.autoload_filematch_thread.keep_running:
+            stats['backend'] = self.autoload_filematch_thread.backend
+            stats.update(self.autoload_filematch_thread.counts)
+            if self.autoload_filematch_thread.file_match_index is not None:
+                stats.update(self.autoload_filematch_thread.file_match_index.stats)
+        return stats
+
+    def publish_autoload_stats_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('autoload-stats', self.autoload_stats)))
+
+    def set_autoload_readiness_check(self, msg):
+        if msg not in readiness_checks:
+            sys.stderr.write("ztv warning: unrecognized autoload readiness check '{}', should be one of: {}\n".format(
+                             msg, readiness_checks))
+            return
+        self.autoload_readiness_check = msg
+        if self.autoload_filematch_thread is not None and self.autoload_filematch_thread.keep_running:
+            self.autoload_filematch_thread.readiness_check = FileReadinessCheck(msg)
+
+    def set_autoload_frame_policy(self, msg):
+        if msg not in ['latest', 'all']:
+            sys.stderr.write("ztv warning: unrecognized autoload frame policy '{}', should be 'latest' or 'all'\n".format(
+                             msg))
+            return
+        self.autoload_frame_policy = msg
+
+    def publish_autoload_readiness_check_and_frame_policy_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(
+            ('autoload-readiness-check-and-frame-policy', (self.autoload_readiness_check, self.autoload_frame_policy))))
+
     def init_settings_popup_menu(self):
         menu = wx.Menu()
         menu.Append(wx.NewId(), 'Show in GUI:').Enable(False)
@@ -340,14 +584,18 @@ class SourcePanel(wx.Panel):
     def load_sky_subtraction_to_process_stack(self):
         """
         Load sky subtraction into image processing stack
-        If sky image is 3-d ([n,x,y]), then collapse to 2-d ([x,y]) by doing a median on axis=0
+        If sky image is 3-d ([n,x,y]), then collapse to 2-d ([x,y]) by doing a median (or, depending on
+        sky_combine_method, sigma-clipped mean) on axis=0, which is cached in calibration_frame_cache
         """
         self.unload_sky_subtraction_from_process_stack()
         if self.sky_hdulist is not None:
             if self.sky_hdulist[0].data.ndim == 2:
                 process_fxn = ImageProcessAction(np.subtract, self.sky_hdulist[0].data)
             elif self.sky_hdulist[0].data.ndim == 3:
-                process_fxn = ImageProcessAction(np.subtract, np.median(self.sky_hdulist[0].data, axis=0))
+                combined_sky = self.calibration_frame_cache.combined_frame(self.sky_file_fullname,
+                                                                           self.sky_hdulist[0].data,
+                                                                           method=self.sky_combine_method)
+                process_fxn = ImageProcessAction(np.subtract, combined_sky)
             else:
                 raise UnrecognizedNumberOfDimensions("Tried to load sky image with {} dimensions, " + 
                                                      "when can only handle 2-d or 3-d".format(
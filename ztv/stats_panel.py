@@ -4,7 +4,6 @@ from wx.lib.pubsub import pub
 from matplotlib.patches import Rectangle
 from matplotlib import cm
 import numpy as np
-from astropy.stats import sigma_clipped_stats
 import sys
 from .ztv_wx_lib import set_textctrl_background_color, validate_textctrl_str, textctrl_output_only_background_color
 from .ztv_lib import send_to_stream
@@ -214,7 +213,7 @@ class StatsPanel(wx.Panel):
         pub.subscribe(self.publish_stats_to_stream, 'get-stats-box-info')
 
     def publish_stats_to_stream(self, msg=None):
-        wx.CallAfter(send_to_stream, sys.stdout, ('stats-box-info', self.stats_info))
+        wx.CallAfter(send_to_stream, sys.stdout, self.ztv_frame.tag_reply(('stats-box-info', self.stats_info)))
 
     def on_button_press(self, event):
         self.select_panel()
@@ -259,7 +258,7 @@ class StatsPanel(wx.Panel):
                 self.redraw_overplot_on_image()
             else:
                 self.remove_overplot_on_image()
-        send_to_stream(sys.stdout, ('set-stats-box-parameters-done', True))
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('set-stats-box-parameters-done', True)))
 
     def update_stats_box(self, x0=None, y0=None, x1=None, y1=None):
         if x0 is None:
@@ -280,7 +279,7 @@ class StatsPanel(wx.Panel):
         y1 = min(max(0, y1), self.ztv_frame.display_image.shape[0] - 1)
         self.stats_rect.set_bounds(x0, y0, x1 - x0, y1 - y0)
         if self.hideshow_button.GetLabel() == 'Hide':  
-            self.ztv_frame.primary_image_panel.figure.canvas.draw()
+            self.ztv_frame.primary_image_panel.redraw_overlay()
         self.update_stats()
 
     def remove_overplot_on_image(self):
@@ -328,20 +327,30 @@ class StatsPanel(wx.Panel):
         self.npix_textctrl.SetValue(str(x_npix * y_npix))
 
         stats_data = self.ztv_frame.display_image[y0:y1+1, x0:x1+1]
-        finite_mask = np.isfinite(stats_data)
-        if finite_mask.max() is np.True_:
-            stats_data_mean = stats_data[finite_mask].mean()
-            stats_data_median = np.median(stats_data[finite_mask])
-            stats_data_std = stats_data[finite_mask].std()
-            robust_mean, robust_median, robust_std = sigma_clipped_stats(stats_data[finite_mask])
+        statistics = self.ztv_frame.display_image_statistics((x0, x1 + 1, y0, y1 + 1))
+        if statistics.n_finite > 0:
+            stats_data_mean = statistics.mean
+            stats_data_median = statistics.median()
+            stats_data_std = statistics.std
+            robust_mean, robust_median, robust_std = statistics.sigma_clipped_stats()
+            stats_data_min, stats_data_max = statistics.min, statistics.max
         else:
             stats_data_mean = np.nan
             stats_data_median = np.nan
             stats_data_std = np.inf
             robust_mean, robust_median, robust_std = np.nan, np.nan, np.inf
+            stats_data_min, stats_data_max = np.nan, np.nan
+        # want min/max to reflect any Inf/NaN
+        if statistics.n_nan > 0:
+            stats_data_min, stats_data_max = np.nan, np.nan
+        else:
+            if statistics.n_neginf > 0:
+                stats_data_min = -np.inf
+            if statistics.n_posinf > 0:
+                stats_data_max = np.inf
         self.stats_info = {'xrange':[x0,x1], 'yrange':[y0,y1],
                            'mean':stats_data_mean, 'median':stats_data_median, 'std':stats_data_std, 
-                           'min':stats_data.min(), 'max':stats_data.max()} # want min/max to reflect any Inf/NaN
+                           'min':stats_data_min, 'max':stats_data_max}
         self.mean_textctrl.SetValue("{:0.4g}".format(self.stats_info['mean']))
         self.median_textctrl.SetValue("{:0.4g}".format(self.stats_info['median']))
         self.stdev_textctrl.SetValue("{:0.4g}".format(self.stats_info['std']))
@@ -352,13 +361,13 @@ class StatsPanel(wx.Panel):
         self.robust_stdev_textctrl.SetValue("{:0.4g}".format(robust_std))
         self.minval_textctrl.SetValue("{:0.4g}".format(self.stats_info['min']))
         self.maxval_textctrl.SetValue("{:0.4g}".format(self.stats_info['max']))
-        wmin = np.where(stats_data == stats_data.min())
+        wmin = np.where(stats_data == self.stats_info['min'])
         wmin = [(wmin[1][i] + x0,wmin[0][i] + y0) for i in np.arange(wmin[0].size)]
         if len(wmin) == 1:
             wmin = wmin[0]
         self.minpos_textctrl.SetValue("{}".format(wmin))
         self.stats_info['wmin'] = wmin
-        wmax = np.where(stats_data == stats_data.max())
+        wmax = np.where(stats_data == self.stats_info['max'])
         wmax = [(wmax[1][i] + x0,wmax[0][i] + y0) for i in np.arange(wmax[0].size)]
         if len(wmax) == 1:
             wmax = wmax[0]
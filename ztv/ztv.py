@@ -11,12 +11,9 @@ import os
 import sys
 import pickle
 import glob
+from collections import OrderedDict
 from astropy.io import fits
-from astropy import wcs
-from astropy.coordinates import ICRS
-from astropy import units
 import astropy.visualization
-from astropy.stats import sigma_clipped_stats
  
 import matplotlib
 matplotlib.interactive(True)
@@ -30,11 +27,18 @@ from matplotlib.figure import Figure
 from matplotlib.widgets import AxesWidget
 from matplotlib.patches import Rectangle
 from matplotlib import cm
-from matplotlib.colors import Normalize
 
 from .file_picker import FilePicker
 from .fits_header_dialog import FITSHeaderDialog
-from .ztv_lib import send_to_stream, StreamListener, StreamListenerTimeOut
+from .image_pyramid import ImagePyramid
+from .image_stats import ImageStatistics
+from .image_process_action import ProcessedImageStack, apply_process_functions
+from .display_lut import quantize, display_lut, colorize
+from .command_dispatch import CommandDispatcher
+from .fits_loader import FITSLoader
+from .fits_data import lazy_image_data, check_fits_file_complete
+from .image_wcs import image_radec_from_header
+from .ztv_lib import send_to_stream, StreamListener, StreamListenerTimeOut, read_shared_array
 from .ztv_wx_lib import set_textctrl_background_color, validate_textctrl_str
 
 base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -77,6 +81,131 @@ class ColorMaps():
         return [a for a in cm.datad]
 
 
+class RedrawScheduler():
+    """
+    Coalesces redraw requests:  however many times request(name, fxn) is called before the wx event loop gets
+    back around to it (e.g. a burst of cmap/clim/scaling changes), fxn is called only once.  Requests made or
+    coming due while is_paused() is True are dropped, as whatever un-pauses will ask for its own redraw.
+
+    counts keeps track of redraws requested vs. performed for each name.
+    """
+    def __init__(self, is_paused=lambda: False):
+        self.is_paused = is_paused
+        self.pending = {}  # name -> fxn, for redraws requested but not yet performed
+        self.counts = {}   # name -> {'requested':n, 'performed':n}
+
+    def request(self, name, fxn):
+        counts = self.counts.setdefault(name, {'requested':0, 'performed':0})
+        counts['requested'] += 1
+        if self.is_paused():
+            return
+        if name not in self.pending:
+            self.pending[name] = fxn
+            wx.CallAfter(self._perform, name)
+
+    def _perform(self, name):
+        fxn = self.pending.pop(name, None)
+        if fxn is None or self.is_paused():
+            return
+        self.counts[name]['performed'] += 1
+        fxn()
+
+
+class LRUCache():
+    """
+    Least-recently-used cache of arrays (or anything else with an nbytes attribute, e.g. ImageStatistics), holding
+    at most max_bytes worth of them.  Used for normalized images (see ZTVFrame.normalize) and per-frame statistics.
+    counts keeps track of hits & misses.
+    """
+    def __init__(self, max_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> array, least recently used first
+        self.n_bytes = 0
+        self.counts = {'hits':0, 'misses':0}
+
+    def get(self, key):
+        if key not in self.entries:
+            self.counts['misses'] += 1
+            return None
+        self.counts['hits'] += 1
+        value = self.entries.pop(key)
+        self.entries[key] = value  # move to most recently used
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.n_bytes -= self.entries.pop(key).nbytes
+        if value.nbytes > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.n_bytes += value.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes:
+            key, value = self.entries.popitem(last=False)
+            self.n_bytes -= value.nbytes
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.n_bytes = 0
+
+    @property
+    def stats(self):
+        return {'hits':self.counts['hits'], 'misses':self.counts['misses'], 'n_entries':len(self.entries),
+                'n_bytes':self.n_bytes, 'max_bytes':self.max_bytes}
+
+
+class NormalizationWorker(threading.Thread):
+    """
+    Normalizes (quantizes, see ZTVFrame.quantize) whole frames in the background, so that the gui thread only
+    ever has to normalize the part of a frame it is about to show.  Only the most recent request matters:
+    submit() replaces anything queued and makes a request in progress give up at its next strip of rows.
+    Finished results are handed back on the gui thread with wx.CallAfter(on_done, key, normalized).
+    """
+    def __init__(self, quantize, on_done, rows_per_strip=256):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.quantize = quantize
+        self.on_done = on_done
+        self.rows_per_strip = rows_per_strip
+        self._condition = threading.Condition()
+        self._job = None    # (serial, key, image, clim) waiting to be started
+        self._serial = 0    # bumped by every submit/cancel, so that the job in progress can tell it is stale
+        self.start()
+
+    def submit(self, key, image, clim):
+        with self._condition:
+            self._serial += 1
+            self._job = (self._serial, key, image, clim)
+            self._condition.notify()
+
+    def cancel(self):
+        with self._condition:
+            self._serial += 1
+            self._job = None
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._job is None:
+                    self._condition.wait()
+                serial, key, image, clim = self._job
+                self._job = None
+            normalized = np.empty(image.shape, dtype=np.uint16)
+            for y0 in range(0, image.shape[0], self.rows_per_strip):
+                if serial != self._serial:
+                    break
+                y1 = y0 + self.rows_per_strip
+                normalized[y0:y1, :] = self.quantize(image[y0:y1, :], clim)
+            else:
+                wx.CallAfter(self.on_done, key, normalized)
+
+
 class PrimaryImagePanel(wx.Panel):
     def __init__(self, parent, dpi=None, **kwargs):
         wx.Panel.__init__(self, parent, wx.ID_ANY, wx.DefaultPosition, wx.Size(512,512), **kwargs)
@@ -108,10 +237,20 @@ class PrimaryImagePanel(wx.Panel):
         self.xlim = [-9e9, 9e9]
         self.ylim = [-9e9, 9e9]
         self.patches_dict = {}   #  keep track of matplotlib patches added by external code
+        self.axes_image = None   # the one image artist, created on first redraw & then updated in place
+        self.rendered_region = None  # (level, x0, x1, y0, y1): image_pyramid level & region of display_image
+                                     # currently held by axes_image
+        self.viewport_margin_fraction = 0.5  # extra margin (as fraction of view size) rendered on each side, for panning
         self.text_dict = {}   # similarly, keep track of text objects added to the axes
+        self.overlay_background = None  # rendered image without the overlay artists, for blitting
+        self.hover_refresh_sec = 1. / 60.  # status bar & loupe follow the mouse at most this often (~display refresh)
+        self._hover_pixel = None  # (x, y) under the mouse that status bar & loupe are to show, None if off the image
+        self._hover_update_pending = False
+        self._last_hover_update_time = 0.
         self.figure = Figure(None, dpi)
         self.axes = self.figure.add_axes([0., 0., 1., 1.])
         self.canvas = FigureCanvasWxAgg(self, -1, self.figure)
+        self.canvas.mpl_connect('draw_event', self._on_draw_event)
         self.Bind(wx.EVT_SIZE, self._onSize)
         self.axes_widget = AxesWidget(self.figure.gca())
         self.axes_widget.connect_event('motion_notify_event', self.on_motion)
@@ -123,9 +262,11 @@ class PrimaryImagePanel(wx.Panel):
         self.zoom_start_timestamp = time.time()
         wx.EVT_RIGHT_DOWN(self.figure.canvas, self.on_right_down)  # supercedes the above button_press_event
         pub.subscribe(self.redraw_primary_image, 'redraw-image')   
+        pub.subscribe(self.on_image_pyramid_level_ready, 'image-pyramid-level-ready')
         pub.subscribe(self.reset_zoom_and_center, 'reset-zoom-and-center')
         pub.subscribe(self.set_zoom_factor, 'set-zoom-factor')
         pub.subscribe(self.set_xy_center, 'set-xy-center')
+        self.ztv_frame.register_command_handler('get-xy-center', self.publish_xy_center_to_stream)
 
     def _append_menu_item(self, menu, wx_id, title, fxn):
         if wx_id is None:
@@ -197,7 +338,9 @@ class PrimaryImagePanel(wx.Panel):
         halfsize = (num_y_pixels / 2.0) / self.ztv_frame.zoom_factor
         ylim = (self.center.y - halfsize, self.center.y + halfsize)
         self.axes.set_ylim(ylim)
-        self.figure.canvas.draw()  # bulk of time in method is spent in this line: TODO: look for ways to make faster
+        self.update_rendered_region(xlim, ylim)
+        if not self.ztv_frame._pause_redraw_image:  # otherwise the redraw when un-paused will take care of it
+            self.figure.canvas.draw()  # bulk of time in method is spent in this line: TODO: look for ways to make faster
         send_change_message = True
         if xlim == self.xlim and ylim == self.ylim:
             send_change_message = False
@@ -227,6 +370,9 @@ class PrimaryImagePanel(wx.Panel):
         elif event.key in self.available_key_presses:
             self.available_key_presses[event.key](event)
 
+    def publish_xy_center_to_stream(self, msg=None):
+        send_to_stream(sys.stdout, self.ztv_frame.tag_reply(('xy-center', (self.center.x, self.center.y))))
+
     def set_xy_center(self, msg):
         if self.center.x != msg[0] or self.center.y != msg[1]:
             self.center.x = msg[0]
@@ -267,9 +413,9 @@ class PrimaryImagePanel(wx.Panel):
                 else:
                     self.zoom_start_timestamp = time.time()
                     self.zoom_rect = Rectangle((event.xdata, event.ydata), 0, 0,
-                                               color='orange', fill=False, zorder=100)
+                                               color='orange', fill=False, zorder=100, animated=True)
                     self.axes.add_patch(self.zoom_rect)
-                    self.figure.canvas.draw()
+                    self.redraw_overlay()
             elif self.cursor_mode == 'Pan':
                 self.center = wx.RealPoint(event.xdata, event.ydata)
                 self.set_and_get_xy_limits()
@@ -287,29 +433,54 @@ class PrimaryImagePanel(wx.Panel):
             if event.button is not None and self.zoom_rect is not None:
                 x0,y0 = self.zoom_rect.get_x(),self.zoom_rect.get_y()
                 self.zoom_rect.set_bounds(x0, y0, event.xdata - x0, event.ydata - y0)
-                self.figure.canvas.draw()
+                self.redraw_overlay()
         else:
             if (self.available_cursor_modes.has_key(self.cursor_mode) and
                 self.available_cursor_modes[self.cursor_mode].has_key('on_motion')):
                 self.available_cursor_modes[self.cursor_mode]['on_motion'](event)
-        if ((x >= 0) and (x < self.ztv_frame.display_image.shape[1]) and
-            (y >= 0) and (y < self.ztv_frame.display_image.shape[0])):
-            imval = self.ztv_frame.display_image[y, x]
-            new_status_string = "x,y={},{}".format(x, y)
-            if self.ztv_frame.image_radec is not None:
-                c = self.ztv_frame.image_radec[y, x]
-                new_status_string += "  radec={0} {1}".format(c.ra.to_string(units.hour, sep=':', precision=2, pad=True),
-                                                              c.dec.to_string(sep=':', precision=2, alwayssign=True, 
-                                                                              pad=True))
-            new_status_string += "  val={:.5g}".format(imval)
-            self.ztv_frame.status_bar.SetStatusText(new_status_string, 0)
-            self.ztv_frame.loupe_image_panel.set_xy_limits((x, y))
+        if self._is_on_image(x, y):
+            self.set_hover_pixel((x, y))
             # finally, catch for a situation where cursor should be active, but didn't enter, e.g. window launched under cursor
             if not hasattr(self, 'saved_cursor') or self.saved_cursor is None:
                 self.on_cursor_enter(event)
         else:
+            self.set_hover_pixel(None)
+
+    def _is_on_image(self, x, y):
+        return ((x >= 0) and (x < self.ztv_frame.display_image.shape[1]) and
+                (y >= 0) and (y < self.ztv_frame.display_image.shape[0]))
+
+    def set_hover_pixel(self, pixel):
+        """
+        pixel (x, y) is now under the mouse (or None if the mouse is off the image).  However fast motion events
+        come in, the status bar and loupe are brought up to date with the latest pixel at most once every
+        hover_refresh_sec, as redrawing them any more often than the display refreshes is wasted work.
+        """
+        self._hover_pixel = pixel
+        if self._hover_update_pending:
+            return
+        delay_sec = self._last_hover_update_time + self.hover_refresh_sec - time.time()
+        if delay_sec <= 0:
+            self._update_hover_info()
+        else:
+            self._hover_update_pending = True
+            wx.CallLater(int(np.ceil(delay_sec * 1000.)), self._update_hover_info)
+
+    def _update_hover_info(self):
+        self._hover_update_pending = False
+        self._last_hover_update_time = time.time()
+        if self._hover_pixel is None or not self._is_on_image(*self._hover_pixel):
             self.ztv_frame.status_bar.SetStatusText("", 0)
             self.ztv_frame.loupe_image_panel.set_xy_limits()
+            return
+        x, y = self._hover_pixel
+        imval = self.ztv_frame.display_image[y, x]
+        new_status_string = "x,y={},{}".format(x, y)
+        if self.ztv_frame.image_radec is not None:
+            new_status_string += "  radec=" + self.ztv_frame.image_radec.radec_string(x, y)
+        new_status_string += "  val={:.5g}".format(imval)
+        self.ztv_frame.status_bar.SetStatusText(new_status_string, 0)
+        self.ztv_frame.loupe_image_panel.set_xy_limits((x, y))
   
     def on_button_release(self, event):
         if event.button == 1:  # left button
@@ -334,7 +505,7 @@ class PrimaryImagePanel(wx.Panel):
                 if self.zoom_rect in self.axes.patches:
                     self.axes.patches.remove(self.zoom_rect)
                 self.zoom_rect = None
-                self.figure.canvas.draw()
+                self.redraw_overlay()
             else:
                 if (self.available_cursor_modes.has_key(self.cursor_mode) and
                     self.available_cursor_modes[self.cursor_mode].has_key('on_button_release')):
@@ -359,6 +530,7 @@ class PrimaryImagePanel(wx.Panel):
         self.figure.canvas.PopupMenuXY(self.popup_menu, event.GetX() + 8,  event.GetY() + 8)
 
     def on_cursor_leave(self, event):
+        self._hover_pixel = None  # (in case an update is still pending)
         self.ztv_frame.status_bar.SetStatusText('', 0)
         self.ztv_frame.loupe_image_panel.set_xy_limits()
         if hasattr(self, 'saved_cursor') and self.saved_cursor is not None:
@@ -388,21 +560,25 @@ class PrimaryImagePanel(wx.Panel):
 
     def add_text(self, text_key, *args, **kwargs):
         no_redraw = kwargs.pop('no_redraw', False)
-        self.text_dict[text_key] = {'args':args, 'kwargs':kwargs}
-        self.axes.text(*args, **kwargs)
+        self.remove_text(text_key, no_redraw=True)
+        self.text_dict[text_key] = {'args':args, 'kwargs':kwargs, 'artist':self.axes.text(*args, **kwargs)}
+        self.text_dict[text_key]['artist'].set_animated(True)
         if not no_redraw:
-            self.figure.canvas.draw() 
+            self.redraw_overlay()
 
     def remove_text(self, text_key, no_redraw=False):
         if text_key in self.text_dict and self.text_dict[text_key] is not None:
-            pass   # TODO figure out how to remove text from matplotlib axes without access to original text object
+            self.text_dict[text_key]['artist'].remove()
         self.text_dict[text_key] = None
         if not no_redraw:
-            self.figure.canvas.draw() 
+            self.redraw_overlay()
 
     def reload_text_dict(self):
         for cur_key in self.text_dict:
-            self.axes.text(*self.text_dict[cur_key]['args'], **self.text_dict[cur_key]['kwargs'])
+            if self.text_dict[cur_key] is not None:
+                self.text_dict[cur_key]['artist'] = self.axes.text(*self.text_dict[cur_key]['args'],
+                                                                   **self.text_dict[cur_key]['kwargs'])
+                self.text_dict[cur_key]['artist'].set_animated(True)
 
     def add_patch(self, patch_key, new_patch, no_redraw=False):
         """
@@ -413,9 +589,10 @@ class PrimaryImagePanel(wx.Panel):
         if patch_key in self.patches_dict and self.patches_dict[patch_key] is not None:
             self.axes.patches.remove(self.patches_dict[patch_key])
         self.patches_dict[patch_key] = new_patch
+        new_patch.set_animated(True)
         self.axes.add_patch(new_patch)
         if not no_redraw:
-            self.figure.canvas.draw() 
+            self.redraw_overlay()
 
     def remove_patch(self, patch_key, no_redraw=False):
         """
@@ -427,25 +604,118 @@ class PrimaryImagePanel(wx.Panel):
             self.axes.patches.remove(self.patches_dict[patch_key])
         self.patches_dict[patch_key] = None
         if not no_redraw:
-            self.figure.canvas.draw() 
+            self.redraw_overlay()
 
     def reload_patches_dict(self):
         for cur_key in self.patches_dict:
             if self.patches_dict[cur_key] is not None:
+                self.patches_dict[cur_key].set_animated(True)
                 self.axes.add_patch(self.patches_dict[cur_key])
 
+    def overlay_artists(self):
+        """
+        the patches, text and zoom rectangle drawn on top of the image.  These are all animated artists,
+        so a full canvas.draw() renders only the image & they are then composited on top by blitting.
+        """
+        artists = [x for x in self.patches_dict.values() if x is not None]
+        artists.extend([x['artist'] for x in self.text_dict.values() if x is not None])
+        if self.zoom_rect is not None:
+            artists.append(self.zoom_rect)
+        return sorted(artists, key=lambda x: x.get_zorder())
+
+    def _draw_overlay_artists(self):
+        for artist in self.overlay_artists():
+            self.axes.draw_artist(artist)
+
+    def _on_draw_event(self, event):
+        # every full draw:  cache the freshly rendered image as the background & put the overlay on top of it
+        self.overlay_background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_overlay_artists()
+
+    def redraw_overlay(self):
+        """
+        Redraw only the overlay artists (patches, text, zoom rectangle) on top of the cached background,
+        without re-rendering the image.  Use whenever only overlay artists have moved/changed, e.g. during drags.
+        """
+        if self.overlay_background is None:
+            self.figure.canvas.draw()
+            return
+        self.figure.canvas.restore_region(self.overlay_background)
+        self._draw_overlay_artists()
+        self.figure.canvas.blit(self.figure.bbox)
+
     def redraw_primary_image(self, msg=None):
         if msg is True or self.ztv_frame._pause_redraw_image:
             return
-        self.axes.cla()   # to avoid matplotlib memory leaks, need to clear axes each load
-        self.axes_image = self.axes.imshow(self.ztv_frame.normalize(self.ztv_frame.display_image),
-                                           interpolation='Nearest', 
-                                           cmap=self.ztv_frame.get_cmap_to_display(), zorder=0)
-        clear_ticks_and_frame_from_axes(self.axes)
-        self.reload_patches_dict()
-        self.reload_text_dict()
-        self.set_and_get_xy_limits()
-        # self.figure.canvas.draw() is not needed here, b/c called from within set_and_get_xy_limits
+        self.ztv_frame.redraw_scheduler.request('primary_image_panel', self._redraw_primary_image)
+
+    def _image_region(self, xlim, ylim, margin_fraction=0.):
+        """
+        (x0, x1, y0, y1) of display_image covering xlim/ylim, plus margin_fraction of the view size (and at least
+        16 pixels, if margin_fraction > 0) on each side, clipped to the image.  x1/y1 are exclusive, as for slicing.
+        """
+        ny, nx = self.ztv_frame.display_image.shape
+        x_margin, y_margin = 0., 0.
+        if margin_fraction > 0.:
+            x_margin = max(16., margin_fraction * abs(xlim[1] - xlim[0]))
+            y_margin = max(16., margin_fraction * abs(ylim[1] - ylim[0]))
+        x0 = min(max(0, int(np.floor(min(xlim) - x_margin))), nx - 1)
+        x1 = min(max(x0 + 1, int(np.ceil(max(xlim) + x_margin)) + 1), nx)
+        y0 = min(max(0, int(np.floor(min(ylim) - y_margin))), ny - 1)
+        y1 = min(max(y0 + 1, int(np.ceil(max(ylim) + y_margin)) + 1), ny)
+        return x0, x1, y0, y1
+
+    def update_rendered_region(self, xlim, ylim, force=False):
+        """
+        Hand matplotlib only the part of the normalized image that is in (or near) view, so that rendering cost
+        scales with the number of visible pixels rather than the size of the image.  The region is re-extracted
+        only when the view moves outside of it (e.g. panning past the margin) or it has become much bigger than
+        needed (e.g. after zooming in).
+        """
+        if self.axes_image is None:
+            return
+        pyramid = self.ztv_frame.image_pyramid
+        level = pyramid.level_for_zoom(self.ztv_frame.zoom_factor)
+        x0, x1, y0, y1 = self._image_region(xlim, ylim, self.viewport_margin_fraction)
+        if not force and self.rendered_region is not None:
+            rlevel, rx0, rx1, ry0, ry1 = self.rendered_region
+            vx0, vx1, vy0, vy1 = self._image_region(xlim, ylim)
+            still_covered = (rx0 <= vx0) and (rx1 >= vx1) and (ry0 <= vy0) and (ry1 >= vy1)
+            oversized = (rx1 - rx0) * (ry1 - ry0) > 4 * (x1 - x0) * (y1 - y0)
+            if still_covered and not oversized and rlevel == level:
+                return
+        if level == 0:
+            index = self.ztv_frame.normalize_region(x0, x1, y0, y1)
+        else:
+            # zoomed out:  take the region from the matching block-averaged level of the pyramid
+            step = 2 ** level
+            x0, y0 = x0 // step, y0 // step
+            x1, y1 = -(-x1 // step), -(-y1 // step)
+            index = self.ztv_frame.normalize(pyramid.get_level(level)[y0:y1, x0:x1])
+            x0, x1, y0, y1 = x0 * step, x1 * step, y0 * step, y1 * step
+        self.axes_image.set_data(self.ztv_frame.colorize(index))
+        self.axes_image.set_extent([x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5])
+        self.rendered_region = (level, x0, x1, y0, y1)
+
+    def on_image_pyramid_level_ready(self, msg):
+        pyramid, level = msg
+        if (pyramid is self.ztv_frame.image_pyramid and self.rendered_region is not None and
+            self.rendered_region[0] == level):
+            # swap the stand-in subsample currently shown for the now finished block-averaged level
+            self.update_rendered_region(self.xlim, self.ylim, force=True)
+            if not self.ztv_frame._pause_redraw_image:
+                self.figure.canvas.draw()
+
+    def _redraw_primary_image(self):
+        if self.axes_image is None:
+            # axes_image is always handed RGBA from ztv_frame.colorize, so no cmap/norm of its own.
+            # It is then updated in place (rather than cla() & imshow()), so that patches/text stay
+            # attached and no new matplotlib objects pile up in memory
+            self.axes_image = self.axes.imshow(np.zeros((1, 1, 4), dtype=np.uint8), interpolation='Nearest',
+                                               zorder=0)
+            clear_ticks_and_frame_from_axes(self.axes)
+        self.rendered_region = None   # image/normalization has changed, so the region has to be re-extracted
+        self.set_and_get_xy_limits()  # sets the visible region's data on axes_image (update_rendered_region) & draws
 
 
 class OverviewImagePanel(wx.Panel):
@@ -457,6 +727,7 @@ class OverviewImagePanel(wx.Panel):
         self.figure = Figure(None, dpi)
         self.axes = self.figure.add_axes([0., 0., 1., 1.])
         self.curview_rectangle = Rectangle((0, 0), 1, 1, color='orange', fill=False, zorder=100)
+        self.axes_image = None
         self.canvas = FigureCanvasWxAgg(self, -1, self.figure)
         self.overview_zoom_factor = 1.
         self._SetSize()
@@ -466,6 +737,7 @@ class OverviewImagePanel(wx.Panel):
         self.axes_widget.connect_event('button_release_event', self.on_button_release)
         self.axes_widget.connect_event('motion_notify_event', self.on_motion)
         pub.subscribe(self.redraw_overview_image, 'redraw-image')   
+        pub.subscribe(self.on_image_pyramid_level_ready, 'image-pyramid-level-ready')
         pub.subscribe(self.redraw_box, 'primary-xy-limits-changed')
 
     def redraw_box(self, msg=None):
@@ -535,23 +807,33 @@ class OverviewImagePanel(wx.Panel):
     def redraw_overview_image(self, msg=None):
         if msg is True or self.ztv_frame._pause_redraw_image:
             return
-        # note that following is not an actual rebin, but a sub-sampling, which is what matplotlib ultimately
-        # would do on its own anyway if we gave it the full image.  But, matplotlib takes longer.  For a 2Kx2K
-        # image, this saves almost 0.3sec on a ~2014 MacBookProRetina
-        max_rebin_x = float(self.ztv_frame.display_image.shape[1]) / self.size.x
-        max_rebin_y = float(self.ztv_frame.display_image.shape[0]) / self.size.y
-        rebin_factor = max(1, np.int(np.floor(min([max_rebin_x, max_rebin_y]))))
-        self.axes.cla()
-        # TODO: work here on why sometimes the overview image isn't scaled to the same clims as the main image
-        #       think it has something to do with the rebinning in the next line.
-        self.axes_image = self.axes.imshow(self.ztv_frame.normalize(self.ztv_frame.display_image)[::rebin_factor, 
-                                                                                                  ::rebin_factor],
-                                           interpolation='Nearest', vmin=0., vmax=1.,
-                                           extent=[0., self.ztv_frame.display_image.shape[1], 
-                                                   self.ztv_frame.display_image.shape[0], 0.],
-                                           cmap=self.ztv_frame.get_cmap_to_display(), zorder=0)
-        self.axes.add_patch(self.curview_rectangle)
-        clear_ticks_and_frame_from_axes(self.axes)
+        self.ztv_frame.redraw_scheduler.request('overview_image_panel', self._redraw_overview_image)
+
+    def overview_level(self):
+        max_zoom_x = self.size.x / float(self.ztv_frame.display_image.shape[1])
+        max_zoom_y = self.size.y / float(self.ztv_frame.display_image.shape[0])
+        return self.ztv_frame.image_pyramid.level_for_zoom(max(max_zoom_x, max_zoom_y))
+
+    def on_image_pyramid_level_ready(self, msg):
+        pyramid, level = msg
+        if pyramid is self.ztv_frame.image_pyramid and level == self.overview_level():
+            self.redraw_overview_image()
+
+    def _redraw_overview_image(self):
+        # rather than handing matplotlib the full image (which it would just sub-sample, slowly), show the
+        # block-averaged level of the image pyramid that matches the overview's scale.  (Until that level has
+        # been built in the background, get_level stands in a sub-sampling.)
+        level = self.overview_level()
+        rebinned_image = self.ztv_frame.colorize(self.ztv_frame.normalize(self.ztv_frame.image_pyramid.get_level(level)))
+        step = 2 ** level
+        extent = [-0.5, rebinned_image.shape[1] * step - 0.5, rebinned_image.shape[0] * step - 0.5, -0.5]
+        if self.axes_image is None:
+            self.axes_image = self.axes.imshow(rebinned_image, interpolation='Nearest', extent=extent, zorder=0)
+            self.axes.add_patch(self.curview_rectangle)
+            clear_ticks_and_frame_from_axes(self.axes)
+        else:
+            self.axes_image.set_data(rebinned_image)
+            self.axes_image.set_extent(extent)
         self.set_xy_limits()
         self.redraw_box()
 #         self.figure.canvas.draw()  is redundant here because redraw_box calls it
@@ -561,6 +843,7 @@ class LoupeImagePanel(wx.Panel):
     def __init__(self, parent, size=wx.Size(128,128), dpi=None, **kwargs):
         self.size = size
         self.size_npix_xy = wx.Size(11, 11)
+        self.axes_image = None
         wx.Panel.__init__(self, parent, wx.ID_ANY, wx.DefaultPosition, size, 0, **kwargs)
         self.ztv_frame = self.GetTopLevelParent()
         self.figure = Figure(None, dpi)
@@ -583,19 +866,30 @@ class LoupeImagePanel(wx.Panel):
             self.crosshair = self.axes.plot([center[0]], [center[1]], 'gx', zorder=100, markersize=7)
         else:
             self.crosshair[0].set_data([center[0]], [center[1]])
+        if self.axes_image is not None:
+            # only the few pixels around center are colorized, rather than all of display_image
+            ny, nx = self.ztv_frame.display_image.shape
+            half_size = max(self.size_npix_xy) // 2 + 1
+            x0 = min(max(0, int(np.round(center[0])) - half_size), nx - 1)
+            x1 = min(max(x0 + 1, int(np.round(center[0])) + half_size + 1), nx)
+            y0 = min(max(0, int(np.round(center[1])) - half_size), ny - 1)
+            y1 = min(max(y0 + 1, int(np.round(center[1])) + half_size + 1), ny)
+            self.axes_image.set_data(self.ztv_frame.colorize(self.ztv_frame.normalize_region(x0, x1, y0, y1)))
+            self.axes_image.set_extent([x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5])
         self.figure.canvas.draw()
         self.last_center = center  # record for future use, e.g. if clim/cmap changes & need to redraw
 
     def redraw_loupe_image(self, msg=None):
         if msg is True or self.ztv_frame._pause_redraw_image:
             return
-        self.axes.cla()
-        self.crosshair = None
-        self.axes_image = self.axes.imshow(self.ztv_frame.normalize(self.ztv_frame.display_image),
-                                           interpolation='Nearest',
-                                           cmap=self.ztv_frame.get_cmap_to_display(), zorder=0)
-        clear_ticks_and_frame_from_axes(self.axes)
-        self.set_xy_limits(self.last_center)
+        self.ztv_frame.redraw_scheduler.request('loupe_image_panel', self._redraw_loupe_image)
+
+    def _redraw_loupe_image(self):
+        if self.axes_image is None:
+            self.axes_image = self.axes.imshow(np.zeros((1, 1, 4), dtype=np.uint8), interpolation='Nearest',
+                                               zorder=0)
+            clear_ticks_and_frame_from_axes(self.axes)
+        self.set_xy_limits(self.last_center)  # sets axes_image's data for the region around last_center
 
 
 class ControlsNotebook(wx.Notebook):
@@ -666,9 +960,16 @@ class ZTVFrame(wx.Frame):
                           style = wx.DEFAULT_FRAME_STYLE)
         pub.subscribe(self.kill_ztv, 'kill-ztv')
         pub.subscribe(self.load_numpy_array, 'load-numpy-array')
+        pub.subscribe(self.load_shared_numpy_array, 'load-shared-numpy-array')
         pub.subscribe(self.load_fits_file, 'load-fits-file')
+        pub.subscribe(self.autoload_fits_file, 'autoload-fits-file')
+        pub.subscribe(self.queue_fits_file, 'queue-fits-file')
+        self.fits_loader = FITSLoader(self.read_fits_file, self._on_fits_file_read, self._on_fits_file_read_failed,
+                                      wx.CallAfter)
         pub.subscribe(self.load_default_image, 'load-default-image')
         self._pause_redraw_image = False
+        self._batch_in_progress = False  # True between begin_batch and end_batch, see CommandDispatcher.dispatch_batch
+        self.redraw_scheduler = RedrawScheduler(is_paused=lambda: self._pause_redraw_image)
         self.cur_fitsfile_basename = ''
         self.cur_fitsfile_path = ''
         self.image_process_functions_to_apply = []  # list of tuples of ('NameOrLabelIdentifier', fxn), where fxn must accept the image and return the processed image
@@ -682,10 +983,21 @@ class ZTVFrame(wx.Frame):
         # except for the above initialization, display_image should *never* be changed except by self.recalc_display_image
         self._display_image_min = None  # _display_image_min/max will be recalc'd in a 'safe' way (ignoring Inf/NaN) 
         self._display_image_max = None  # as needed when display_image_min()/max() are called
-        self.normalized_image = None  # this will be display_image clipped to clim and scaled (e.g. Linear/Log)
+        self.image_pyramid = ImagePyramid(self.display_image)  # block-averaged levels of display_image, for display
+        self.normalized_image = None  # display_image quantized over clim to indices into display_lut, see normalize()
         self._need_to_recalc_normalization = False
-        self._norm = None
+        self.normalized_image_cache = LRUCache()  # normalized_image for recent (frame, clim)'s
+        self.statistics_cache = LRUCache(max_bytes=64 * 2**20)  # ImageStatistics of recent frames
+        # ImageStatistics of recent stats boxes are kept apart, so that dragging a stats box around (a new region
+        # every time, each with its own histogram) does not push the frames' statistics out of statistics_cache
+        self.region_statistics_cache = LRUCache(max_bytes=8 * 2**20)
+        self._proc_image_serial = 0  # bumped every time proc_image is recalculated, to tell frames apart in the cache
+        self.normalized_image_key = None  # cache key that normalized_image is (or is being computed) for
+        self.normalization_worker = NormalizationWorker(self.quantize, self._on_normalization_done)
+        self._set_norm_old_clim = None
         self._scaling = None
+        self._display_lut = None  # RGBA table of scaling & cmap, see get_display_lut()
+        self._display_lut_key = None
         self.available_cmaps = ColorMaps().basic()
         self.cmap = 'viridis'  # will go back to gray later
         self.is_cmap_inverted = False
@@ -698,19 +1010,33 @@ class ZTVFrame(wx.Frame):
         pub.subscribe(self.set_clim_to_minmax, 'set-clim-to-minmax')
         pub.subscribe(self.set_clim_to_auto, 'set-clim-to-auto')
         pub.subscribe(self.set_clim_to_auto_stats_box, 'set-clim-to-auto-stats-box')
+        pub.subscribe(self.set_clim_to_auto_percentile, 'set-clim-to-auto-percentile')
         pub.subscribe(self.set_clim, 'set-clim')
         pub.subscribe(self.set_scaling, 'set-scaling')
         pub.subscribe(self.set_norm, 'clim-changed')
         pub.subscribe(self.set_norm, 'scaling-changed')
+        pub.subscribe(self.set_normalized_image_cache_max_bytes, 'set-normalized-image-cache-max-bytes')
         pub.subscribe(self.recalc_proc_image, 'image-process-functions-to-apply-changed')
         pub.subscribe(self.set_cur_display_frame_num, 'set-cur-display-frame-num') 
         pub.subscribe(self.set_window_title, 'set-window-title')
+        self.command_handlers = {}  # command name -> handler, for commands from a ZTV client; see register_command_handler
+        self.current_request_id = None  # request id of the client command being dispatched, see tag_reply
+        self.register_command_handler('switch-to-control-panel', self.switch_to_control_panel)
+        self.register_command_handler('load-fits-file', self.load_fits_file_now)
+        for cur_command in ['get-sky-subtraction-status-and-filename', 'get-flat-division-status-and-filename',
+                            'get-sky-combine-method-and-cache-dir',
+                            'get-autoload-status-and-filename-pattern', 'get-autoload-pausetime',
+                            'get-autoload-stats', 'get-autoload-readiness-check-and-frame-policy']:
+            # replaced by SourcePanel's own handlers when it is loaded
+            self.register_command_handler(cur_command, self._create_source_panel_not_available_handler(cur_command))
         self.scaling = 'Linear'
         self.available_scalings = ['Linear', 'Asinh', 'Log', 'PowerDist', 'Sinh', 'Sqrt', 'Squared']
         # scalings that require inputs & need additional work to implement:  
         #      'AsymmetricPercentile', 'ContrastBias', 'HistEq', 'Power'
         # don't bother implementing these unless strong case is made they're needed in a way that existing can't satisfy
-        self.available_value_modes_on_new_image = ['data-min/max', 'auto', 'auto-stats-box', 'constant']
+        self.available_value_modes_on_new_image = ['data-min/max', 'auto', 'auto-stats-box', 'auto-percentile',
+                                                   'constant']
+        self.auto_percentile_limits = (0.5, 99.5)  # percentiles used for clim by 'auto-percentile'
         self.min_value_mode_on_new_image = 'data-min/max'
         self.max_value_mode_on_new_image = 'data-min/max'
         self.main_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -805,6 +1131,44 @@ class ZTVFrame(wx.Frame):
                 pass  # if this page # doesn't exist...
         return on_cmd_alt_number
 
+    @property
+    def redraw_counts(self):
+        """
+        redraws requested vs. performed for each image panel, returned by the 'get-redraw-counts' request
+        """
+        return self.redraw_scheduler.counts
+
+    def register_command_handler(self, command_name, handler):
+        """
+        handler will be called (on the main thread, in the order commands arrive) with the msg part of any
+        command_name message from a ZTV client.  Registering a command_name again replaces the earlier handler.
+        Commands without a registered handler fall back to a pubsub message of the same name (see
+        command_dispatch.CommandDispatcher).
+        """
+        self.command_handlers[command_name] = handler
+
+    def tag_reply(self, msg):
+        """
+        msg, a (title, value) return value for a ZTV client, tagged with the request id (if any) of the command
+        being dispatched, so that the client can match it to the request that asked for it.  Call while handling
+        the command, even if the reply itself is sent later, e.g.:
+            wx.CallAfter(send_to_stream, sys.stdout, self.ztv_frame.tag_reply(('some-info', info)))
+        """
+        if self.current_request_id is None:
+            return msg
+        return tuple(msg) + (self.current_request_id,)
+
+    def _create_source_panel_not_available_handler(self, command_name):
+        def source_panel_not_available(msg):
+            send_to_stream(sys.stdout, self.tag_reply((command_name[4:], 'source_panel not available')))
+        return source_panel_not_available
+
+    def switch_to_control_panel(self, msg):
+        name_lower = msg.lower()
+        display_names_lower = [a.ztv_display_name.lower() for a in self.control_panels]
+        if name_lower in display_names_lower:
+            self.control_panels[display_names_lower.index(name_lower)].select_panel()
+
     def kill_ztv(self, msg=None):
         self.Close()
 
@@ -896,62 +1260,69 @@ class ZTVFrame(wx.Frame):
         self.set_clim(((msg[0] or self._pause_redraw_image), 
                       [self.display_image_min(), self.display_image_max()]))
 
-    def get_auto_clim_values(self, *args):
+    def display_image_statistics(self, region=None):
         """
-        Set min/max of display to n_sigma_below and n_sigma_above background
-        
-        'cheat' for speed by sampling only a subset of pts
-        """
-        finite_mask = np.isfinite(self.display_image)
-        n_finite_pts = finite_mask.sum()
-        if n_finite_pts > 0:
-            n_pts = 1000
-            # sample ALL points unless the sampled points will be reasonably nicely distributed.  e.g.
-            # n_pts=1000, n_finite_pts=1999 -> all samples would be clumped in one half.
-            # factor of 5* means that the 'missing' unsampled clump at the end is <=20% of total pts, which seems reasonable
-            if n_finite_pts < (5*n_pts):  
-                robust_mean, robust_median, robust_stdev = sigma_clipped_stats(self.display_image[finite_mask])
+        ImageStatistics (min/max, finite count, histogram, ...) of display_image, or of display_image[y0:y1, x0:x1]
+        for region=(x0, x1, y0, y1).  Gathered in one pass once per frame (and region) and then re-used from
+        statistics_cache (region_statistics_cache for regions) by everything that needs them (clim modes, color
+        & stats panels).
+        """
+        key = (self._proc_image_serial, self.cur_display_frame_num, region)
+        cache = self.statistics_cache if region is None else self.region_statistics_cache
+        statistics = cache.get(key)
+        if statistics is None:
+            if region is None:
+                statistics = ImageStatistics(self.display_image)
             else:
-                stepsize = n_finite_pts/n_pts
-                robust_mean, robust_median, robust_stdev = sigma_clipped_stats(self.display_image[finite_mask].ravel()[0::stepsize])
-            n_sigma_below = 1.0
-            n_sigma_above = 6.
-            return (robust_mean - n_sigma_below * robust_stdev, robust_mean + n_sigma_above * robust_stdev)
-        else:
+                x0, x1, y0, y1 = region
+                statistics = ImageStatistics(self.display_image[y0:y1, x0:x1])
+            cache.put(key, statistics)
+        return statistics
+
+    def _auto_clim_values_from_statistics(self, statistics):
+        if statistics.n_finite == 0:
             return (0., 0.)  # no valid pixels
+        robust_mean, robust_median, robust_stdev = statistics.sigma_clipped_stats()
+        n_sigma_below = 1.0
+        n_sigma_above = 6.
+        return (robust_mean - n_sigma_below * robust_stdev, robust_mean + n_sigma_above * robust_stdev)
+
+    def get_auto_clim_values(self, *args):
+        """
+        Set min/max of display to n_sigma_below and n_sigma_above background
+
+        background is from the frame's statistics (see display_image_statistics)
+        """
+        return self._auto_clim_values_from_statistics(self.display_image_statistics())
 
     def get_auto_stats_box_clim_values(self, *args):
         """
         Set min/max of display to n_sigma_below and n_sigma_above background in stats box
-        
-        'cheat' for speed by sampling only a subset of pts
         """
+        region = None
         if (isinstance(self.stats_panel.stats_info, dict) and 
             self.stats_panel.stats_info.has_key('xrange') and
             self.stats_panel.stats_info.has_key('yrange')):
-            temp_image = self.display_image[min(self.stats_panel.stats_info['yrange']):
-                                            max(self.stats_panel.stats_info['yrange']),
-                                            min(self.stats_panel.stats_info['xrange']):
-                                            max(self.stats_panel.stats_info['xrange'])] 
-        else:
-            temp_image = self.display_image
-        finite_mask = np.isfinite(temp_image)
-        n_finite_pts = finite_mask.sum()
-        if n_finite_pts > 0:
-            n_pts = 1000
-            # sample ALL points unless the sampled points will be reasonably nicely distributed.  e.g.
-            # n_pts=1000, n_finite_pts=1999 -> all samples would be clumped in one half.
-            # factor of 5* means that the 'missing' unsampled clump at the end is <=20% of total pts, which seems reasonable
-            if n_finite_pts < (5*n_pts):  
-                robust_mean, robust_median, robust_stdev = sigma_clipped_stats(temp_image[finite_mask])
-            else:
-                stepsize = n_finite_pts/n_pts
-                robust_mean, robust_median, robust_stdev = sigma_clipped_stats(temp_image[finite_mask].ravel()[0::stepsize])
-            n_sigma_below = 1.0
-            n_sigma_above = 6.
-            return (robust_mean - n_sigma_below * robust_stdev, robust_mean + n_sigma_above * robust_stdev)
-        else:
-            return (0., 0.)  # no valid pixels        
+            region = (min(self.stats_panel.stats_info['xrange']), max(self.stats_panel.stats_info['xrange']),
+                      min(self.stats_panel.stats_info['yrange']), max(self.stats_panel.stats_info['yrange']))
+        return self._auto_clim_values_from_statistics(self.display_image_statistics(region))
+
+    def get_auto_percentile_clim_values(self, *args):
+        """
+        Set min/max of display to the auto_percentile_limits (e.g. 0.5% & 99.5%) percentiles of the frame
+        """
+        statistics = self.display_image_statistics()
+        if statistics.n_finite == 0:
+            return (0., 0.)  # no valid pixels
+        return (statistics.percentile(self.auto_percentile_limits[0]),
+                statistics.percentile(self.auto_percentile_limits[1]))
+
+    def set_clim_to_auto_percentile(self, msg=(False,)):
+        """
+        msg is tuple:  (pause_redraw_image, )
+        """
+        auto_clim = self.get_auto_percentile_clim_values()
+        self.set_clim(((msg[0] or self._pause_redraw_image), [auto_clim[0], auto_clim[1]]))
 
     def set_clim_to_auto_stats_box(self, msg=(False,)):
         """
@@ -971,23 +1342,108 @@ class ZTVFrame(wx.Frame):
         """
         msg is tuple:  (pause_redraw_image, )
         """
-        if self._norm is None or self.clim != self._set_norm_old_clim:
-            self._norm = Normalize(vmin=self.clim[0], vmax=self.clim[1])
+        if self._set_norm_old_clim is None or self.clim != self._set_norm_old_clim:
             self._set_norm_old_clim = self.clim
             self._need_to_recalc_normalization = True
         if self._scaling is None or self.scaling != self._set_norm_old_scaling:
+            # the stretch only goes into display_lut, so normalized_image does not need recalculating
             self._scaling = eval('astropy.visualization.' + self.scaling + 'Stretch()')
             self._set_norm_old_scaling = self.scaling
-            self._need_to_recalc_normalization = True
         if not (msg[0] or self._pause_redraw_image):
             wx.CallAfter(pub.sendMessage, 'redraw-image', msg=False)
 
-    def normalize(self, im):
-        if self._need_to_recalc_normalization or self.normalized_image is None:
-            self.normalized_image = self._scaling(self._norm(self.display_image))
+    def quantize(self, im, clim=None):
+        """
+        im quantized over clim (default: self.clim) to uint16 indices into display_lut, see display_lut.quantize.
+        (Safe to call from the NormalizationWorker thread, when given clim.)
+        """
+        if clim is None:
+            clim = self.clim
+        return quantize(im, clim)
+
+    def normalized_display_image(self):
+        """
+        display_image quantized over clim (see quantize); colorize() then turns that into RGBA.  The scaling
+        (stretch) and cmap are applied by the lookup table, so only a clim change (or new display_image)
+        needs a new pass over the data.
+
+        Results are kept in normalized_image_cache, keyed by frame & clim, so that blinking between frames or
+        back & forth between clims re-uses them.  (The scaling does not need to be part of the key, as it is
+        applied by the lookup table.)  On a cache miss the frame is handed to normalization_worker and None
+        is returned until it is done; see normalize_region.
+        """
+        if self._need_to_recalc_normalization or self.normalized_image_key is None:
             self._need_to_recalc_normalization = False
+            self.normalized_image_key = (self._proc_image_serial, self.cur_display_frame_num, tuple(self.clim))
+            self.normalized_image = self.normalized_image_cache.get(self.normalized_image_key)
+            if self.normalized_image is None:
+                self.normalization_worker.submit(self.normalized_image_key, self.display_image, tuple(self.clim))
         return self.normalized_image
 
+    def _on_normalization_done(self, key, normalized):
+        # called on the gui thread by normalization_worker
+        if key[0] == self._proc_image_serial:  # (anything older was computed from a proc_image that's gone)
+            self.normalized_image_cache.put(key, normalized)
+        if key == self.normalized_image_key and self.normalized_image is None:
+            self.normalized_image = normalized
+
+    def normalize_region(self, x0, x1, y0, y1):
+        """
+        display_image[y0:y1, x0:x1] quantized over clim.  Taken from the whole normalized frame when that is
+        available, otherwise just the region is quantized (while the whole frame is done in the background).
+        """
+        normalized_image = self.normalized_display_image()
+        if normalized_image is not None:
+            return normalized_image[y0:y1, x0:x1]
+        return self.quantize(self.display_image[y0:y1, x0:x1])
+
+    def normalize(self, im):
+        """
+        im quantized over clim (see quantize).  For display_image itself, the whole normalized frame (computed
+        right away if not yet available); anything else (e.g. a level of image_pyramid) is quantized on the spot.
+        """
+        if im is not self.display_image:
+            return self.quantize(im)
+        if self.normalized_display_image() is None:
+            self.normalization_worker.cancel()
+            self.normalized_image = self.quantize(self.display_image)
+            self.normalized_image_cache.put(self.normalized_image_key, self.normalized_image)
+        return self.normalized_image
+
+    @property
+    def normalized_image_cache_stats(self):
+        """
+        hits/misses, number of entries and bytes used/allowed of normalized_image_cache,
+        returned by the 'get-normalized-image-cache-stats' request
+        """
+        return self.normalized_image_cache.stats
+
+    def set_normalized_image_cache_max_bytes(self, msg):
+        """
+        msg is the new memory budget of normalized_image_cache, in bytes (0 turns off caching)
+        """
+        self.normalized_image_cache.set_max_bytes(int(msg))
+
+    def get_display_lut(self):
+        """
+        RGBA lookup table (see display_lut.display_lut) for the current scaling and (possibly inverted) cmap,
+        rebuilt only when one of those changes.
+        """
+        if self._scaling is None:
+            self._scaling = eval('astropy.visualization.' + self.scaling + 'Stretch()')
+            self._set_norm_old_scaling = self.scaling
+        key = (self.scaling, self.get_cmap_to_display())
+        if self._display_lut is None or key != self._display_lut_key:
+            self._display_lut = display_lut(self._scaling, cm.get_cmap(self.get_cmap_to_display()))
+            self._display_lut_key = key
+        return self._display_lut
+
+    def colorize(self, index):
+        """
+        RGBA (uint8) image of index, the output of normalize()
+        """
+        return colorize(index, self.get_display_lut())
+
     def set_scaling(self, msg):
         """
         msg is (pause_redraw_image, scaling)
@@ -1000,6 +1456,21 @@ class ZTVFrame(wx.Frame):
         else:
             sys.stderr.write("unrecognized scaling ({}) requested\n".format(scaling))
 
+    def begin_batch(self, msg=None):
+        """
+        Hold off all redrawing until end_batch, so that a batch of commands (see ZTV.batch) redraws only once.
+        """
+        self._batch_in_progress = True
+        self._pause_redraw_image = True
+
+    def end_batch(self, msg=None):
+        self._batch_in_progress = False
+        self._pause_redraw_image = False
+        # clim/scaling changes within the batch reach set_norm via CallAfter (with pause set), so bring the
+        # normalization up to date here before the one redraw.
+        self.set_norm((True,))
+        wx.CallAfter(pub.sendMessage, 'redraw-image', msg=False)
+
     def frame_number_textctrl_changed(self, evt):
         validate_textctrl_str(self.frame_number_textctrl, int, str(self.cur_display_frame_num))
         
@@ -1044,22 +1515,34 @@ class ZTVFrame(wx.Frame):
         """
         msg is (pause_redraw_image, )
         """
-        self.proc_image = self.raw_image.copy()
-        for cur_imageproc_label, cur_imageproc_fxn in self.image_process_functions_to_apply:
-            self.proc_image = cur_imageproc_fxn(self.proc_image)
+        if self.raw_image.ndim == 3:
+            # frames of a cube are only processed as they are displayed (or the whole cube, if e.g. a plot
+            # through the stack needs it); see ProcessedImageStack
+            self.proc_image = ProcessedImageStack(self.raw_image, self.image_process_functions_to_apply)
+        else:
+            # (raw_image itself is never modified, so no need to copy it when there is no processing to do)
+            self.proc_image = apply_process_functions(self.raw_image, self.image_process_functions_to_apply)
+        self._proc_image_serial += 1
+        self.normalized_image_cache.clear()  # nothing in it can be for the new proc_image
+        self.statistics_cache.clear()
+        self.region_statistics_cache.clear()
         self.recalc_display_image(msg=((msg[0] or self._pause_redraw_image),))
         wx.CallAfter(pub.sendMessage, 'recalc-proc-image-called',
                      msg=((msg[0] or self._pause_redraw_image),))
 
     def _recalc_display_image_minmax(self):
-        finite_mask = np.isfinite(self.display_image)
-        if finite_mask.max() is np.True_:
-            self._display_image_min = self.display_image[finite_mask].min()
-            self._display_image_max = self.display_image[finite_mask].max()
+        statistics = self.display_image_statistics()  # (same one pass over the data as auto clim uses)
+        if statistics.n_finite > 0:
+            self._display_image_min = statistics.min
+            self._display_image_max = statistics.max
         else:
             self._display_image_min = 0.
             self._display_image_max = 0. 
 
+    def _on_image_pyramid_level_ready(self, pyramid, level):
+        # called from the pyramid's background thread
+        wx.CallAfter(pub.sendMessage, 'image-pyramid-level-ready', msg=(pyramid, level))
+
     def display_image_min(self):
         if self._display_image_min is None:
             self._recalc_display_image_minmax()
@@ -1072,13 +1555,15 @@ class ZTVFrame(wx.Frame):
 
     def recalc_display_image(self, msg=(False,)):
         if self.proc_image.ndim == 2:
-            self.display_image = self.proc_image.copy()
+            self.display_image = self.proc_image  # (nothing modifies either one in place, so no need for a copy)
         elif self.proc_image.ndim == 3:
             # clip self.cur_display_frame_num to allowed range
             self.display_image = self.proc_image[min(max(0, self.cur_display_frame_num), 
                                                      self.proc_image.shape[0] - 1), :, :]
         else:
             raise Error("proc_image must be 2-d or 3-d, was instead {}-d".format(self.proc_image.ndim))
+        self.image_pyramid.cancel()
+        self.image_pyramid = ImagePyramid(self.display_image, on_level_ready=self._on_image_pyramid_level_ready)
         self._display_image_min = None
         self._display_image_max = None
         new_min, new_max = None, None
@@ -1090,6 +1575,8 @@ class ZTVFrame(wx.Frame):
         elif self.min_value_mode_on_new_image == 'auto-stats-box':
             auto_stats_box_clim_values = self.get_auto_stats_box_clim_values()
             new_min = auto_stats_box_clim_values[0]
+        elif self.min_value_mode_on_new_image == 'auto-percentile':
+            new_min = self.get_auto_percentile_clim_values()[0]
         if self.max_value_mode_on_new_image == 'data-min/max':
             new_max = self.display_image_max()
         elif self.max_value_mode_on_new_image == 'auto':
@@ -1100,6 +1587,8 @@ class ZTVFrame(wx.Frame):
             if self.min_value_mode_on_new_image != 'auto-stats-box':  # only calculate if didn't already calculate above
                 auto_stats_box_clim_values = self.get_auto_stats_box_clim_values()
             new_max = auto_stats_box_clim_values[1]
+        elif self.max_value_mode_on_new_image == 'auto-percentile':
+            new_max = self.get_auto_percentile_clim_values()[1]
         self._need_to_recalc_normalization = True
         self.set_clim(((msg[0] or self._pause_redraw_image), [new_min, new_max]))
         wx.CallAfter(pub.sendMessage, 'recalc-display-image-called',
@@ -1135,27 +1624,31 @@ class ZTVFrame(wx.Frame):
                 self.frame_number_sizer.ShowItems(True)
                 self.frame_number_textctrl.SetValue('0')
                 self.total_frame_numbers_text.SetLabel('of {}'.format(self.raw_image.shape[0]))
-        self._pause_redraw_image = False
+        self._pause_redraw_image = self._batch_in_progress
         wx.CallAfter(pub.sendMessage, 'redraw-image', msg=(self._pause_redraw_image,))
 
-    def load_hdulist_from_fitsfile(self, filename):
+    def load_shared_numpy_array(self, msg):
+        """
+        msg is the descriptor dict from ztv_lib.write_shared_array; the array is mapped, not copied
+        """
+        self.load_numpy_array(read_shared_array(msg))
+
+    def load_hdulist_from_fitsfile(self, filename, lazy=False, memmap=True):
         """
         The purpose of wrapping fits.open inside this routine is to put 
         all the warning suppressions, flags, etc in one place.
+
+        lazy=True memory-maps the file and leaves any BSCALE/BZERO scaling undone, so that nothing is read
+        until it is used;  get the data with fits_data.lazy_image_data(hdulist[0]), *not* hdulist[0].data
+        (lazy=True, memmap=False leaves the scaling undone in the same way, but reads the data into memory.)
+        No retrying here (that would hold up the gui):  a file that is still being written is retried by FITSLoader.
         """
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
-            max_n_tries = 5
-            pause_time_between_tries_sec = 1.
-            cur_try = 0
-            not_yet_successful = True
-            while (cur_try < max_n_tries) and not_yet_successful:
-                try:
-                    hdulist = fits.open(filename, ignore_missing_end=True)
-                    not_yet_successful = False
-                except:  # I've only seen IOerror, but might as well catch for all errors and re-try
-                    time.sleep(pause_time_between_tries_sec)
-                cur_try += 1
+            if lazy:
+                hdulist = fits.open(filename, ignore_missing_end=True, memmap=memmap, do_not_scale_image_data=True)
+            else:
+                hdulist = fits.open(filename, ignore_missing_end=True)
         return hdulist
 
     def set_window_title(self, msg=None):
@@ -1173,54 +1666,10 @@ class ZTVFrame(wx.Frame):
                 new_title += ') / ' + os.path.basename(self.source_panel.flat_file_fullname)
         self.SetTitle(new_title)
 
-    def load_fits_file(self, msg):
-        filename = msg
+    def _validate_fits_filename(self, filename):
         if isinstance(filename, str) or isinstance(filename, unicode):
             if filename.lower().endswith('.fits') or filename.lower().endswith('.fits.gz'):
-                if os.path.isfile(filename):
-                    # TODO: be more flexible about hdulist where image data is NOT just [0].data
-                    # TODO also, in case of extended fits files need to deal with additional header info
-                    # following try/except handles situation when autoloading files tries to autoload a file 
-                    #     before it's been fully written to disk.
-                    max_n_tries = 5
-                    pause_time_between_tries_sec = 1.
-                    cur_try = 0
-                    not_yet_successful = True
-                    while (cur_try < max_n_tries) and not_yet_successful:
-                        try:
-                            self.cur_fits_hdulist = self.load_hdulist_from_fitsfile(filename)
-                            self.load_numpy_array(self.cur_fits_hdulist[0].data, is_fits_file=True)
-                            not_yet_successful = False
-                        except:  # I've only seen ValueError, but might as well catch for all errors and re-try
-                            time.sleep(pause_time_between_tries_sec)
-                        cur_try += 1
-                    self.cur_fitsfile_basename = os.path.basename(filename)
-                    self.cur_fitsfile_path = os.path.abspath(os.path.dirname(filename))
-                    self.set_window_title()
-                    if (hasattr(self.primary_image_panel, 'cur_fits_header_dialog') and 
-                        self.primary_image_panel.cur_fits_header_dialog.is_dialog_still_open):
-                        raw_header_str = self.cur_fits_hdulist[0].header.tostring()
-                        header_str = (('\n'.join([raw_header_str[i:i+80] for i in np.arange(0, len(raw_header_str), 80)
-                                                  if raw_header_str[i:i+80] != " "*80])) + '\n')
-                        self.primary_image_panel.cur_fits_header_dialog.SetTitle(self.cur_fitsfile_basename)
-                        self.primary_image_panel.cur_fits_header_dialog.text.SetValue(header_str)
-                        self.primary_image_panel.cur_fits_header_dialog.last_find_index = 0
-                        self.primary_image_panel.cur_fits_header_dialog.on_search(None)
-                    # TODO: better error handling for if WCS not available or partially available
-                    try:
-                        w = wcs.WCS(self.cur_fits_hdulist[0].header)
-                        # TODO: (urgent) need to check ones/arange in following, do I have this reversed?
-                        a = w.all_pix2world(
-                                  np.outer(np.ones(self.raw_image.shape[-2]), 
-                                           np.arange(self.raw_image.shape[-1])),
-                                  np.outer(np.arange(self.raw_image.shape[-2]), 
-                                           np.ones(self.raw_image.shape[-1])),
-                                  0)
-                        self.image_radec = ICRS(a[0]*units.degree, a[1]*units.degree)
-                    except:  # just ignore radec if anything at all goes wrong.
-                        self.image_radec = None
-                    wx.CallAfter(pub.sendMessage, 'fitsfile-loaded', msg=filename)
-                else:
+                if not os.path.isfile(filename):
                     raise Error("Cannot find file: {}".format(filename))
             else:
                 raise Error("Requested filename ({}) does not end with .fits, .fits.gz, " +
@@ -1228,6 +1677,104 @@ class ZTVFrame(wx.Frame):
         else:
             raise Error("load_fits_file requires string input, not type: {}".format(type(filename)))
 
+    def read_fits_file(self, filename, memmap=True):
+        """
+        The part of loading a fits file that doesn't touch the gui, and so can be done by the FITSLoader thread:
+        opening it (memory-mapped, so that of a big cube only the frames displayed are ever read in), checking it
+        isn't still being written, decompressing it if need be, and setting up its WCS.
+        memmap=False reads the data into memory instead, for files that may be rewritten while displayed (e.g.
+        autoloaded ones):  touching a memory-mapped file that has been truncated kills ztv with SIGBUS.
+        returns (hdulist, image, image_radec);  raises an exception (e.g. FITSFileNotReady) if it can't be read
+        """
+        # TODO: be more flexible about hdulist where image data is NOT just [0].data
+        # TODO also, in case of extended fits files need to deal with additional header info
+        hdulist = self.load_hdulist_from_fitsfile(filename, lazy=True, memmap=memmap)
+        check_fits_file_complete(filename, hdulist)
+        image = lazy_image_data(hdulist[0])
+        if image is None:
+            raise Error("No image data in primary hdu of: {}".format(filename))
+        image_radec = image_radec_from_header(hdulist[0].header, image.shape)
+        return hdulist, image, image_radec
+
+    def load_fits_file(self, msg):
+        """
+        msg is the filename to load.  It is read in the background by fits_loader (which takes care of retrying
+        a file that autoload caught before it was fully written) and displayed when ready, unless another file
+        has been asked for in the meantime.
+        """
+        self._validate_fits_filename(msg)
+        self.fits_loader.submit(msg)
+
+    def autoload_fits_file(self, msg):
+        """
+        like load_fits_file, for files found by autoload, which are read into memory rather than memory-mapped
+        (see read_fits_file), as whatever writes them may well rewrite them while they are displayed
+        """
+        self._validate_fits_filename(msg)
+        self.fits_loader.submit(msg, memmap=False)
+
+    def queue_fits_file(self, msg):
+        """
+        like autoload_fits_file, except that msg is shown after any files already waiting to be loaded, instead
+        of replacing them (see SourcePanel.autoload_frame_policy)
+        """
+        self._validate_fits_filename(msg)
+        self.fits_loader.submit(msg, supersede=False, memmap=False)
+
+    def load_fits_file_now(self, msg):
+        """
+        Read & display the fits file msg before returning, for commands from a ZTV client, so that they
+        take effect in the order they were sent.
+        """
+        self._validate_fits_filename(msg)
+        self.fits_loader.cancel()  # anything still coming from the background is older than this
+        submit_time = time.time()
+        try:
+            result = self.read_fits_file(msg)
+        except Exception as e:
+            self._on_fits_file_read_failed(msg, e)
+            return
+        self._show_fits_file(msg, *result)
+        self.fits_loader.record_latency(time.time() - submit_time)
+
+    def _on_fits_file_read(self, serial, filename, result, submit_time, read_sec):
+        try:
+            if not self.fits_loader.is_current(serial):
+                self.fits_loader.stats['n_superseded'] += 1
+                return
+            self._show_fits_file(filename, *result)
+            self.fits_loader.record_latency(time.time() - submit_time)
+        finally:
+            self.fits_loader.displayed()
+
+    def _on_fits_file_read_failed(self, filename, error):
+        sys.stderr.write("ztv warning: could not load {}: {}\n".format(filename, error))
+
+    @property
+    def fits_load_stats(self):
+        """
+        counts and timings (see FITSLoader) of fits files loaded so far, returned by the 'get-fits-load-stats' request
+        """
+        return dict(self.fits_loader.stats)
+
+    def _show_fits_file(self, filename, hdulist, image, image_radec):
+        self.cur_fits_hdulist = hdulist
+        self.load_numpy_array(image, is_fits_file=True)
+        self.cur_fitsfile_basename = os.path.basename(filename)
+        self.cur_fitsfile_path = os.path.abspath(os.path.dirname(filename))
+        self.set_window_title()
+        if (hasattr(self.primary_image_panel, 'cur_fits_header_dialog') and 
+            self.primary_image_panel.cur_fits_header_dialog.is_dialog_still_open):
+            raw_header_str = self.cur_fits_hdulist[0].header.tostring()
+            header_str = (('\n'.join([raw_header_str[i:i+80] for i in np.arange(0, len(raw_header_str), 80)
+                                      if raw_header_str[i:i+80] != " "*80])) + '\n')
+            self.primary_image_panel.cur_fits_header_dialog.SetTitle(self.cur_fitsfile_basename)
+            self.primary_image_panel.cur_fits_header_dialog.text.SetValue(header_str)
+            self.primary_image_panel.cur_fits_header_dialog.last_find_index = 0
+            self.primary_image_panel.cur_fits_header_dialog.on_search(None)
+        self.image_radec = image_radec
+        wx.CallAfter(pub.sendMessage, 'fitsfile-loaded', msg=filename)
+
     def get_default_image(self):
         imsize_x = 256
         imsize_y = 256
@@ -1266,11 +1813,18 @@ class CommandListenerThread(threading.Thread):
         CommandListenerThread starts messing with parameters in ZTVFrame.  The appropriate way for CommandListenerThread
         to send commands to ZTVFrame is with a wx.CallAfter(pub.sendMessage....   call, e.g.:
             wx.CallAfter(pub.sendMessage, 'load-default-image', None)
+
+        Every incoming command, (name,) or (name, msg) or (name, msg, request_id), is handed to the main thread
+        with wx.CallAfter(self.dispatcher.dispatch, ...), and dispatched there by a CommandDispatcher (see
+        command_dispatch.py) to its registered handler, a 'get-' attribute of ztv_frame, or a pubsub message.
         """
         threading.Thread.__init__(self)
         self.ztv_frame = ztv_frame
         self.daemon = True
         self.keep_running = True
+        self.dispatcher = CommandDispatcher(ztv_frame, pub.sendMessage)
+        self.ztv_frame.register_command_handler('batch', self.dispatcher.dispatch_batch)
+        self.ztv_frame.register_command_handler('get-command-stats', self.dispatcher.publish_command_stats_to_stream)
         self.start()
 
     def run(self):
@@ -1285,96 +1839,7 @@ class CommandListenerThread(threading.Thread):
             else:
                 if not isinstance(x, tuple):
                     raise Error("ListenThread only accepts tuples")
-                wx.GetApp().ProcessIdle() # give time for any parameter changes to take effect
-                if (x[0].startswith('get-') and 
-                    hasattr(self.ztv_frame, x[0][4:].replace('-', '_')) and
-                    not callable(getattr(self.ztv_frame, x[0][4:].replace('-', '_')))):
-                    # catch the easiest cases where we just want some parameter out of ztv_frame, e.g.:
-                    # ztv.frame_cmap is returned by the request message 'get-cmap'
-                    wx.CallAfter(send_to_stream, sys.stdout, (x[0][4:], 
-                                                              getattr(self.ztv_frame, x[0][4:].replace('-', '_'))))
-                elif x[0] == 'get-xy-center':
-                    wx.CallAfter(send_to_stream, sys.stdout, 
-                                 (x[0][4:], (self.ztv_frame.primary_image_panel.center.x,
-                                             self.ztv_frame.primary_image_panel.center.y)))
-                # TODO: the following N elif statements accessing/controlling source_panel elements is ripe for some sort of sensible refactoring
-                elif x[0] == 'set-sky-subtraction-status':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        if x[1]:
-                            self.ztv_frame.source_panel.load_sky_subtraction_to_process_stack()
-                        else:
-                            self.ztv_frame.source_panel.unload_sky_subtraction_from_process_stack()
-                elif x[0] == 'set-sky-subtraction-filename':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        self.ztv_frame.source_panel.load_sky_frame(x[1])
-                elif x[0] == 'get-sky-subtraction-status-and-filename':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        sky_subtraction_loaded = False
-                        if 'sky-subtraction' in [a[0] for a in self.ztv_frame.image_process_functions_to_apply]:
-                            sky_subtraction_loaded = True
-                        wx.CallAfter(send_to_stream, sys.stdout, 
-                                     (x[0][4:], (sky_subtraction_loaded, 
-                                                 self.ztv_frame.source_panel.sky_file_fullname)))
-                    else:
-                        send_to_stream(sys.stdout, (x[0][4:], 'source_panel not available'))
-                elif x[0] == 'set-flat-division-status':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        if x[1]:
-                            self.ztv_frame.source_panel.load_flat_division_to_process_stack()
-                        else:
-                            self.ztv_frame.source_panel.unload_flat_division_from_process_stack()
-                elif x[0] == 'set-flat-division-filename':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        self.ztv_frame.source_panel.load_flat_frame(x[1])
-                elif x[0] == 'get-flat-division-status-and-filename':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        flat_division_loaded = False
-                        if 'flat-division' in [a[0] for a in self.ztv_frame.image_process_functions_to_apply]:
-                            flat_division_loaded = True
-                        wx.CallAfter(send_to_stream, sys.stdout, 
-                                     (x[0][4:], 
-                                      (flat_division_loaded, 
-                                       self.ztv_frame.source_panel.flatfile_file_picker.current_textctrl_GetValue())))
-                    else:
-                        send_to_stream(sys.stdout, (x[0][4:], 'source_panel not available'))
-                elif x[0] == 'set-autoload-filename-pattern-status':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        if x[1]:
-                            self.ztv_frame.source_panel.launch_autoload_filematch_thread()
-                            self.ztv_frame.source_panel.autoload_mode = 'file-match'
-                        else:
-                            self.ztv_frame.source_panel.kill_autoload_filematch_thread()
-                            self.ztv_frame.source_panel.autoload_mode = None
-                elif x[0] == 'set-autoload-filename-pattern':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        self.ztv_frame.source_panel.autoload_curfile_file_picker_on_load(x[1])
-                elif x[0] == 'get-autoload-status-and-filename-pattern':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        wx.CallAfter(send_to_stream, sys.stdout, 
-                                     (x[0][4:], 
-                                      (self.ztv_frame.source_panel.autoload_mode == 'file-match',
-                                       self.ztv_frame.source_panel.autoload_match_string)))
-                    else:
-                        send_to_stream(sys.stdout, (x[0][4:], 'source_panel not available'))
-                elif x[0] == 'set-autoload-pausetime':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        i = np.abs(np.array(self.ztv_frame.source_panel.autoload_pausetime_choices) - 
-                                   float(x[1])).argmin()
-                        self.ztv_frame.source_panel.autoload_pausetime = self.ztv_frame.source_panel.autoload_pausetime_choices[i]
-                        self.ztv_frame.source_panel.autoload_pausetime_choice.SetSelection(i)
-                elif x[0] == 'get-autoload-pausetime':
-                    if hasattr(self.ztv_frame, 'source_panel'):
-                        wx.CallAfter(send_to_stream, sys.stdout, 
-                                     (x[0][4:], self.ztv_frame.source_panel.autoload_pausetime))
-                    else:
-                        send_to_stream(sys.stdout, (x[0][4:], 'source_panel not available'))
-                elif x[0] == 'switch-to-control-panel':
-                    name_lower = x[1].lower()
-                    display_names_lower = [a.ztv_display_name.lower() for a in self.ztv_frame.control_panels]
-                    if name_lower in display_names_lower:
-                        self.ztv_frame.control_panels[display_names_lower.index(name_lower)].select_panel()
-                else:
-                    wx.CallAfter(pub.sendMessage, x[0], msg=(None if len(x) == 1 else x[1]))
+                wx.CallAfter(self.dispatcher.dispatch, x, time.time())
 
 
 class ZTVMain():
@@ -1,9 +1,15 @@
 from __future__ import absolute_import
 import subprocess
 import os
+import sys
 import pickle
+import itertools
+import threading
+import atexit
+from contextlib import contextmanager
 import numpy as np
-from .ztv_lib import send_to_stream, StreamListener, StreamListenerTimeOut
+from .ztv_lib import send_to_stream, StreamListener, StreamListenerTimeOut, can_share_array, write_shared_array
+from .ztv_lib import remove_shared_arrays
 import importlib
 from codecs import open  # To use a consistent encoding
 
@@ -17,6 +23,39 @@ with open(os.path.join(base_dir, "__about__.py")) as f:
     exec(f.read(), about)
 
 
+class ZTVRequest():
+    """
+    Handle on a request sent to ztv, returned by ZTV methods called with block=False.
+    The return value is collected with result(), which blocks until it has arrived, e.g.:
+        reqs = [z.stats_box(block=False), z.aperture_phot(block=False), z.xy_center(block=False)]
+        stats, phot, xy = [r.result() for r in reqs]
+    """
+    def __init__(self, request_id, request_message, expected_return_message_title):
+        self.request_id = request_id
+        self.request_message = request_message
+        self.expected_return_message_title = expected_return_message_title
+        self._event = threading.Event()
+        self._value = None
+        self._followups = []  # messages/requests to send to ztv only once this request has its return value
+        self._followups_sent = False
+        self._ztv = None  # the ZTV it was sent from, once it has been sent
+
+    def done(self):
+        return self._event.is_set()
+
+    def _set_result(self, value):
+        self._value = value
+        self._event.set()
+
+    def result(self, timeout=10.):
+        if not self._event.wait(timeout):
+            if self._ztv is not None:
+                self._ztv._forget_request(self)  # (so that a late reply is not mistaken for any other request's)
+            raise Error("did not receive return value from ztv in response to request: {}".format(
+                        self.request_message))
+        return self._value
+
+
 class ZTV():
     """
     ZTV Class:
@@ -33,6 +72,10 @@ class ZTV():
         z.load(np.random.randint(2**16, size=[256, 256]))
         z.cmap('jet')
         z.minmax(0.3 * (2**16), 0.7 * (2**16))
+
+    Methods that return a value from ztv accept block=False, in which case they return a ZTVRequest
+    right away and the value is collected later with its result() method.  This lets many requests be
+    in flight to ztv at once rather than waiting for each round trip in turn.
     """
     def __init__(self, title=None, control_panels_module_path=None, default_data_dir=None,
                  default_autoload_pattern=None):
@@ -57,6 +100,17 @@ class ZTV():
         cmd += 'masterPID=' + str(os.getpid()) +")'"
         self._subproc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True)
         self.stream_listener = StreamListener(self._subproc.stdout)
+        self._request_ids = itertools.count()
+        self._pending_requests = {}   # request id -> ZTVRequest, for requests still waiting on a return value
+        self._pending_requests_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._batch = None   # list of messages being collected by batch(), see below
+        self._batch_thread = None
+        self._shared_array_files = set()  # files from write_shared_array that ztv may not have read yet
+        atexit.register(remove_shared_arrays, self._shared_array_files)
+        self._return_value_thread = threading.Thread(target=self._dispatch_return_values)
+        self._return_value_thread.daemon = True
+        self._return_value_thread.start()
         self.clim = self.minmax   # make an alias
 
     def close(self):
@@ -64,36 +118,164 @@ class ZTV():
         Shutdown this instance of ZTV
         """
         self._send_to_ztv('kill-ztv')
+        remove_shared_arrays(self._shared_array_files)
+
+    def _dispatch_return_values(self):
+        """
+        runs in its own thread, handing each return value from ztv to the pending request it answers.
+        ztv echoes the request id sent with each request in its return value, (title, value, request_id);
+        a return value without one (e.g. from an older ztv) goes to the oldest pending request expecting its title.
+        """
+        while True:
+            try:
+                x = self.stream_listener.read_pickled_message(timeout=1.)
+            except StreamListenerTimeOut:
+                if not self.stream_listener.thread.is_alive():
+                    return
+                continue
+            with self._pending_requests_lock:
+                if len(x) > 2:
+                    request = self._pending_requests.pop(x[2], None)
+                else:
+                    waiting = [r for r in self._pending_requests.values() if r.expected_return_message_title == x[0]]
+                    request = min(waiting, key=lambda r: r.request_id) if waiting else None
+                    if request is not None:
+                        del self._pending_requests[request.request_id]
+                if request is not None:
+                    request._set_result(x[1])
+            if request is None:
+                sys.stderr.write("Unrecognized return value from ztv, no request is waiting for it: {}\n".format(x))
+                continue
+            while True:  # followups queued while this loop runs still go out in order, before any later sends
+                with self._pending_requests_lock:
+                    if len(request._followups) == 0:
+                        request._followups_sent = True
+                        break
+                    followup = request._followups.pop(0)
+                self._send_request(followup)
+
+    def _send_request(self, request):
+        """
+        request is a ZTVRequest, or a plain message to send with no return value
+        """
+        if isinstance(request, ZTVRequest):
+            with self._pending_requests_lock:
+                self._pending_requests[request.request_id] = request
+                request._ztv = self
+            msg = request.request_message
+            if not isinstance(msg, tuple):
+                msg = (msg, None)
+            self._send_to_ztv(msg + (request.request_id,))  # (ztv tags its return value with the request id)
+        else:
+            self._send_to_ztv(request)
 
-    def _request_return_value_from_ztv(self, request_message, expected_return_message_title=None, timeout=10.):
+    def _forget_request(self, request):
         """
-        routine to request info from ztv by sending message and receiving response
+        stop waiting for request's return value (e.g. it timed out)
+        """
+        with self._pending_requests_lock:
+            self._pending_requests.pop(request.request_id, None)
+
+    def _request_async(self, request_message, expected_return_message_title=None, after=None):
+        """
+        send request_message to ztv and return a ZTVRequest for its return value without waiting for it.
+        request_message is a command name, or a (name, msg) tuple for a command that also carries a msg.
+        If after is a ZTVRequest, request_message is not sent until after has received its return value.
         """
-        if expected_return_message_title is None and request_message.startswith('get-'):
+        if expected_return_message_title is None and isinstance(request_message, tuple):
+            expected_return_message_title = request_message[0]
+        elif expected_return_message_title is None and request_message.startswith('get-'):
             expected_return_message_title = request_message[4:]
         elif expected_return_message_title is None:
             expected_return_message_title = request_message
-        self._send_to_ztv(request_message)
-        try:
-            x = self.stream_listener.read_pickled_message(timeout=timeout)
-        except StreamListenerTimeOut:
-            raise Error("did not receive return value from ztv in response to request: {}".format(request_message))
-        else:
-            if x[0] == expected_return_message_title:
-                return x[1]
-            else:
-                raise Error("Unrecognized return value from ztv ({}) " +
-                            "in response to request: {}".format(x, request_message))
+        request = ZTVRequest(next(self._request_ids), request_message, expected_return_message_title)
+        self._send_request_after(request, after)
+        return request
+
+    def _send_request_after(self, request, after=None):
+        """
+        send request (a ZTVRequest or a plain message) now if after is None or has already received its
+        return value (and sent its followups), otherwise queue it up to be sent as soon as after does.
+        """
+        if after is not None:
+            with self._pending_requests_lock:
+                if not after._followups_sent:
+                    after._followups.append(request)
+                    return
+        self._send_request(request)
+
+    def _request_return_value_from_ztv(self, request_message, expected_return_message_title=None, timeout=10.,
+                                       block=True, after=None):
+        """
+        routine to request info from ztv by sending message and receiving response
+        block=False returns the ZTVRequest immediately instead of waiting for the response
+        """
+        request = self._request_async(request_message, expected_return_message_title, after=after)
+        if not block or self._in_batch():
+            return request
+        return request.result(timeout=timeout)
 
     def _send_to_ztv(self, msg):
-        send_to_stream(self._subproc.stdin, msg)
+        if self._in_batch():
+            self._batch.append((msg,) if isinstance(msg, str) else msg)
+            return
+        with self._send_lock:
+            send_to_stream(self._subproc.stdin, msg)
+
+    def _in_batch(self):
+        return self._batch is not None and self._batch_thread is threading.current_thread()
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect all commands issued inside the with block and send them to ztv as one message, which ztv
+        applies with redrawing held off, then redraws once, e.g.:
+            with z.batch():
+                z.cmap('jet')
+                z.scaling('log')
+                z.minmax(100., 5000.)
+                z.zoom(4.)
+                z.xy_center(512, 512)
+
+        Inside the batch, methods that return a value return a ZTVRequest (as for block=False), whose
+        result() becomes available once the batch has been sent.
+        """
+        if self._in_batch():  # nested batch just joins the outer one
+            yield
+            return
+        self._batch = []
+        self._batch_thread = threading.current_thread()
+        try:
+            yield
+        finally:
+            msgs = self._batch
+            self._batch = None
+            self._batch_thread = None
+            if len(msgs) > 0:
+                self._send_to_ztv(('batch', msgs))
 
     def _load_numpy_array(self, image):
         """
         Load a numpy array into the image.
+
+        Where possible the array is handed over through a memory-mapped file, with only a small
+        descriptor going through the pipe, rather than pickling the whole array through stdin.
         """
         if isinstance(image, np.ndarray):
-            self._send_to_ztv(('load-numpy-array', image))
+            if can_share_array(image):
+                # forget files ztv has already read (and removed), keeping only those it may not have yet
+                self._shared_array_files.difference_update([f for f in self._shared_array_files
+                                                            if not os.path.exists(f)])
+                descriptor = write_shared_array(image)
+                self._shared_array_files.add(descriptor['filename'])
+                try:
+                    self._send_to_ztv(('load-shared-numpy-array', descriptor))
+                except:
+                    remove_shared_arrays([descriptor['filename']])
+                    self._shared_array_files.discard(descriptor['filename'])
+                    raise
+            else:
+                self._send_to_ztv(('load-numpy-array', image))
         else:
             raise Error('Tried to send type {} instead of a numpy array'.format(type(image)))
 
@@ -142,7 +324,7 @@ class ZTV():
         """
         self._send_to_ztv('load-default-image')
 
-    def cmap(self, cmap=None):
+    def cmap(self, cmap=None, block=True):
         """
         Set the colormap.
 
@@ -159,15 +341,15 @@ class ZTV():
         """
         if isinstance(cmap, str):
             self._send_to_ztv(('set-cmap', (False, cmap)))
-        return self._request_return_value_from_ztv('get-cmap')
+        return self._request_return_value_from_ztv('get-cmap', block=block)
           
-    def cmaps_list(self):
+    def cmaps_list(self, block=True):
         """
         returns the available color maps as a list of strings
         """
-        return self._request_return_value_from_ztv('get-available-cmaps')
+        return self._request_return_value_from_ztv('get-available-cmaps', block=block)
 
-    def invert_cmap(self, state=None):
+    def invert_cmap(self, state=None, block=True):
         """
         state:  True -> set invert=True
                 False -> set invert=False
@@ -176,9 +358,9 @@ class ZTV():
         """
         if state is not None:
             self._send_to_ztv(('set-cmap-inverted', (False, state)))
-        return self._request_return_value_from_ztv('get-is-cmap-inverted')
+        return self._request_return_value_from_ztv('get-is-cmap-inverted', block=block)
 
-    def scaling(self, scaling=None):
+    def scaling(self, scaling=None, block=True):
         """
         Set the scaling.  (e.g. 'linear', 'log')
 
@@ -191,33 +373,42 @@ class ZTV():
         """
         if isinstance(scaling, str):
             self._send_to_ztv(('set-scaling', (False, scaling)))
-        return self._request_return_value_from_ztv('get-scaling')
+        return self._request_return_value_from_ztv('get-scaling', block=block)
 
-    def scalings_list(self):
+    def scalings_list(self, block=True):
         """
         returns the available scalings as a list of strings
         """
-        return self._request_return_value_from_ztv('get-available-scalings')
+        return self._request_return_value_from_ztv('get-available-scalings', block=block)
 
-    def set_minmax_to_full_range(self):
+    def set_minmax_to_full_range(self, block=True):
         """
         Reset the min/max to the image's full range
         
         returns current (new) min/max range
         """
         self._send_to_ztv('set-clim-to-minmax')
-        return self._request_return_value_from_ztv('get-clim')
+        return self._request_return_value_from_ztv('get-clim', block=block)
 
-    def set_minmax_to_auto(self):
+    def set_minmax_to_auto(self, block=True):
         """
         Set the min/max to the automatic setting
         
         returns current (new) min/max range
         """
         self._send_to_ztv('set-clim-to-auto')
-        return self._request_return_value_from_ztv('get-clim')
+        return self._request_return_value_from_ztv('get-clim', block=block)
+
+    def set_minmax_to_percentile(self, block=True):
+        """
+        Set the min/max to percentiles of the image's values (by default 0.5% and 99.5%)
+        
+        returns current (new) min/max range
+        """
+        self._send_to_ztv('set-clim-to-auto-percentile')
+        return self._request_return_value_from_ztv('get-clim', block=block)
 
-    def minmax(self, minval=None, maxval=None):
+    def minmax(self, minval=None, maxval=None, block=True):
         """
         Set min/max clipping of values in image display.
         If min > max, then will invert the colormap.
@@ -229,7 +420,7 @@ class ZTV():
         """
         if minval is not None and maxval is not None:
             self._send_to_ztv(('set-clim', (False, (minval, maxval))))
-        return self._request_return_value_from_ztv('get-clim')
+        return self._request_return_value_from_ztv('get-clim', block=block)
 
     def reset_zoom_and_center(self):
         """
@@ -238,7 +429,7 @@ class ZTV():
         """
         self._send_to_ztv('reset-zoom-and-center')
   
-    def zoom(self, zoom=None):
+    def zoom(self, zoom=None, block=True):
         """
         Set zoom factor
         
@@ -246,21 +437,23 @@ class ZTV():
         """
         if zoom is not None:
             self._send_to_ztv(('set-zoom-factor', zoom))
-        return self._request_return_value_from_ztv('get-zoom-factor')
+        return self._request_return_value_from_ztv('get-zoom-factor', block=block)
 
-    def xy_center(self, *args):
+    def xy_center(self, *args, **kwargs):
         """
         pan the image to place x,y at the center of the primary image frame
         
         returns the current (new) x/y center of the primary image frame
+        (block=False keyword returns a ZTVRequest instead, as for the other methods)
         """
+        block = kwargs.pop('block', True)
         if len(args) > 0:
             if len(args) == 1:
                 x,y = args[0]
             else:
                 x,y = args[0], args[1]
             self._send_to_ztv(('set-xy-center', (x, y)))
-        return self._request_return_value_from_ztv('get-xy-center')
+        return self._request_return_value_from_ztv('get-xy-center', block=block)
 
     def add_activemq(self, server=None, port=61613, destination=None):
         """
@@ -272,7 +465,7 @@ class ZTV():
             raise Error('Must specify a message queue to follow in destination keyword')
         self._send_to_ztv(('add-activemq-instance', (server, port, destination)))
 
-    def frame_number(self, n=None, relative=False):
+    def frame_number(self, n=None, relative=False, block=True):
         """
         If 3-d image is loaded set the frame number to be displayed.
         Default (relative=False) is to set to frame number n (automatically clipped to 0->size of 3-d stack)
@@ -287,9 +480,9 @@ class ZTV():
             else:
                 flag = 'absolute'
             self._send_to_ztv(('set-cur-display-frame-num', (n, flag)))
-        return self._request_return_value_from_ztv('get-cur-display-frame-num')
+        return self._request_return_value_from_ztv('get-cur-display-frame-num', block=block)
         
-    def sky_frame(self, filename=None):
+    def sky_frame(self, filename=None, block=True):
         """
         Set sky frame to filename and turn on sky subtraction
         To turn on sky subtraction with already loaded filename pattern, set filename=True
@@ -302,9 +495,27 @@ class ZTV():
             self._send_to_ztv(('set-sky-subtraction-status', filename))
         elif filename is not None:
             self._send_to_ztv(('set-sky-subtraction-filename', filename))
-        return self._request_return_value_from_ztv('get-sky-subtraction-status-and-filename')
+        return self._request_return_value_from_ztv('get-sky-subtraction-status-and-filename', block=block)
         
-    def flat_frame(self, filename=None):
+    def sky_combine_method(self, method=None, cache_dir=True, block=True):
+        """
+        How a 3-d sky frame is collapsed to 2-d for sky subtraction:  method is 'median' (the default) or
+        'sigma-clipped-mean'.  Combined skies are cached (keyed by file, its modification time & method); if cache_dir
+        is given they are also saved there, so that later sessions do not have to combine the same sky again.
+        cache_dir=None (or False) goes back to caching only in memory.
+        (method=None/cache_dir=True leave the current setting alone)
+
+        returns tuple of current method and cache directory (None if only cached in memory)
+        """
+        if method is not None:
+            self._send_to_ztv(('set-sky-combine-method', method))
+        if cache_dir is None or cache_dir is False:
+            self._send_to_ztv(('set-calibration-frame-cache-dir', None))
+        elif cache_dir is not True:
+            self._send_to_ztv(('set-calibration-frame-cache-dir', os.path.abspath(os.path.expanduser(cache_dir))))
+        return self._request_return_value_from_ztv('get-sky-combine-method-and-cache-dir', block=block)
+
+    def flat_frame(self, filename=None, block=True):
         """
         Set flat frame to filename and turn on flat field division
         To turn on flat field division with already loaded filename pattern, set filename=True
@@ -317,9 +528,9 @@ class ZTV():
             self._send_to_ztv(('set-flat-division-status', filename))
         elif filename is not None:
             self._send_to_ztv(('set-flat-division-filename', filename))
-        return self._request_return_value_from_ztv('get-flat-division-status-and-filename')
+        return self._request_return_value_from_ztv('get-flat-division-status-and-filename', block=block)
         
-    def autoload_filename_pattern(self, filename=None):
+    def autoload_filename_pattern(self, filename=None, block=True):
         """
         Set filename pattern for autoload to filename and turn on auto-load
         To turn on auto-loading with already loaded filename pattern, set filename=True
@@ -332,35 +543,71 @@ class ZTV():
             self._send_to_ztv(('set-autoload-filename-pattern-status', filename))
         elif filename is not None:
             self._send_to_ztv(('set-autoload-filename-pattern', filename))
-        return self._request_return_value_from_ztv('get-autoload-status-and-filename-pattern')
+        return self._request_return_value_from_ztv('get-autoload-status-and-filename-pattern', block=block)
 
-    def autoload_pause_seconds(self, seconds=None):
+    def autoload_pause_seconds(self, seconds=None, block=True):
         """
         Set pause time in seconds (will adjust to nearest available value)
         returns current autoload pause time
         """
         if seconds is not None:
             self._send_to_ztv(('set-autoload-pausetime', seconds))
-        return self._request_return_value_from_ztv('get-autoload-pausetime')
+        return self._request_return_value_from_ztv('get-autoload-pausetime', block=block)
+
+    def autoload_policy(self, readiness_check=None, frame_policy=None, block=True):
+        """
+        How autoload decides a new file is finished being written, readiness_check:
+            'fits-complete' (default) - the primary header and all of its data are in the file
+            'size-stable' - the file's size is unchanged between two checks
+            'sidecar' - a marker file of the same name plus '.done' exists (e.g. image.fits.done)
+            'none' - don't check
+        and which new files it shows, frame_policy:
+            'latest' (default) - only the newest, dropping any that are overtaken, so that ztv never falls behind
+            'all' - every one, in order, however far behind that gets
+        (readiness_check=None/frame_policy=None leave the current setting alone)
+
+        returns tuple of current readiness_check and frame_policy
+        """
+        if readiness_check is not None:
+            self._send_to_ztv(('set-autoload-readiness-check', readiness_check))
+        if frame_policy is not None:
+            self._send_to_ztv(('set-autoload-frame-policy', frame_policy))
+        return self._request_return_value_from_ztv('get-autoload-readiness-check-and-frame-policy', block=block)
 
-    def slice_plot(self, pts=None, show_overplot=True):
+    def autoload_stats(self, block=True):
+        """
+        returns a dict with the autoload watcher's backend:  'inotify' (linux: new files are noticed as soon as
+        they are written), 'polling' (every autoload_pause_seconds), or None if autoload is off.
+        Also how many new files were sent to be loaded (n_sent), found not to be finished yet and waited on
+        (n_waited), dropped for a newer file (n_dropped, see autoload_policy;  see also fits_load_stats) and
+        given up on as never finished (n_gave_up).
+        When polling, also how long the last/longest scans for new files took (last_scan_sec, max_scan_sec,
+        total_scan_sec over n_scans), how many files match (n_entries), and how many directories were listed or
+        skipped as unchanged, and files stat'ed, in the last scan (n_dirs_listed, n_dirs_skipped, n_stats);
+        useful for choosing autoload_pause_seconds.
+        """
+        return self._request_return_value_from_ztv('get-autoload-stats', block=block)
+
+    def slice_plot(self, pts=None, show_overplot=True, block=True):
         """
         pts: of form [[x0, y0], [x1, y1]]
         show_overplot:  If True, then show the over-plotted line
                         If False, then hide the line, although plot panel itself will continue to update
         Returns current (new) pts
         """
+        after = None
         if pts is not None:
             self._send_to_ztv(('set-new-slice-plot-xy0', pts[0]))
-            self._request_return_value_from_ztv('get-slice-plot-coords')  # dummy call to give time to update so that return is correct.
-            self._send_to_ztv(('set-new-slice-plot-xy1', pts[1]))
+            # dummy request to give time to update so that return is correct; rest is held back until it returns
+            after = self._request_return_value_from_ztv('get-slice-plot-coords', block=False)
+            self._send_request_after(('set-new-slice-plot-xy1', pts[1]), after=after)
         if show_overplot:
-            self._send_to_ztv('show-plot-panel-overplot')
+            self._send_request_after('show-plot-panel-overplot', after=after)
         else:
-            self._send_to_ztv('hide-plot-panel-overplot')
-        return self._request_return_value_from_ztv('get-slice-plot-coords')
+            self._send_request_after('hide-plot-panel-overplot', after=after)
+        return self._request_return_value_from_ztv('get-slice-plot-coords', block=block, after=after)
         
-    def stats_box(self, xrange=None, yrange=None, show_overplot=None):
+    def stats_box(self, xrange=None, yrange=None, show_overplot=None, block=True):
         """
         box: of form [[x0, y0], [x1, y1]]
         show_overplot:  If True, then show the over-plotted box
@@ -368,13 +615,14 @@ class ZTV():
                         If None, leave unchanged
         Returns current (new) box
         """
-        self._send_to_ztv(('set-stats-box-parameters', {'xrange':xrange, 'yrange':yrange,
-                                                                          'show_overplot':show_overplot}))
-        waiting = self._request_return_value_from_ztv('set-stats-box-parameters-done')
-        return self._request_return_value_from_ztv('get-stats-box-info')
+        waiting = self._request_return_value_from_ztv(('set-stats-box-parameters',
+                                                       {'xrange':xrange, 'yrange':yrange,
+                                                        'show_overplot':show_overplot}),
+                                                      'set-stats-box-parameters-done', block=False)
+        return self._request_return_value_from_ztv('get-stats-box-info', block=block, after=waiting)
 
     def aperture_phot(self, xclick=None, yclick=None, radius=None, inner_sky_radius=None, outer_sky_radius=None,
-                      show_overplot=None):
+                      show_overplot=None, block=True):
         """
         Send updated parameters to the Aperture Photometry control panel.
         Any unmodified arguments will be left unmodified in ztv. 
@@ -387,12 +635,51 @@ class ZTV():
                         If None, don't change.
         returns a dict with output photometry
         """  
-        self._send_to_ztv(('set-aperture-phot-parameters', 
-                                             {'xclick':xclick, 'yclick':yclick, 'radius':radius, 
-                                              'inner_sky_radius':inner_sky_radius, 'outer_sky_radius':outer_sky_radius,
-                                              'show_overplot':show_overplot}))
-        waiting = self._request_return_value_from_ztv('set-aperture-phot-parameters-done')
-        return self._request_return_value_from_ztv('get-aperture-phot-info')
+        waiting = self._request_return_value_from_ztv(('set-aperture-phot-parameters',
+                                                       {'xclick':xclick, 'yclick':yclick, 'radius':radius,
+                                                        'inner_sky_radius':inner_sky_radius,
+                                                        'outer_sky_radius':outer_sky_radius,
+                                                        'show_overplot':show_overplot}),
+                                                      'set-aperture-phot-parameters-done', block=False)
+        return self._request_return_value_from_ztv('get-aperture-phot-info', block=block, after=waiting)
+
+    def command_stats(self, block=True):
+        """
+        returns a dict of timing statistics for the commands ztv has received so far, keyed by command name,
+        each with:  count, total_wait_sec, max_wait_sec, total_exec_sec, max_exec_sec
+        where wait is the time between ztv receiving the command and starting on it, and exec is the time it
+        took to carry out.
+        """
+        return self._request_return_value_from_ztv('get-command-stats', block=block)
+
+    def fits_load_stats(self, block=True):
+        """
+        fits files are read in the background (files from autoload or the file picker; those loaded with
+        ZTV.load() are read right away).  Returns a dict of:
+            n_loaded, n_superseded (requests dropped because a newer one came in first), n_failed,
+            last/total/max_read_sec (reading the file) and last/total/max_latency_sec (request to display)
+        """
+        return self._request_return_value_from_ztv('get-fits-load-stats', block=block)
+
+    def redraw_counts(self, block=True):
+        """
+        returns a dict, keyed by image panel, of how many redraws have been requested vs. actually performed
+        (ztv collapses bursts of redraw requests into a single redraw)
+        """
+        return self._request_return_value_from_ztv('get-redraw-counts', block=block)
+
+    def normalized_image_cache_stats(self, max_bytes=None, block=True):
+        """
+        ztv keeps recently displayed frames normalized to their clim in a cache, so that blinking between frames
+        or toggling between clims does not have to recompute them.
+
+        max_bytes, if given, sets the cache's memory budget (0 turns caching off)
+
+        returns a dict of:  hits, misses, n_entries, n_bytes, max_bytes
+        """
+        if max_bytes is not None:
+            self._send_to_ztv(('set-normalized-image-cache-max-bytes', max_bytes))
+        return self._request_return_value_from_ztv('get-normalized-image-cache-stats', block=block)
 
     def control_panel(self, name):
         """
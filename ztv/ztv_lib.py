@@ -1,37 +1,183 @@
 import sys
+import os
 import pickle
+import struct
+import tempfile
 from threading import Thread
 from Queue import Queue, Empty
+import numpy as np
 
 
 # point is to make improbable that would ever happen to appear inside a pickled image and be mistaken
 # Note that because you may be loading image data and random strings will occur... best to have a big
 # *10 on this message string.  *1 or *2 might not be enough....
+# (end_of_message_message is only used by the legacy sentinel protocol, see send_to_stream(..., framed=False))
 end_of_message_message = ("---EndOfMessage---"*10) + "\n"   
 
-def send_to_stream(stream, msg): 
+# Framed protocol:  a fixed size header of  magic, message type, payload length (in bytes)
+# followed by exactly that many bytes of payload.  Everything is read with bulk reads of known
+# length, so binary payloads can contain anything (including newlines or end_of_message_message).
+frame_magic = '\x00ZTV'
+frame_header_struct = struct.Struct('>4sBQ')
+frame_type_pickle = 1
+
+def send_to_stream(stream, msg, framed=True): 
     """
     Pickle & send to stdout a message.
     Used primarily to communicate back-and-forth with a separately launched ztv process.
+
+    framed=False sends with the older end_of_message_message sentinel protocol, which StreamListener
+    still understands.
     """
     if isinstance(msg, str):
         msg = (msg,)
-    pkl = pickle.dumps(msg)
-    stream.write(pkl + '\n' + end_of_message_message)
+    if framed:
+        pkl = pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)
+        stream.write(frame_header_struct.pack(frame_magic, frame_type_pickle, len(pkl)))
+        stream.write(pkl)
+    else:
+        pkl = pickle.dumps(msg)
+        stream.write(pkl + '\n' + end_of_message_message)
     stream.flush()
 
+def shared_array_dir():
+    """
+    Directory in which to place the memory-mapped files used to hand image arrays to a ztv process.
+    /dev/shm (where it exists, e.g. linux) is ram-backed, so the array never has to touch disk.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+def can_share_array(image):
+    """
+    object arrays (and empty arrays, which np.memmap refuses) have to go through the pickled path instead
+    """
+    return (not image.dtype.hasobject) and (image.size > 0)
+
+def write_shared_array(image):
+    """
+    Copy image into a new memory-mapped file and return a small descriptor dict
+    (filename, shape, dtype) that is all that needs to cross the pipe to the ztv process.
+    The receiving side (read_shared_array) is responsible for deleting the file;  the sending side should
+    use remove_shared_arrays to clean up any that are never read (e.g. if the receiver has died).
+    """
+    fd, filename = tempfile.mkstemp(prefix='ztv-', suffix='.npy-shm', dir=shared_array_dir())
+    os.close(fd)
+    try:
+        mm = np.memmap(filename, dtype=image.dtype, mode='w+', shape=image.shape)
+        mm[...] = image
+        mm.flush()
+        del mm
+    except:
+        os.remove(filename)
+        raise
+    return {'filename':filename, 'shape':image.shape, 'dtype':image.dtype.str}
+
+def read_shared_array(descriptor, unlink=True):
+    """
+    Map the array described by descriptor (as returned by write_shared_array) without copying it.
+    With unlink=True the file is removed from the filesystem as soon as it is mapped; the mapping
+    itself stays valid for as long as the returned array is alive.
+    """
+    image = np.memmap(descriptor['filename'], dtype=np.dtype(descriptor['dtype']), mode='r',
+                      shape=tuple(descriptor['shape']))
+    if unlink:
+        try:
+            os.remove(descriptor['filename'])
+        except OSError:
+            pass  # e.g. on Windows can't remove a file that is mapped; leave it for the OS to clean up
+    return image
+
+def remove_shared_arrays(filenames):
+    """
+    Delete the files (from write_shared_array) in filenames that are still there, i.e. that were never
+    read by the receiving side, which would otherwise sit in (ram-backed) /dev/shm until reboot.
+    filenames may be a set, in which case it is emptied.
+    """
+    for filename in list(filenames):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass  # already read (& removed) by the receiving side
+        if isinstance(filenames, set):
+            filenames.discard(filename)
+
 class UnexpectedEndOfStream(Exception): pass
 
 class StreamListenerTimeOut(Exception): pass
 
+def _read_exactly(stream, n_bytes):
+    """
+    read exactly n_bytes from stream in one bulk read.  (read(n) on a python 2 file object
+    allocates the n byte string up front and blocks until it is filled or the stream ends.)
+    """
+    buf = stream.read(n_bytes)
+    if len(buf) != n_bytes:
+        raise UnexpectedEndOfStream
+    return buf
+
+class _MessageReader():
+    """
+    Splits a stream into whole (still pickled) message payloads, accepting both the framed protocol
+    and the legacy end_of_message_message sentinel protocol.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = ''   # bytes already read from stream that belong to the next message
+
+    def _read(self, n_bytes):
+        head = self.pending[:n_bytes]
+        self.pending = self.pending[n_bytes:]
+        if len(head) == n_bytes:
+            return head
+        return head + _read_exactly(self.stream, n_bytes - len(head))
+
+    def _readline(self):
+        if '\n' in self.pending:
+            i = self.pending.index('\n') + 1
+            line, self.pending = self.pending[:i], self.pending[i:]
+            return line
+        line, self.pending = self.pending + self.stream.readline(), ''
+        if len(line) == 0:
+            raise UnexpectedEndOfStream
+        return line
+
+    def _read_framed_payload(self):
+        magic, msg_type, n_bytes = frame_header_struct.unpack(self._read(frame_header_struct.size))
+        if msg_type != frame_type_pickle:
+            raise UnexpectedEndOfStream("unrecognized frame message type: {}".format(msg_type))
+        return self._read(n_bytes)
+
+    def _read_legacy_payload(self):
+        lines = []
+        while True:
+            line = self._readline()
+            if line == end_of_message_message and len(lines) > 0 and lines[-1].endswith('\n'):
+                return ''.join(lines)[:-1]
+            if frame_magic in line:
+                # resync:  anything ahead of a frame header is stray output, not part of a message
+                i = line.index(frame_magic)
+                self.pending = line[i:] + self.pending
+                if len(lines) > 0 or i > 0:
+                    sys.stderr.write("ztv_lib: discarding unframed data on stream\n")
+                return self._read_framed_payload()
+            lines.append(line)
+
+    def read_payload(self):
+        head = self._read(len(frame_magic))
+        self.pending = head + self.pending
+        if head == frame_magic:
+            return self._read_framed_payload()
+        return self._read_legacy_payload()
+
 def _accumulate_to_queue(stream, queue):
+    reader = _MessageReader(stream)
     while True:
-        line = stream.readline()
-        if line:
-            queue.put(line)
-        else:
+        try:
+            queue.put(reader.read_payload())
+        except UnexpectedEndOfStream:
 # TODO: rather than return, should really raise the Error, but then code elsewhere needs to be catching for it
-#             raise UnexpectedEndOfStream
             return
 
 class StreamListener():
@@ -48,10 +194,7 @@ class StreamListener():
     def read_pickled_message(self, timeout=None):
         try:
             block = timeout is not None
-            msg = ""
-            while not msg.endswith('\n' + end_of_message_message):
-                msg += self.queue.get(block=block, timeout=timeout)
-            return pickle.loads(msg.replace('\n' + end_of_message_message, ''))
+            return pickle.loads(self.queue.get(block=block, timeout=timeout))
         except Empty:
             raise StreamListenerTimeOut
 
@@ -65,11 +208,10 @@ def listen_to_pipe(pipe, timeout=None):
                         (i.e. will *never* return if a newline never comes in)
     If timeout is not None, then if length of output hasn't changed in timeout seconds,
                         then raise a timeout exception
+
+    Also accepts messages sent with the framed protocol.
     """
-    in_str = ""
     if timeout is None:
-        while not in_str.endswith('\n' + end_of_message_message):
-            in_str += pipe.readline()
+        return pickle.loads(_MessageReader(pipe).read_payload())
     else:
-        pass
-    return pickle.loads(in_str.replace('\n' + end_of_message_message, ''))
\ No newline at end of file
+        pass
\ No newline at end of file